@@ -0,0 +1,39 @@
+"""Unique lookup index for market_report_values
+
+Revision ID: b3c1e9f27d45
+Revises: a675cd0fbdb3
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1e9f27d45'
+down_revision = 'a675cd0fbdb3'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'uq_market_report_values_lookup'
+
+
+def upgrade() -> None:
+    # Удаляем дубликаты: остаётся строка с минимальным id — её и возвращал расчёт
+    op.execute(sa.text("""
+        DELETE FROM market_report_values
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM market_report_values
+            GROUP BY report_id, location_group_id, property_class
+        )
+    """))
+    op.create_index(
+        INDEX_NAME,
+        'market_report_values',
+        ['report_id', 'location_group_id', 'property_class'],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    # Удалённые дубликаты не восстанавливаются
+    op.drop_index(INDEX_NAME, table_name='market_report_values')
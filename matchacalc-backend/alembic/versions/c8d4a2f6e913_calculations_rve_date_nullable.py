@@ -0,0 +1,25 @@
+"""Make calculations.rve_date nullable
+
+Revision ID: c8d4a2f6e913
+Revises: b3c1e9f27d45
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c8d4a2f6e913'
+down_revision = 'b3c1e9f27d45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Дата ввода в эксплуатацию необязательна в запросе расчёта, а история пишет каждый расчёт
+    op.alter_column('calculations', 'rve_date', existing_type=sa.DateTime(timezone=True), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM calculations WHERE rve_date IS NULL")
+    op.alter_column('calculations', 'rve_date', existing_type=sa.DateTime(timezone=True), nullable=False)
@@ -0,0 +1,132 @@
+"""Partition calculations by month, JSONB results, summary columns
+
+Revision ID: d5e7a3b19c04
+Revises: c8d4a2f6e913
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd5e7a3b19c04'
+down_revision = 'c8d4a2f6e913'
+branch_labels = None
+depends_on = None
+
+# Секции создаются с месяца самой старой строки до текущего + MONTHS_AHEAD;
+# дальше их создаёт приложение при старте (app.calc.history.ensure_partitions)
+MONTHS_AHEAD = 3
+
+SUMMARY_FIELDS = ('npv', 'irr_percent', 'total_profit', 'total_profit_percent')
+
+COLUMNS = (
+    'id, user_id, lot_id, purchase_price, area, location_group_id, rve_date, '
+    'holding_years, scenario_id, report_id'
+)
+
+
+def month_start(value: date, months: int = 0) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        # SQLite для разработки: без секций, только новые колонки и индекс
+        for field in SUMMARY_FIELDS:
+            op.add_column('calculations', sa.Column(field, sa.Float(), nullable=True))
+        op.create_index('ix_calculations_user_created', 'calculations', ['user_id', 'created_at', 'id'])
+        return
+
+    # Старая таблица переименовывается, её строки переносятся в секционированную
+    op.execute("ALTER TABLE calculations RENAME TO calculations_unpartitioned")
+    op.execute("ALTER INDEX calculations_pkey RENAME TO calculations_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE calculations (
+            id INTEGER NOT NULL DEFAULT nextval('calculations_id_seq'),
+            user_id INTEGER REFERENCES users (id),
+            lot_id INTEGER REFERENCES lots (id),
+            purchase_price DOUBLE PRECISION NOT NULL,
+            area DOUBLE PRECISION NOT NULL,
+            location_group_id VARCHAR NOT NULL,
+            rve_date TIMESTAMP WITH TIME ZONE,
+            holding_years INTEGER NOT NULL,
+            scenario_id VARCHAR NOT NULL,
+            report_id INTEGER NOT NULL,
+            npv DOUBLE PRECISION,
+            irr_percent DOUBLE PRECISION,
+            total_profit DOUBLE PRECISION,
+            total_profit_percent DOUBLE PRECISION,
+            result_json JSONB NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY calculations.id")
+    op.execute("CREATE TABLE calculations_default PARTITION OF calculations DEFAULT")
+
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM calculations_unpartitioned")).scalar()
+    today = datetime.now(timezone.utc).date()
+    start = month_start(oldest.date() if oldest is not None else today)
+    last = month_start(today, MONTHS_AHEAD)
+    while start <= last:
+        end = month_start(start, 1)
+        op.execute(
+            f"CREATE TABLE calculations_{start:%Y_%m} PARTITION OF calculations "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+
+    # Сводные метрики извлекаются из результата; cash-flows старых строк остаются
+    # в формате [{year, cf}], app.calc.history.decode_result читает оба формата
+    summary = ", ".join(
+        f"(result_json -> 'dynamic_metrics' ->> '{field}')::double precision" for field in SUMMARY_FIELDS
+    )
+    op.execute(f"""
+        INSERT INTO calculations ({COLUMNS}, {', '.join(SUMMARY_FIELDS)}, result_json, created_at)
+        SELECT {COLUMNS}, {summary}, result_json::jsonb, coalesce(created_at, now())
+        FROM calculations_unpartitioned
+    """)
+    op.execute("DROP TABLE calculations_unpartitioned")
+    op.execute("CREATE INDEX ix_calculations_user_created ON calculations (user_id, created_at, id)")
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        op.drop_index('ix_calculations_user_created', table_name='calculations')
+        for field in reversed(SUMMARY_FIELDS):
+            op.drop_column('calculations', field)
+        return
+
+    op.execute("ALTER TABLE calculations RENAME TO calculations_partitioned")
+    op.execute("ALTER INDEX calculations_pkey RENAME TO calculations_partitioned_pkey")
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE calculations (
+            id INTEGER NOT NULL DEFAULT nextval('calculations_id_seq') PRIMARY KEY,
+            user_id INTEGER REFERENCES users (id),
+            lot_id INTEGER REFERENCES lots (id),
+            purchase_price DOUBLE PRECISION NOT NULL,
+            area DOUBLE PRECISION NOT NULL,
+            location_group_id VARCHAR NOT NULL,
+            rve_date TIMESTAMP WITH TIME ZONE,
+            holding_years INTEGER NOT NULL,
+            scenario_id VARCHAR NOT NULL,
+            report_id INTEGER NOT NULL,
+            result_json JSON NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY calculations.id")
+    op.execute(f"""
+        INSERT INTO calculations ({COLUMNS}, result_json, created_at)
+        SELECT {COLUMNS}, result_json::json, created_at FROM calculations_partitioned
+    """)
+    # Секции удаляются вместе с родительской таблицей
+    op.execute("DROP TABLE calculations_partitioned")
+    op.execute("CREATE INDEX ix_calculations_id ON calculations (id)")
@@ -0,0 +1,50 @@
+"""Materialized per-lot metrics table
+
+Revision ID: e2f8b6c4a1d7
+Revises: d5e7a3b19c04
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e2f8b6c4a1d7'
+down_revision = 'd5e7a3b19c04'
+branch_labels = None
+depends_on = None
+
+SORT_COLUMNS = {
+    'ix_lot_metrics_irr': 'irr_percent',
+    'ix_lot_metrics_npv': 'npv',
+    'ix_lot_metrics_payback': 'payback_rent_years',
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        'lot_metrics',
+        sa.Column('lot_id', sa.Integer(), sa.ForeignKey('lots.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('report_id', sa.Integer(), sa.ForeignKey('market_reports.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('scenario_id', sa.String(), nullable=False),
+        sa.Column('holding_years', sa.Integer(), nullable=False),
+        sa.Column('location_group_id', sa.String(), nullable=False),
+        sa.Column('purchase_price', sa.Float(), nullable=False),
+        sa.Column('npv', sa.Float(), nullable=False),
+        sa.Column('irr_percent', sa.Float(), nullable=False),
+        sa.Column('total_profit', sa.Float(), nullable=False),
+        sa.Column('total_profit_percent', sa.Float(), nullable=False),
+        sa.Column('payback_rent_years', sa.Float(), nullable=True),
+        sa.Column('payback_rent_sale_years', sa.Float(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('lot_id', 'report_id', 'scenario_id', 'holding_years'),
+    )
+    for name, column in SORT_COLUMNS.items():
+        op.create_index(name, 'lot_metrics', ['report_id', 'scenario_id', 'holding_years', column])
+    # Таблица заполняется после миграции: POST /api/v1/admin/lot-metrics/refresh
+
+
+def downgrade() -> None:
+    for name in SORT_COLUMNS:
+        op.drop_index(name, table_name='lot_metrics')
+    op.drop_table('lot_metrics')
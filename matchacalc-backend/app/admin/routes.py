@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.db.database import get_db
+from app.db.database import async_engine, get_db
 from app.db.models import MarketReport, MarketReportValue, LocationGroup, ScenarioConfig, UserRole
+from app.lots.metrics import LOT_PROPERTY_CLASS, lot_metrics_refresher
 from app.admin.schemas import (
     MarketReportCreate, MarketReportValueCreate, LocationGroupCreate, ScenarioConfigCreate,
     MarketReportResponse, MarketReportValueResponse,
-    MarketReportUpdate, MarketReportValueUpdate, LocationGroupUpdate, ScenarioConfigUpdate
+    MarketReportUpdate, MarketReportValueUpdate, LocationGroupUpdate, ScenarioConfigUpdate,
+    MarketDataLoadResponse, MarketReportValueItem, ReportValuesReplaceResponse
 )
+from app.admin.service import get_report_values as load_report_values, replace_report_values
 from app.reports.schemas import LocationGroupResponse, ScenarioResponse
 from app.auth.dependencies import get_current_user
+from app.auth.hashing import password_hasher
+from app.cache.refdata import invalidate_reference_data
+from app.cache.results import result_cache
+from app.cache.principals import principal_cache
+from app.calc.history import calculation_writer
+from app.db.pool import pool_stats
+from app.reports.loader import iter_stream_reports, load_market_data
 
 router = APIRouter()
 
 
-def require_admin(current_user=Depends(get_current_user)):
+async def require_admin(current_user=Depends(get_current_user)):
     """Проверка прав администратора"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -26,141 +38,261 @@ def require_admin(current_user=Depends(get_current_user)):
 
 # Market Reports
 @router.get("/reports", response_model=List[MarketReportResponse])
-def get_all_reports(
-    db: Session = Depends(get_db),
+async def get_all_reports(
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Получение всех отчётов (включая неактивные)"""
-    return db.query(MarketReport).order_by(MarketReport.created_at.desc()).all()
+    return (await db.scalars(select(MarketReport).order_by(MarketReport.created_at.desc()))).all()
 
 
 @router.post("/reports", response_model=MarketReportResponse, status_code=status.HTTP_201_CREATED)
-def create_report(
+async def create_report(
     report_data: MarketReportCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Создание нового отчёта"""
     report = MarketReport(**report_data.model_dump())
     db.add(report)
-    db.commit()
-    db.refresh(report)
+    await db.commit()
+    await db.refresh(report)
+    # Публичные страницы коллекций считаются по последнему активному отчёту
+    await invalidate_reference_data()
     return report
 
 
 @router.put("/reports/{report_id}", response_model=MarketReportResponse)
-def update_report(
+async def update_report(
     report_id: int,
     report_data: MarketReportUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Обновление отчёта"""
-    report = db.query(MarketReport).filter(MarketReport.id == report_id).first()
+    report = await db.get(MarketReport, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Отчёт не найден")
     
-    for key, value in report_data.model_dump(exclude_unset=True).items():
+    changes = report_data.model_dump(exclude_unset=True)
+    for key, value in changes.items():
         setattr(report, key, value)
     
-    db.commit()
-    db.refresh(report)
+    await db.commit()
+    await db.refresh(report)
+    await invalidate_reference_data()
+    if "active" in changes:
+        # Метрики лотов хранятся только для активных отчётов
+        lot_metrics_refresher.schedule_market(report_id)
     return report
 
 
 @router.get("/reports/{report_id}/values", response_model=list[MarketReportValueResponse])
-def get_report_values(
+async def get_report_values(
     report_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Получение значений отчёта"""
-    values = db.query(MarketReportValue).filter(
-        MarketReportValue.report_id == report_id
-    ).all()
-    return values
+    return await load_report_values(db, report_id)
+
+
+@router.put("/reports/{report_id}/values", response_model=ReportValuesReplaceResponse)
+async def replace_values(
+    report_id: int,
+    values: List[MarketReportValueItem],
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(require_admin)
+):
+    """
+    Замена всех значений отчёта: вставка, обновление и удаление строк одной транзакцией,
+    кэши справочника инвалидируются один раз
+    """
+    if not await db.get(MarketReport, report_id):
+        raise HTTPException(status_code=404, detail="Отчёт не найден")
+    
+    changed = set()
+    try:
+        counts = await replace_report_values(db, report_id, values, changed)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неизвестная группа локаций в значениях отчёта"
+        )
+    
+    if counts["inserted"] or counts["updated"] or counts["deleted"]:
+        await invalidate_reference_data()
+        lot_metrics_refresher.schedule_market(
+            report_id, {group for group, property_class in changed if property_class == LOT_PROPERTY_CLASS}
+        )
+    return {**counts, "values": await load_report_values(db, report_id)}
 
 
 # Market Report Values
 @router.post("/report-values", response_model=MarketReportValueResponse, status_code=status.HTTP_201_CREATED)
-def create_report_value(
+async def create_report_value(
     value_data: MarketReportValueCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Создание значения отчёта"""
     value = MarketReportValue(**value_data.model_dump())
     db.add(value)
-    db.commit()
-    db.refresh(value)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Значение для этой локации и класса уже есть в отчёте"
+        )
+    await invalidate_reference_data()
+    await db.refresh(value)
+    lot_metrics_refresher.schedule_market(value.report_id, [value.location_group_id], value.property_class)
     return value
 
 
 @router.put("/report-values/{value_id}", response_model=MarketReportValueResponse)
-def update_report_value(
+async def update_report_value(
     value_id: int,
     value_data: MarketReportValueUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Обновление значения отчёта"""
-    value = db.query(MarketReportValue).filter(MarketReportValue.id == value_id).first()
+    value = await db.get(MarketReportValue, value_id)
     if not value:
         raise HTTPException(status_code=404, detail="Значение не найдено")
+    # Лоты прежнего ключа тоже пересчитываются, если значение перенесено на другой ключ
+    previous_key = (value.report_id, value.location_group_id, value.property_class)
     
     for key, val in value_data.model_dump(exclude_unset=True).items():
         setattr(value, key, val)
     
-    db.commit()
-    db.refresh(value)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Значение для этой локации и класса уже есть в отчёте"
+        )
+    await invalidate_reference_data()
+    await db.refresh(value)
+    for report_id, location_group_id, property_class in dict.fromkeys(
+        (previous_key, (value.report_id, value.location_group_id, value.property_class))
+    ):
+        lot_metrics_refresher.schedule_market(report_id, [location_group_id], property_class)
     return value
 
 
+@router.post("/market-data", response_model=MarketDataLoadResponse)
+async def upload_market_data(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(require_admin)
+):
+    """
+    Загрузка файла данных рынка (тело запроса — JSON в формате market_data_Q4_2025.json
+    или market_reports_data.json). Тело разбирается потоково, запись — одной транзакцией.
+    """
+    try:
+        stats = await load_market_data(db, iter_stream_reports(request.stream()))
+    except (ValueError, KeyError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ошибка загрузки данных рынка: {e}"
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ошибка загрузки данных рынка: неизвестная группа локаций или пропущенные значения"
+        )
+    await invalidate_reference_data()
+    # Файл может затронуть любые отчёты и группы — пересчитываются все лоты
+    lot_metrics_refresher.schedule_market()
+    return stats.as_dict()
+
+
 # Location Groups
 @router.post("/location-groups", response_model=LocationGroupResponse, status_code=status.HTTP_201_CREATED)
-def create_location_group(
+async def create_location_group(
     group_data: LocationGroupCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Создание группы локаций"""
     group = LocationGroup(**group_data.model_dump())
     db.add(group)
-    db.commit()
-    db.refresh(group)
+    await db.commit()
+    await db.refresh(group)
     return group
 
 
 # Scenario Configs
 @router.post("/scenarios", response_model=ScenarioResponse, status_code=status.HTTP_201_CREATED)
-def create_scenario(
+async def create_scenario(
     scenario_data: ScenarioConfigCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Создание сценария"""
     scenario = ScenarioConfig(**scenario_data.model_dump())
     db.add(scenario)
-    db.commit()
-    db.refresh(scenario)
+    await db.commit()
+    await invalidate_reference_data()
+    await db.refresh(scenario)
+    lot_metrics_refresher.schedule_market()
     return scenario
 
 
 @router.put("/scenarios/{scenario_id}", response_model=ScenarioResponse)
-def update_scenario(
+async def update_scenario(
     scenario_id: str,
     scenario_data: ScenarioConfigUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin=Depends(require_admin)
 ):
     """Обновление сценария"""
-    scenario = db.query(ScenarioConfig).filter(ScenarioConfig.id == scenario_id).first()
+    scenario = await db.get(ScenarioConfig, scenario_id)
     if not scenario:
         raise HTTPException(status_code=404, detail="Сценарий не найден")
     
     for key, value in scenario_data.model_dump(exclude_unset=True).items():
         setattr(scenario, key, value)
     
-    db.commit()
-    db.refresh(scenario)
+    await db.commit()
+    await invalidate_reference_data()
+    await db.refresh(scenario)
+    lot_metrics_refresher.schedule_market()
     return scenario
+
+
+# Метрики лотов
+@router.post("/lot-metrics/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_lot_metrics(admin=Depends(require_admin)):
+    """Полный фоновый пересчёт lot_metrics (после миграции или потери очереди)"""
+    if not lot_metrics_refresher.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Пересчёт метрик лотов выключен"
+        )
+    lot_metrics_refresher.schedule_market()
+    return lot_metrics_refresher.stats()
+
+
+# Метрики
+@router.get("/metrics")
+async def get_metrics(admin=Depends(require_admin)):
+    """Счётчики кэшей, фоновых задач, пула соединений и хеширования паролей (по текущему процессу)"""
+    return {
+        "result_cache": result_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "calculation_history": calculation_writer.stats(),
+        "db_pool": pool_stats(async_engine.pool),
+        "password_hasher": password_hasher.stats(),
+        "lot_metrics": lot_metrics_refresher.stats()
+    }
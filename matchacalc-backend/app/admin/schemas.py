@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from app.db.models import PropertyClass
 
@@ -23,6 +23,17 @@ class MarketReportValueCreate(BaseModel):
     vacancy_rate: Optional[float] = None
 
 
+class MarketReportValueItem(BaseModel):
+    """Строка матрицы значений отчёта (PUT /reports/{id}/values)"""
+    location_group_id: str
+    property_class: PropertyClass
+    rent_start: float  # руб/м²/год — расчёт считает ставку годовой
+    rent_growth_annual: float
+    price_per_m2_start: Optional[float] = None
+    price_growth_annual: float
+    vacancy_rate: Optional[float] = None
+
+
 class MarketReportUpdate(BaseModel):
     provider: Optional[str] = None
     title: Optional[str] = None
@@ -94,3 +105,19 @@ class MarketReportValueResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class MarketDataLoadResponse(BaseModel):
+    reports_created: int
+    reports_existing: int
+    values_upserted: int
+    seconds: float
+    rows_per_second: float
+
+
+class ReportValuesReplaceResponse(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    values: List[MarketReportValueResponse]
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import MarketReportValue, PropertyClass
+from app.admin.schemas import MarketReportValueItem
+
+# Поля значения, которые сравниваются и обновляются
+VALUE_FIELDS = (
+    "rent_start", "rent_growth_annual", "price_per_m2_start", "price_growth_annual", "vacancy_rate"
+)
+
+
+async def get_report_values(db: AsyncSession, report_id: int) -> List[MarketReportValue]:
+    """Значения отчёта в порядке (локация, класс), всегда свежие из БД"""
+    return (await db.scalars(
+        select(MarketReportValue)
+        .where(MarketReportValue.report_id == report_id)
+        .order_by(MarketReportValue.location_group_id, MarketReportValue.property_class)
+        .execution_options(populate_existing=True)
+    )).all()
+
+
+async def replace_report_values(
+    db: AsyncSession,
+    report_id: int,
+    items: List[MarketReportValueItem],
+    changed: Optional[Set[Tuple[str, PropertyClass]]] = None
+) -> Dict[str, int]:
+    """
+    Замена матрицы значений отчёта: сравнение с сохранёнными строками по
+    (location_group_id, property_class), затем один DELETE, один пакетный UPDATE
+    и один пакетный INSERT в одной транзакции. Возвращает число строк каждого вида;
+    в changed, если передан, добавляются ключи вставленных, обновлённых и удалённых строк.
+    """
+    incoming: Dict[Tuple[str, PropertyClass], dict] = {}
+    for item in items:
+        key = (item.location_group_id, item.property_class)
+        if key in incoming:
+            raise ValueError(f"Повтор значения: {item.location_group_id} / {item.property_class.value}")
+        incoming[key] = item.model_dump()
+
+    stored = {
+        (value.location_group_id, value.property_class): value
+        for value in await get_report_values(db, report_id)
+    }
+
+    inserts = []
+    updates = []
+    unchanged = 0
+    changed_keys = set()
+    for key, row in incoming.items():
+        value = stored.get(key)
+        if value is None:
+            inserts.append(dict(row, report_id=report_id))
+            changed_keys.add(key)
+        elif any(getattr(value, field) != row[field] for field in VALUE_FIELDS):
+            updates.append(dict({field: row[field] for field in VALUE_FIELDS}, id=value.id))
+            changed_keys.add(key)
+        else:
+            unchanged += 1
+    deletes = [value.id for key, value in stored.items() if key not in incoming]
+    changed_keys.update(key for key in stored if key not in incoming)
+
+    if deletes:
+        await db.execute(delete(MarketReportValue).where(MarketReportValue.id.in_(deletes)))
+    if updates:
+        # Пакетный UPDATE по первичному ключу (executemany)
+        await db.execute(update(MarketReportValue), updates)
+    if inserts:
+        await db.execute(insert(MarketReportValue), inserts)
+    await db.commit()
+    if changed is not None:
+        changed.update(changed_keys)
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": unchanged,
+    }
@@ -1,18 +1,25 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.auth.jwt_handler import decode_access_token
-from app.auth.service import get_user_by_id
+from app.auth.service import get_user_by_id, get_user_subscription
+from app.cache.principals import Principal, principal_cache, token_key
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    """Получение текущего пользователя из JWT токена"""
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """
+    Получение текущего пользователя из JWT токена
+    Пользователь с ролью и подпиской берётся из кэша по токену (app.cache.principals);
+    при промахе — два запроса к БД
+    """
     token = credentials.credentials
     payload = decode_access_token(token)
     
@@ -31,8 +38,14 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    key = token_key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+    
     user_id = int(user_id_str)
-    user = get_user_by_id(db, user_id)
+    generation = principal_cache.generation(user_id)
+    user = await get_user_by_id(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,4 +53,21 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user
+    principal = Principal.from_models(user, await get_user_subscription(db, user_id))
+    principal_cache.set(key, principal, payload.get("exp"), generation)
+    return principal
+
+
+async def get_optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[int]:
+    """ID пользователя из JWT без обращения к БД; None для гостя или неверного токена"""
+    if credentials is None:
+        return None
+    payload = decode_access_token(credentials.credentials)
+    if payload is None or payload.get("sub") is None:
+        return None
+    try:
+        return int(payload["sub"])
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,105 @@
+"""
+Хеширование паролей bcrypt в отдельном ограниченном пуле потоков
+
+bcrypt занимает CPU на сотни миллисекунд (и отпускает GIL), поэтому хеширование
+выполняется в собственном пуле из PASSWORD_HASH_WORKERS потоков, а не в общем пуле
+потоков Starlette: всплеск входов не занимает потоки, нужные остальным эндпоинтам.
+Если операций в пуле (выполняются + ждут) уже PASSWORD_HASH_MAX_PENDING, новая сразу
+получает PasswordHasherBusy (ответ 503), а не встаёт в очередь без ограничения.
+
+Стоимость bcrypt — PASSWORD_BCRYPT_ROUNDS; хеши с другой стоимостью пересчитываются
+при успешном входе (needs_rehash).
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from app.config import settings
+
+# bcrypt учитывает только первые 72 байта пароля
+MAX_PASSWORD_BYTES = 72
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь хеширования заполнена"""
+
+
+def hash_password_sync(password: str, rounds: Optional[int] = None) -> str:
+    """Хеш bcrypt с текущей стоимостью (для скриптов — в текущем потоке)"""
+    password_bytes = password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+    salt = bcrypt.gensalt(rounds or settings.PASSWORD_BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    password_bytes = password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+    return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """Стоимость из хеша вида $2b$12$..."""
+    return int(hashed_password.split("$")[2])
+
+
+def needs_rehash(hashed_password: str, rounds: Optional[int] = None) -> bool:
+    return hash_rounds(hashed_password) != (rounds or settings.PASSWORD_BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """Пул потоков bcrypt с ограничением числа операций в очереди"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password_sync, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password_sync, password, hashed_password)
+
+    async def _run(self, function, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.pending += 1
+        try:
+            result = await asyncio.wrap_future(self._executor.submit(function, *args))
+        except BaseException:
+            # Ошибка bcrypt или отмена запроса (клиент отключился)
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        """Остановка пула (при остановке приложения)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
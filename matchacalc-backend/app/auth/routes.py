@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.auth.schemas import UserRegister, UserLogin, Token, UserResponse
 from app.auth.service import (
-    create_user, get_user_by_email, verify_password, get_user_subscription
+    authenticate_user, create_user, get_user_by_email, get_user_subscription
 )
+from app.auth.hashing import PasswordHasherBusy
 from app.auth.jwt_handler import create_access_token
 from app.auth.dependencies import get_current_user
 from app.db.models import SubscriptionStatus
@@ -14,11 +15,20 @@ from app.config import settings
 router = APIRouter()
 
 
+def hasher_busy() -> HTTPException:
+    """Ответ при заполненной очереди хеширования паролей"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервис перегружен. Повторите попытку через несколько секунд.",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Регистрация нового пользователя"""
     # Проверяем, существует ли пользователь
-    existing_user = get_user_by_email(db, user_data.email)
+    existing_user = await get_user_by_email(db, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -26,10 +36,13 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
     
     # Создаём пользователя
-    user = create_user(db, user_data)
+    try:
+        user = await create_user(db, user_data)
+    except PasswordHasherBusy:
+        raise hasher_busy()
     
     # Получаем подписку
-    subscription = get_user_subscription(db, user.id)
+    subscription = await get_user_subscription(db, user.id)
     
     return UserResponse(
         id=user.id,
@@ -41,11 +54,14 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Вход пользователя"""
-    user = get_user_by_email(db, credentials.email)
+    try:
+        user = await authenticate_user(db, credentials.email, credentials.password)
+    except PasswordHasherBusy:
+        raise hasher_busy()
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
@@ -63,17 +79,12 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(
-    current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Получение информации о текущем пользователе"""
-    subscription = get_user_subscription(db, current_user.id)
-    
+async def get_current_user_info(current_user=Depends(get_current_user)):
+    """Получение информации о текущем пользователе (без обращения к БД при попадании в кэш)"""
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
         role=current_user.role.value,
-        subscription=subscription,
+        subscription=current_user.subscription,
         created_at=current_user.created_at
     )
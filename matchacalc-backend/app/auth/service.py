@@ -1,34 +1,23 @@
-from sqlalchemy.orm import Session
-import bcrypt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import User, Subscription, SubscriptionPlan, SubscriptionStatus
 from app.auth.schemas import UserRegister
+from app.auth.hashing import needs_rehash, password_hasher
+from app.ratelimit.middleware import invalidate_subscription_plan
 from datetime import datetime, timedelta
 
 
-def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
-    # bcrypt ограничен 72 байтами, обрезаем если нужно
-    password_bytes = password.encode('utf-8')[:72]
-    return bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
-    # bcrypt ограничен 72 байтами, обрезаем если нужно
-    password_bytes = plain_password.encode('utf-8')[:72]
-    return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
-
-
-def create_user(db: Session, user_data: UserRegister) -> User:
+async def create_user(db: AsyncSession, user_data: UserRegister) -> User:
     """Создание нового пользователя"""
-    hashed_password = get_password_hash(user_data.password)
+    # bcrypt занимает CPU на сотни миллисекунд — в пуле хеширования, вне event loop
+    hashed_password = await password_hasher.hash(user_data.password)
     db_user = User(
         email=user_data.email,
         password_hash=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Создаём подписку по умолчанию (NONE)
     subscription = Subscription(
@@ -37,24 +26,39 @@ def create_user(db: Session, user_data: UserRegister) -> User:
         status=SubscriptionStatus.ACTIVE
     )
     db.add(subscription)
-    db.commit()
+    await db.commit()
+    await invalidate_subscription_plan(db_user.id)
     
     return db_user
 
 
-def get_user_by_email(db: Session, email: str) -> User | None:
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> User | None:
+    """
+    Пользователь по email и паролю или None
+    Хеш с устаревшей стоимостью bcrypt пересчитывается и сохраняется
+    """
+    user = await get_user_by_email(db, email)
+    if user is None or not await password_hasher.verify(password, user.password_hash):
+        return None
+    if needs_rehash(user.password_hash):
+        user.password_hash = await password_hasher.hash(password)
+        await db.commit()
+    return user
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
     """Получение пользователя по email"""
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).where(User.email == email).limit(1))
 
 
-def get_user_by_id(db: Session, user_id: int) -> User | None:
+async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
     """Получение пользователя по ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.get(User, user_id)
 
 
-def get_user_subscription(db: Session, user_id: int) -> Subscription | None:
+async def get_user_subscription(db: AsyncSession, user_id: int) -> Subscription | None:
     """Получение активной подписки пользователя"""
-    return db.query(Subscription).filter(
+    return await db.scalar(select(Subscription).where(
         Subscription.user_id == user_id,
         Subscription.status == SubscriptionStatus.ACTIVE
-    ).first()
+    ).limit(1))
@@ -0,0 +1,228 @@
+"""
+Кэш аутентифицированных пользователей для get_current_user
+
+Ключ — SHA-256 токена, значение — неизменяемый снимок пользователя с ролью и активной
+подпиской (Principal). Запись живёт PRINCIPAL_CACHE_TTL_SECONDS, но не дольше срока
+действия токена (exp); размер ограничен PRINCIPAL_CACHE_MAX_ENTRIES (LRU). На попадании
+запрос не обращается к БД.
+
+Инвалидация: после изменения роли или подписки вызывается invalidate_principal() —
+записи пользователя удаляются в текущем процессе, а его id публикуется в канал
+auth:principal:invalidate. Каждый процесс слушает канал в фоновом потоке и удаляет
+записи в своём event loop. При потере соединения с Redis кэш очищается целиком —
+сообщение могло быть пропущено.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+import redis
+from app.config import settings
+from app.db.models import Subscription, SubscriptionPlan, SubscriptionStatus, User, UserRole
+from app.ratelimit.middleware import get_async_redis_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:principal:invalidate"
+
+# Пауза перед переподключением слушателя к Redis (секунды)
+LISTENER_RETRY_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class SubscriptionSnapshot:
+    """Неизменяемая копия активной Subscription"""
+    plan: SubscriptionPlan
+    status: SubscriptionStatus
+    expires_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, subscription: Subscription) -> "SubscriptionSnapshot":
+        return cls(plan=subscription.plan, status=subscription.status, expires_at=subscription.expires_at)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Текущий пользователь: поля User, нужные маршрутам, и активная подписка"""
+    id: int
+    email: str
+    role: UserRole
+    created_at: datetime
+    subscription: Optional[SubscriptionSnapshot]
+
+    @classmethod
+    def from_models(cls, user: User, subscription: Optional[Subscription]) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            created_at=user.created_at,
+            subscription=SubscriptionSnapshot.from_model(subscription) if subscription is not None else None,
+        )
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class PrincipalCache:
+    """
+    LRU пользователей по токену со сроком жизни записи
+    Изменяется только из event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Ключ токена → (пользователь, момент истечения по time.monotonic())
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        # Поколение (общее, пользователя): инвалидация во время загрузки не даст сохранить старый снимок
+        self._epoch = 0
+        self._generations: Dict[int, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Principal]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            principal, expires = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return principal
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def set(self, key: str, principal: Principal, token_expires_at: Optional[float], generation: Tuple[int, int]):
+        """Сохранение снимка, загруженного при поколении generation; token_expires_at — exp (Unix time)"""
+        if generation != self.generation(principal.id):
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        self._remove(key)
+        self._entries[key] = (principal, time.monotonic() + ttl)
+        self._keys_by_user.setdefault(principal.id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def invalidate_local(self, user_id: int):
+        """Удаление записей пользователя в текущем процессе"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        for key in list(self._keys_by_user.get(user_id, ())):
+            self._remove(key)
+        self.invalidations += 1
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    async def invalidate(self, user_id: int):
+        """Инвалидация во всех процессах: локально и через Redis"""
+        self.invalidate_local(user_id)
+        try:
+            await get_async_redis_client().publish(INVALIDATION_CHANNEL, user_id)
+        except redis.RedisError:
+            logger.warning("Redis недоступен: пользователь %d сброшен только в текущем процессе", user_id)
+
+    def start_listener(self):
+        """Фоновый поток подписки на канал инвалидации (вызывается из event loop)"""
+        if self._listener is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="principal-invalidation", daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=LISTENER_RETRY_SECONDS)
+            self._listener = None
+
+    def _call_in_loop(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # Event loop уже закрыт
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._call_in_loop(self.invalidate_local, int(message["data"]))
+            except (redis.RedisError, ValueError):
+                self._call_in_loop(self.clear)
+                self._stop.wait(LISTENER_RETRY_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+    def stats(self) -> dict:
+        """Счётчики текущего процесса"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+async def invalidate_principal(user_id: int):
+    """Вызывается после изменения роли или подписок пользователя"""
+    await principal_cache.invalidate(user_id)
+
+
+def invalidate_principal_sync(user_id: int):
+    """То же для синхронных скриптов: записи сбрасываются в процессах API через Redis"""
+    try:
+        get_redis_client().publish(INVALIDATION_CHANNEL, user_id)
+    except redis.RedisError:
+        pass  # Записи истекут по TTL
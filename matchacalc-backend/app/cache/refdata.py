@@ -0,0 +1,223 @@
+"""
+Кэш справочных данных расчёта в памяти процесса: значения отчётов и сценарии
+
+Справочник маленький и меняется только через админку, поэтому каждый процесс держит
+полный снимок (MarketReportValue + ScenarioConfig) и на попадании не обращается ни к БД,
+ни к Redis. Снимок загружается при старте приложения.
+
+Инвалидация: админские маршруты после записи вызывают invalidate_reference_data() —
+счётчик refdata:version в Redis увеличивается, новая версия публикуется в канал
+refdata:invalidate. Каждый процесс слушает канал в фоновом потоке и помечает свой снимок
+устаревшим; следующий запрос перезагружает его из БД. При потере соединения с Redis
+снимок тоже считается устаревшим — сообщение могло быть пропущено.
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import MarketReportValue, ScenarioConfig, PropertyClass
+from app.ratelimit.middleware import get_redis_client, get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "refdata:version"
+INVALIDATION_CHANNEL = "refdata:invalidate"
+
+# Пауза перед переподключением слушателя к Redis (секунды)
+LISTENER_RETRY_SECONDS = 5.0
+
+MarketKey = Tuple[int, str, PropertyClass]
+
+
+@dataclass(frozen=True)
+class MarketValueSnapshot:
+    """Неизменяемая копия MarketReportValue"""
+    id: int
+    report_id: int
+    location_group_id: str
+    property_class: PropertyClass
+    rent_start: float
+    rent_growth_annual: float
+    price_per_m2_start: Optional[float]
+    price_growth_annual: float
+    vacancy_rate: Optional[float]
+
+    @classmethod
+    def from_model(cls, value: MarketReportValue) -> "MarketValueSnapshot":
+        return cls(
+            id=value.id,
+            report_id=value.report_id,
+            location_group_id=value.location_group_id,
+            property_class=value.property_class,
+            rent_start=value.rent_start,
+            rent_growth_annual=value.rent_growth_annual,
+            price_per_m2_start=value.price_per_m2_start,
+            price_growth_annual=value.price_growth_annual,
+            vacancy_rate=value.vacancy_rate,
+        )
+
+
+@dataclass(frozen=True)
+class ScenarioSnapshot:
+    """Неизменяемая копия ScenarioConfig"""
+    id: str
+    name: str
+    rent_growth_multiplier: float
+    price_growth_multiplier: float
+    discount_rate_adjustment: Optional[float]
+
+    @classmethod
+    def from_model(cls, scenario: ScenarioConfig) -> "ScenarioSnapshot":
+        return cls(
+            id=scenario.id,
+            name=scenario.name,
+            rent_growth_multiplier=scenario.rent_growth_multiplier,
+            price_growth_multiplier=scenario.price_growth_multiplier,
+            discount_rate_adjustment=scenario.discount_rate_adjustment,
+        )
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """Полный снимок справочника; заменяется целиком, поэтому читается без блокировок"""
+    generation: int
+    version: Optional[int]  # refdata:version на момент загрузки (None — Redis недоступен)
+    market_values: Dict[MarketKey, MarketValueSnapshot] = field(default_factory=dict)
+    scenarios: Dict[str, ScenarioSnapshot] = field(default_factory=dict)
+
+    def ordered_scenarios(self) -> List[ScenarioSnapshot]:
+        """Сценарии от пессимистичного к оптимистичному"""
+        return sorted(
+            self.scenarios.values(),
+            key=lambda s: (s.rent_growth_multiplier, s.price_growth_multiplier, s.id)
+        )
+
+
+def _read_version() -> Optional[int]:
+    try:
+        return int(get_redis_client().get(VERSION_KEY) or 0)
+    except redis.RedisError:
+        return None
+
+
+async def _read_version_async() -> Optional[int]:
+    try:
+        return int(await get_async_redis_client().get(VERSION_KEY) or 0)
+    except redis.RedisError:
+        return None
+
+
+class ReferenceDataCache:
+    """Снимок справочника с поколениями: снимок актуален, пока его поколение текущее"""
+
+    def __init__(self):
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    async def get(self, db: AsyncSession) -> ReferenceSnapshot:
+        """Актуальный снимок; при необходимости перезагружается из БД через сессию db"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.generation == self._generation:
+            return snapshot
+        # Одновременные запросы ждут одну перезагрузку
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.generation != self._generation:
+                snapshot = await self.load(db)
+            return snapshot
+
+    async def load(self, db: AsyncSession) -> ReferenceSnapshot:
+        """Загрузка справочника из БД (два запроса)"""
+        # Поколение и версия фиксируются до чтения: инвалидация во время загрузки
+        # увеличит поколение, и следующий запрос загрузит снимок заново
+        generation = self._generation
+        version = await _read_version_async()
+
+        market_values = {}
+        values = await db.scalars(select(MarketReportValue).order_by(MarketReportValue.id))
+        for value in values:
+            key = (value.report_id, value.location_group_id, value.property_class)
+            market_values.setdefault(key, MarketValueSnapshot.from_model(value))
+        scenarios = {
+            scenario.id: ScenarioSnapshot.from_model(scenario)
+            for scenario in await db.scalars(select(ScenarioConfig))
+        }
+
+        snapshot = ReferenceSnapshot(generation, version, market_values, scenarios)
+        self._snapshot = snapshot
+        return snapshot
+
+    def mark_stale(self):
+        """Снимок этого процесса устарел"""
+        self._generation += 1
+
+    async def invalidate(self):
+        """Инвалидация во всех процессах: локально и через Redis"""
+        self.mark_stale()
+        try:
+            client = get_async_redis_client()
+            version = await client.incr(VERSION_KEY)
+            await client.publish(INVALIDATION_CHANNEL, version)
+        except redis.RedisError:
+            logger.warning("Redis недоступен: инвалидация справочника только в текущем процессе")
+
+    def start_listener(self):
+        """Фоновый поток подписки на канал инвалидации"""
+        if self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="refdata-invalidation", daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=LISTENER_RETRY_SECONDS)
+            self._listener = None
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Пока подписки не было, сообщения могли пропасть
+                snapshot = self._snapshot
+                if snapshot is not None and snapshot.version != _read_version():
+                    self.mark_stale()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    snapshot = self._snapshot
+                    if snapshot is None or snapshot.version is None or int(message["data"]) > snapshot.version:
+                        self.mark_stale()
+            except (redis.RedisError, ValueError):
+                self.mark_stale()
+                self._stop.wait(LISTENER_RETRY_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+
+reference_cache = ReferenceDataCache()
+
+
+async def get_reference_snapshot(db: AsyncSession) -> ReferenceSnapshot:
+    """Актуальный снимок справочника"""
+    return await reference_cache.get(db)
+
+
+async def invalidate_reference_data():
+    """Вызывается после записи в MarketReportValue или ScenarioConfig"""
+    await reference_cache.invalidate()
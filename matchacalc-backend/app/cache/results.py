@@ -0,0 +1,155 @@
+"""
+Кэш результатов расчёта: LRU в памяти процесса + общий уровень в Redis с TTL
+
+Ключ — SHA-256 канонического JSON входных параметров и версии справочника
+(refdata:version, app.cache.refdata), поэтому после правки справочника старые
+записи просто перестают находиться и истекают по TTL. Значения хранятся как JSON:
+каждое попадание отдаёт новую копию, которую вызывающий может менять.
+Одновременные промахи по одному ключу объединяются (app.cache.singleflight).
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import redis
+from app.config import settings
+from app.ratelimit.middleware import get_async_redis_client
+from app.cache.singleflight import SingleFlight, acquire_lock, release_lock, wait_for_value
+
+KEY_PREFIX = "calc:result"
+
+
+def make_key(namespace: str, version: str, **params) -> str:
+    """Канонический ключ: порядок аргументов не влияет на хэш"""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{version}:{digest}"
+
+
+class ResultCache:
+    """
+    Двухуровневый кэш со счётчиками попаданий, промахов и вытеснений
+    Используется из event loop, поэтому LRU не требует блокировок.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.redis_errors = 0
+        self.redis_waits = 0
+        self._flights = SingleFlight()
+
+    async def get(self, key: str, shared: bool = True) -> Optional[dict]:
+        payload = self._entries.get(key)
+        if payload is not None:
+            self._entries.move_to_end(key)
+            self.local_hits += 1
+            return json.loads(payload)
+
+        if shared:
+            try:
+                payload = await get_async_redis_client().get(key)
+            except redis.RedisError:
+                self.redis_errors += 1
+                payload = None
+            if payload is not None:
+                self._store_local(key, payload)
+                self.redis_hits += 1
+                return json.loads(payload)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict, shared: bool = True):
+        await self._store_payload(key, json.dumps(value, separators=(",", ":")), shared)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[dict]],
+        shared: bool = True
+    ) -> dict:
+        """
+        Значение из кэша или результат await compute(), который сохраняется в оба уровня
+        Одновременные промахи по одному ключу считаются один раз (app.cache.singleflight)
+        """
+        cached = await self.get(key, shared)
+        if cached is not None:
+            return cached
+        payload = await self._flights.do(key, lambda: self._compute_payload(key, compute, shared))
+        return json.loads(payload)
+
+    async def _compute_payload(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[dict]],
+        shared: bool
+    ) -> str:
+        """Вычисление ведущей корутиной; с блокировкой в Redis — одним процессом на ключ"""
+        # Пока корутина ждала Redis, значение мог записать предыдущий ведущий
+        payload = self._entries.get(key)
+        if payload is not None:
+            return payload
+
+        token = None
+        if shared and settings.SINGLE_FLIGHT_REDIS_LOCK:
+            try:
+                token = await acquire_lock(key, settings.SINGLE_FLIGHT_LOCK_TTL_MS)
+                if token is None:
+                    payload = await wait_for_value(key, settings.SINGLE_FLIGHT_WAIT_MS)
+                    if payload is not None:
+                        self._store_local(key, payload)
+                        self.redis_waits += 1
+                        return payload
+            except redis.RedisError:
+                self.redis_errors += 1
+
+        try:
+            payload = json.dumps(await compute(), separators=(",", ":"))
+            await self._store_payload(key, payload, shared)
+        finally:
+            if token is not None:
+                await release_lock(key, token)
+        return payload
+
+    async def _store_payload(self, key: str, payload: str, shared: bool):
+        self._store_local(key, payload)
+        if shared:
+            try:
+                await get_async_redis_client().setex(key, self.ttl_seconds, payload)
+            except redis.RedisError:
+                self.redis_errors += 1
+
+    def _store_local(self, key: str, payload: str):
+        self._entries[key] = payload
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Счётчики текущего процесса"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+            "redis_waits": self.redis_waits,
+            "single_flight": self._flights.stats(),
+            "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache(settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_TTL_SECONDS)
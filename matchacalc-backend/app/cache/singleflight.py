@@ -0,0 +1,111 @@
+"""
+Single-flight: одновременные одинаковые вычисления выполняются один раз
+
+Внутри процесса первая корутина с данным ключом становится ведущей, остальные ждут
+её результат (или исключение). Если ведущую отменили (клиент отключился), вычисление
+не отменяется у ожидающих: одна из них становится ведущей и считает сама. Между процессами — опционально — ведущий берёт
+в Redis блокировку SET NX PX, остальные процессы ждут появления результата в общем
+уровне кэша (app.cache.results) и считают сами, только если не дождались.
+"""
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+import redis
+from app.ratelimit.middleware import get_async_redis_client
+
+LOCK_SUFFIX = ":lock"
+
+# Удаление блокировки только её владельцем
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _LeaderCancelled(Exception):
+    """Ведущая корутина отменена, ожидающим нужно выбрать новую"""
+
+
+class SingleFlight:
+    """Группа вычислений, объединяемых по ключу (в пределах event loop процесса)"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.takeovers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Результат await fn() — собственный или ведущей корутины с тем же ключом"""
+        joined = False
+        while (call := self._calls.get(key)) is not None:
+            if joined:
+                self.takeovers += 1
+            else:
+                self.coalesced += 1
+                joined = True
+            try:
+                # shield: отмена ожидающего запроса не отменяет общее вычисление
+                return await asyncio.shield(call)
+            except _LeaderCancelled:
+                # Первая проснувшаяся ожидающая станет ведущей, остальные присоединятся к ней
+                continue
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.set_exception(_LeaderCancelled())
+            call.exception()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            call.exception()  # Исключение уже обработано ведущим, без предупреждения в лог
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "takeovers": self.takeovers,
+        }
+
+
+async def acquire_lock(key: str, ttl_ms: int) -> Optional[str]:
+    """Блокировка в Redis; токен владельца или None, если её держит другой процесс"""
+    token = uuid.uuid4().hex
+    if await get_async_redis_client().set(key + LOCK_SUFFIX, token, nx=True, px=ttl_ms):
+        return token
+    return None
+
+
+async def release_lock(key: str, token: str):
+    try:
+        await get_async_redis_client().eval(_RELEASE_SCRIPT, 1, key + LOCK_SUFFIX, token)
+    except redis.RedisError:
+        pass  # Блокировка истечёт по TTL
+
+
+async def wait_for_value(key: str, timeout_ms: int, poll_ms: int = 20) -> Optional[str]:
+    """Ожидание, пока другой процесс запишет значение по ключу (или снимет блокировку)"""
+    client = get_async_redis_client()
+    deadline = time.monotonic() + timeout_ms / 1000
+    while time.monotonic() < deadline:
+        value = await client.get(key)
+        if value is not None:
+            return value
+        if not await client.exists(key + LOCK_SUFFIX):
+            return await client.get(key)
+        await asyncio.sleep(poll_ms / 1000)
+    return None
@@ -0,0 +1,275 @@
+"""
+Аналитические (замкнутые) формулы для рядов аренды
+Все ряды геометрические, поэтому суммы и дисконтированные суммы считаются за O(1).
+Пошаговые функции из app.calc.formulas остаются эталоном и проверяются тестами.
+"""
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+
+def geometric_sum(growth: float, terms: int) -> float:
+    """
+    Сумма геометрического ряда SUM(k=0 to n-1) (1 + growth)^k
+
+    Считается через expm1/log1p, чтобы не терять точность при growth ≈ 0.
+    """
+    if terms <= 0:
+        return 0.0
+    if growth == 0:
+        return float(terms)
+    if growth > -1:
+        return math.expm1(terms * math.log1p(growth)) / growth
+    ratio = 1 + growth
+    return (1 - ratio ** terms) / -growth
+
+
+def _weighted_geometric_sum(growth: float, terms: int) -> float:
+    """
+    SUM(k=0 to n-1) k * (1 + growth)^k — производная ряда, умноженная на знаменатель
+
+    При |growth| < 1e-6 формула (n * x^n - x * S) / growth теряет точность,
+    поэтому используется разложение в ряд Тейлора.
+    """
+    if terms <= 1:
+        return 0.0
+    if abs(growth) < 1e-6:
+        return terms * (terms - 1) / 2 + growth * terms * (terms - 1) * (2 * terms - 1) / 6
+    ratio = 1 + growth
+    return (terms * ratio ** terms - ratio * geometric_sum(growth, terms)) / growth
+
+
+def calculate_rent_income_closed_form(
+    area: float,
+    rent_start: float,  # R0 в руб/м²/год (годовая ставка)
+    rent_growth_annual: float,  # g_r'
+    holding_years: int
+) -> float:
+    """
+    Совокупная прибыль от аренды за N лет
+    SUM Rent_t = 0.5 * A * R0 + A * R0 * SUM(k=0 to N-2) (1 + g_r')^k
+    """
+    annual_rent = area * rent_start
+    return 0.5 * annual_rent + annual_rent * geometric_sum(rent_growth_annual, holding_years - 1)
+
+
+def calculate_discounted_rent_closed_form(
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    holding_years: int,
+    discount_rate: float
+) -> float:
+    """
+    Дисконтированная аренда SUM(t=1 to N) Rent_t / (1+d)^t
+
+    Для t >= 2: Rent_t / (1+d)^t = A * R0 / (1+d)^2 * ((1 + g_r') / (1 + d))^(t-2),
+    знаменатель ряда минус единица равен (g_r' - d) / (1 + d).
+    """
+    annual_rent = area * rent_start
+    discount = 1.0 / (1.0 + discount_rate)
+    relative_growth = (rent_growth_annual - discount_rate) * discount
+    return (
+        0.5 * annual_rent * discount
+        + annual_rent * discount * discount * geometric_sum(relative_growth, holding_years - 1)
+    )
+
+
+def calculate_npv_closed_form(
+    purchase_price: float,
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    price_growth_annual: float,
+    holding_years: int,
+    discount_rate: float = 0.12
+) -> float:
+    """
+    NPV = -P0 + SUM(t=1 to N) Rent_t / (1+d)^t + Price_N / (1+d)^N
+
+    Как и в calculate_npv, цена продажи учитывается только при N >= 2.
+    """
+    npv = -purchase_price + calculate_discounted_rent_closed_form(
+        area, rent_start, rent_growth_annual, holding_years, discount_rate
+    )
+    if holding_years >= 2:
+        npv += purchase_price * ((1 + price_growth_annual) / (1 + discount_rate)) ** holding_years
+    return npv
+
+
+def calculate_payback_rent_closed_form(
+    purchase_price: float,
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    max_years: int = 50
+) -> float:
+    """
+    Срок окупаемости при сдаче в аренду (без продажи) через логарифм
+
+    Число полных лет аренды k — минимальное, при котором
+    A * R0 * SUM(i=0 to k-1) (1 + g_r')^i >= P0 - 0.5 * A * R0.
+    Непрерывное решение: m = ln(1 + c * g_r') / ln(1 + g_r'), k = ceil(m).
+    Внутри года — та же линейная интерполяция, что и в calculate_payback_rent.
+    """
+    annual_rent = area * rent_start
+    rent_year_1 = 0.5 * annual_rent
+    if rent_year_1 >= purchase_price:
+        return 1.0
+    if annual_rent <= 0:
+        return float(max_years)
+
+    # Сколько годовых ставок нужно набрать после первого года
+    required = (purchase_price - rent_year_1) / annual_rent
+    growth = rent_growth_annual
+
+    if growth <= -1:
+        # Аренда перестаёт расти после второго года: окупаемость возможна только в нём
+        if required <= 1:
+            return 1.0 + required
+        return float(max_years)
+
+    if growth == 0:
+        full_years = required
+    else:
+        log_argument = 1 + required * growth
+        if log_argument <= 0:
+            return float(max_years)  # Сумма убывающего ряда никогда не достигнет P0
+        full_years = math.log1p(required * growth) / math.log1p(growth)
+
+    if not math.isfinite(full_years) or full_years > max_years:
+        return float(max_years)
+
+    # Уточняем целое число лет с учётом погрешности логарифма
+    k = max(1, math.ceil(full_years))
+    while k > 1 and geometric_sum(growth, k - 1) >= required:
+        k -= 1
+    while geometric_sum(growth, k) < required:
+        k += 1
+
+    if k + 1 > max_years:
+        return float(max_years)
+
+    remaining = required - geometric_sum(growth, k - 1)
+    rent_year = (1 + growth) ** (k - 1)
+    return k + remaining / rent_year
+
+
+def calculate_npv_derivative_closed_form(
+    purchase_price: float,
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    price_growth_annual: float,
+    holding_years: int,
+    discount_rate: float
+) -> float:
+    """
+    dNPV/dd в замкнутой форме (v = 1 / (1+d), x = (1 + g_r') * v)
+
+    d/dd [0.5 * A * R0 * v]          = -0.5 * A * R0 * v^2
+    d/dd [A * R0 * v^2 * S(x)]        = -A * R0 * v^3 * (2 * S(x) + x * S'(x))
+    d/dd [P0 * ((1 + g_p') * v)^N]    = -N * P0 * ((1 + g_p') * v)^N * v
+    """
+    annual_rent = area * rent_start
+    discount = 1.0 / (1.0 + discount_rate)
+    relative_growth = (rent_growth_annual - discount_rate) * discount
+    terms = holding_years - 1
+
+    derivative = -0.5 * annual_rent * discount ** 2
+    derivative -= annual_rent * discount ** 3 * (
+        2 * geometric_sum(relative_growth, terms)
+        + _weighted_geometric_sum(relative_growth, terms)
+    )
+    if holding_years >= 2:
+        derivative -= (
+            holding_years * purchase_price
+            * ((1 + price_growth_annual) * discount) ** holding_years * discount
+        )
+    return derivative
+
+
+@dataclass(frozen=True)
+class IRRResult:
+    """Результат поиска IRR"""
+    rate: float
+    iterations: int
+    converged: bool
+
+
+def solve_irr(
+    purchase_price: float,
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    price_growth_annual: float,
+    holding_years: int,
+    guess: Optional[float] = None,
+    tolerance: float = 1e-10,
+    max_iterations: int = 100
+) -> IRRResult:
+    """
+    IRR методом Ньютона с защитой бисекцией
+
+    Поток денег меняет знак один раз (-P0, затем неотрицательные поступления),
+    поэтому NPV(r) монотонно убывает и корень единственный. Шаг Ньютона
+    принимается, только если остаётся внутри текущей вилки [low, high], иначе
+    делается шаг бисекции. guess — тёплый старт, например IRR соседнего сценария.
+
+    Как и calculate_irr, возвращает 0.0, если NPV при ставке 0.01% не положительна.
+    """
+    def npv_at_rate(rate: float) -> float:
+        return calculate_npv_closed_form(
+            purchase_price, area, rent_start, rent_growth_annual,
+            price_growth_annual, holding_years, rate
+        )
+
+    low = 0.0001
+    if npv_at_rate(low) <= 0:
+        return IRRResult(rate=0.0, iterations=0, converged=False)  # IRR не существует
+
+    # Вилка: NPV(low) > 0, NPV(high) <= 0
+    high = max(1.0, 2 * guess) if guess is not None and guess > 0 else 1.0
+    iterations = 0
+    while npv_at_rate(high) > 0:
+        low = high
+        high *= 2
+        iterations += 1
+        if high > 1e9:
+            return IRRResult(rate=high, iterations=iterations, converged=False)
+
+    if guess is not None and low < guess < high:
+        rate = guess
+    else:
+        # Начальное приближение: среднегодовой рост суммарных поступлений
+        inflows = npv_at_rate(0.0) + purchase_price
+        rate = (inflows / purchase_price) ** (1.0 / holding_years) - 1 if inflows > 0 else low
+        if not low < rate < high:
+            rate = (low + high) / 2
+
+    while iterations < max_iterations:
+        iterations += 1
+        value = npv_at_rate(rate)
+        if value == 0:
+            return IRRResult(rate=rate, iterations=iterations, converged=True)
+        if value > 0:
+            low = rate
+        else:
+            high = rate
+
+        derivative = calculate_npv_derivative_closed_form(
+            purchase_price, area, rent_start, rent_growth_annual,
+            price_growth_annual, holding_years, rate
+        )
+        next_rate = None
+        if derivative < 0:
+            next_rate = rate - value / derivative
+            if abs(next_rate - rate) <= tolerance * (1 + abs(rate)):
+                return IRRResult(rate=next_rate, iterations=iterations, converged=True)
+        if next_rate is None or not low < next_rate < high:
+            next_rate = (low + high) / 2  # Шаг Ньютона вышел из вилки — бисекция
+        if high - low <= tolerance * (1 + abs(rate)):
+            return IRRResult(rate=next_rate, iterations=iterations, converged=True)
+        rate = next_rate
+
+    return IRRResult(rate=rate, iterations=iterations, converged=False)
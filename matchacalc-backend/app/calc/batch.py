@@ -0,0 +1,452 @@
+"""
+Векторизованный (NumPy) расчёт метрик для пакета лотов
+Те же формулы, что в app.calc.formulas и app.calc.analytic, но каждая метрика
+считается одной операцией над массивами по всем строкам сразу.
+"""
+import numpy as np
+from typing import List, Dict, Optional
+
+
+def geometric_sum_array(growth: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    """Векторный аналог analytic.geometric_sum: SUM(k=0 to n-1) (1 + growth)^k"""
+    growth = np.asarray(growth, dtype=float)
+    terms = np.asarray(terms, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        regular = np.expm1(terms * np.log1p(growth)) / growth
+        degenerate = (1 - (1 + growth) ** terms) / -growth
+        result = np.where(growth > -1, regular, degenerate)
+        result = np.where(growth == 0, terms, result)
+    return np.where(terms > 0, result, 0.0)
+
+
+def weighted_geometric_sum_array(growth: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    """Векторный аналог analytic._weighted_geometric_sum: SUM(k=0 to n-1) k * (1 + growth)^k"""
+    growth = np.asarray(growth, dtype=float)
+    terms = np.asarray(terms, dtype=float)
+    ratio = 1 + growth
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        regular = (terms * ratio ** terms - ratio * geometric_sum_array(growth, terms)) / growth
+    taylor = terms * (terms - 1) / 2 + growth * terms * (terms - 1) * (2 * terms - 1) / 6
+    result = np.where(np.abs(growth) < 1e-6, taylor, regular)
+    return np.where(terms > 1, result, 0.0)
+
+
+def npv_array(
+    purchase_price: np.ndarray,
+    annual_rent: np.ndarray,
+    rent_growth_annual: np.ndarray,
+    price_growth_annual: np.ndarray,
+    holding_years: np.ndarray,
+    discount_rate: np.ndarray
+) -> np.ndarray:
+    """NPV в замкнутой форме (см. analytic.calculate_npv_closed_form)"""
+    discount = 1.0 / (1.0 + discount_rate)
+    relative_growth = (rent_growth_annual - discount_rate) * discount
+    npv = (
+        -purchase_price
+        + 0.5 * annual_rent * discount
+        + annual_rent * discount ** 2 * geometric_sum_array(relative_growth, holding_years - 1)
+    )
+    with np.errstate(over="ignore"):
+        sale = purchase_price * ((1 + price_growth_annual) * discount) ** holding_years
+    return npv + np.where(holding_years >= 2, sale, 0.0)
+
+
+def npv_derivative_array(
+    purchase_price: np.ndarray,
+    annual_rent: np.ndarray,
+    rent_growth_annual: np.ndarray,
+    price_growth_annual: np.ndarray,
+    holding_years: np.ndarray,
+    discount_rate: np.ndarray
+) -> np.ndarray:
+    """dNPV/dd в замкнутой форме (см. analytic.calculate_npv_derivative_closed_form)"""
+    discount = 1.0 / (1.0 + discount_rate)
+    relative_growth = (rent_growth_annual - discount_rate) * discount
+    terms = holding_years - 1
+    derivative = (
+        -0.5 * annual_rent * discount ** 2
+        - annual_rent * discount ** 3 * (
+            2 * geometric_sum_array(relative_growth, terms)
+            + weighted_geometric_sum_array(relative_growth, terms)
+        )
+    )
+    with np.errstate(over="ignore"):
+        sale = holding_years * purchase_price * ((1 + price_growth_annual) * discount) ** holding_years * discount
+    return derivative - np.where(holding_years >= 2, sale, 0.0)
+
+
+def solve_irr_array(
+    purchase_price: np.ndarray,
+    annual_rent: np.ndarray,
+    rent_growth_annual: np.ndarray,
+    price_growth_annual: np.ndarray,
+    holding_years: np.ndarray,
+    guess: Optional[np.ndarray] = None,
+    tolerance: float = 1e-10,
+    max_iterations: int = 100
+):
+    """
+    Векторный метод Ньютона с защитой бисекцией (см. analytic.solve_irr)
+
+    Все строки итерируются одновременно; сошедшиеся строки замораживаются.
+    Возвращает (rate, iterations, converged) — массивы по строкам.
+    """
+    args = (purchase_price, annual_rent, rent_growth_annual, price_growth_annual, holding_years)
+    rows = purchase_price.shape[0]
+
+    low = np.full(rows, 0.0001)
+    has_root = npv_array(*args, low) > 0
+    rate = np.zeros(rows)
+    iterations = np.zeros(rows, dtype=int)
+    converged = np.zeros(rows, dtype=bool)
+
+    # Вилка: NPV(low) > 0, NPV(high) <= 0
+    high = np.ones(rows)
+    if guess is not None:
+        high = np.where(guess > 0, np.maximum(1.0, 2 * guess), 1.0)
+    expanding = has_root.copy()
+    while expanding.any():
+        expanding &= npv_array(*args, high) > 0
+        expanding &= high <= 1e9
+        low = np.where(expanding, high, low)
+        high = np.where(expanding, high * 2, high)
+        iterations += expanding
+    has_root &= high <= 1e9
+
+    # Начальное приближение: тёплый старт или среднегодовой рост поступлений
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inflows = npv_array(*args, np.zeros(rows)) + purchase_price
+        start = np.where(
+            inflows > 0, (inflows / purchase_price) ** (1.0 / holding_years) - 1, low
+        )
+    if guess is not None:
+        start = np.where((low < guess) & (guess < high), guess, start)
+    start = np.where((low < start) & (start < high), start, (low + high) / 2)
+    rate = np.where(has_root, start, rate)
+
+    active = has_root.copy()
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        iterations += active
+        value = npv_array(*args, rate)
+        low = np.where(active & (value > 0), rate, low)
+        high = np.where(active & (value <= 0), rate, high)
+
+        derivative = npv_derivative_array(*args, rate)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = rate - value / derivative
+        newton_ok = (derivative < 0) & np.isfinite(newton)
+        step_done = newton_ok & (np.abs(newton - rate) <= tolerance * (1 + np.abs(rate)))
+        step_done |= value == 0
+
+        next_rate = np.where(newton_ok & (low < newton) & (newton < high), newton, (low + high) / 2)
+        bracket_done = high - low <= tolerance * (1 + np.abs(rate))
+
+        done = active & (step_done | bracket_done)
+        rate = np.where(active & step_done, np.where(newton_ok, newton, rate), rate)
+        rate = np.where(active & ~step_done, next_rate, rate)
+        converged |= done
+        active &= ~done
+
+    return rate, iterations, converged
+
+
+def _payback_from_matrix(
+    totals: np.ndarray,
+    target: np.ndarray,
+    max_years: int
+) -> np.ndarray:
+    """
+    Первый год t >= 2, при котором totals[:, t] >= target, с линейной интерполяцией
+    totals — матрица (строки × годы 0..max_years)
+    """
+    reached = totals[:, 2:] >= target[:, None]
+    any_reached = reached.any(axis=1)
+    year = np.argmax(reached, axis=1) + 2
+    rows = np.arange(totals.shape[0])
+    current = totals[rows, year]
+    previous = totals[rows, year - 1]
+    growth = current - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interpolated = np.where(growth > 0, year - 1 + (target - previous) / growth, year)
+    return np.where(any_reached, interpolated, float(max_years))
+
+
+def payback_years_from_schedule(
+    cumulative_rent: np.ndarray,
+    sale_prices: np.ndarray,
+    purchase_price: np.ndarray,
+    max_years: int
+):
+    """
+    Сроки окупаемости по матрицам графика (строки × годы 0..max_years и дальше)
+    Возвращает (payback_rent_years, payback_rent_sale_years) с той же интерполяцией,
+    что calculate_payback_rent и calculate_payback_rent_and_sale
+    """
+    cumulative_rent = cumulative_rent[:, :max_years + 1]
+    sale_prices = sale_prices[:, :max_years + 1]
+
+    payback_rent_years = np.where(
+        cumulative_rent[:, 1] >= purchase_price,
+        1.0,
+        _payback_from_matrix(cumulative_rent, purchase_price, max_years)
+    )
+
+    target = 2.0 * purchase_price
+    rent_1 = cumulative_rent[:, 1]
+    sale_1 = sale_prices[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first_year = np.where(
+            rent_1 >= target, 1.0,
+            np.where(sale_1 > 0, 1.0 + (target - rent_1) / sale_1 * 0.5, 1.0)  # Упрощённо, как в эталоне
+        )
+    payback_rent_sale_years = np.where(
+        rent_1 + sale_1 >= target,
+        first_year,
+        _payback_from_matrix(cumulative_rent + sale_prices, target, max_years)
+    )
+    return payback_rent_years, payback_rent_sale_years
+
+
+def npv_cash_flows(flows: np.ndarray, discount_rate: np.ndarray) -> np.ndarray:
+    """
+    NPV произвольных потоков (строки × годы 0..N) схемой Горнера по столбцам
+    Подходит для потоков, которые не описываются геометрическим рядом (Монте-Карло)
+    """
+    discount = 1.0 / (1.0 + discount_rate)
+    npv = np.zeros(flows.shape[0])
+    for column in range(flows.shape[1] - 1, -1, -1):
+        npv = npv * discount + flows[:, column]
+    return npv
+
+
+def _npv_and_derivative_cash_flows(flows: np.ndarray, rate: np.ndarray):
+    """NPV и dNPV/dr произвольных потоков за один проход Горнера"""
+    discount = 1.0 / (1.0 + rate)
+    npv = np.zeros(flows.shape[0])
+    # S(v) = SUM CF_t * v^t, dS/dv = SUM t * CF_t * v^(t-1), dNPV/dr = -v^2 * dS/dv
+    d_npv_dv = np.zeros(flows.shape[0])
+    for column in range(flows.shape[1] - 1, -1, -1):
+        d_npv_dv = d_npv_dv * discount + npv
+        npv = npv * discount + flows[:, column]
+    return npv, -discount ** 2 * d_npv_dv
+
+
+def solve_irr_cash_flows(
+    flows: np.ndarray,
+    tolerance: float = 1e-10,
+    max_iterations: int = 100
+):
+    """
+    IRR для матрицы произвольных потоков (строки × годы 0..N)
+    Тот же метод Ньютона с вилкой, что solve_irr_array; потоки должны начинаться
+    с отрицательного CF_0 и далее быть неотрицательными (корень единственный).
+    Возвращает (rate, iterations, converged).
+    """
+    rows = flows.shape[0]
+    low = np.full(rows, 0.0001)
+    has_root = npv_cash_flows(flows, low) > 0
+    iterations = np.zeros(rows, dtype=int)
+    converged = np.zeros(rows, dtype=bool)
+
+    high = np.ones(rows)
+    expanding = has_root.copy()
+    while expanding.any():
+        expanding &= npv_cash_flows(flows, high) > 0
+        expanding &= high <= 1e9
+        low = np.where(expanding, high, low)
+        high = np.where(expanding, high * 2, high)
+        iterations += expanding
+    has_root &= high <= 1e9
+
+    # Начальное приближение: среднегодовой рост суммарных поступлений
+    purchase_price = -flows[:, 0]
+    inflows = flows[:, 1:].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        start = (inflows / purchase_price) ** (1.0 / (flows.shape[1] - 1)) - 1
+    start = np.where((low < start) & (start < high), start, (low + high) / 2)
+    rate = np.where(has_root, start, 0.0)
+
+    active = has_root.copy()
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        iterations += active
+        value, derivative = _npv_and_derivative_cash_flows(flows, rate)
+        low = np.where(active & (value > 0), rate, low)
+        high = np.where(active & (value <= 0), rate, high)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = rate - value / derivative
+        newton_ok = (derivative < 0) & np.isfinite(newton)
+        step_done = newton_ok & (np.abs(newton - rate) <= tolerance * (1 + np.abs(rate)))
+        step_done |= value == 0
+
+        next_rate = np.where(newton_ok & (low < newton) & (newton < high), newton, (low + high) / 2)
+        bracket_done = high - low <= tolerance * (1 + np.abs(rate))
+
+        done = active & (step_done | bracket_done)
+        rate = np.where(active & step_done, np.where(newton_ok, newton, rate), rate)
+        rate = np.where(active & ~step_done, next_rate, rate)
+        converged |= done
+        active &= ~done
+
+    return rate, iterations, converged
+
+
+class BatchResult:
+    """Метрики пакета: по массиву на каждое поле ответа calculate_metrics"""
+
+    def __init__(self, **arrays):
+        self.__dict__.update(arrays)
+
+    def __len__(self) -> int:
+        return self.purchase_price.shape[0]
+
+    def cash_flows(self, index: int) -> List[Dict[str, float]]:
+        """Денежные потоки строки в формате ответа API"""
+        holding_years = int(self.holding_years[index])
+        return [
+            {"year": year, "cf": float(cf)}
+            for year, cf in enumerate(self.cash_flow_matrix[index, :holding_years + 1])
+        ]
+
+    def to_dict(self, index: int) -> dict:
+        """Строка пакета в формате calculate_metrics"""
+        return {
+            "static_metrics": {
+                "payback_rent_years": float(self.payback_rent_years[index]),
+                "payback_rent_sale_years": float(self.payback_rent_sale_years[index]),
+                "double_price_years": float(self.double_price_years[index])
+            },
+            "dynamic_metrics": {
+                "holding_years": int(self.holding_years[index]),
+                "rent_income_total": float(self.rent_income_total[index]),
+                "rent_income_yield_percent": float(self.rent_income_yield_percent[index]),
+                "sale_profit": float(self.sale_profit[index]),
+                "sale_profit_percent": float(self.sale_profit_percent[index]),
+                "total_profit": float(self.total_profit[index]),
+                "total_profit_percent": float(self.total_profit_percent[index]),
+                "npv": float(self.npv[index]),
+                "irr_percent": float(self.irr_percent[index])
+            },
+            "cash_flows": self.cash_flows(index)
+        }
+
+    def to_dicts(self) -> List[dict]:
+        """Все строки пакета; массивы переводятся в списки Python один раз, а не поэлементно"""
+        static_fields = ("payback_rent_years", "payback_rent_sale_years", "double_price_years")
+        dynamic_fields = (
+            "holding_years", "rent_income_total", "rent_income_yield_percent", "sale_profit",
+            "sale_profit_percent", "total_profit", "total_profit_percent", "npv", "irr_percent"
+        )
+        columns = {name: getattr(self, name).tolist() for name in static_fields + dynamic_fields}
+        flows = self.cash_flow_matrix.tolist()
+        return [
+            {
+                "static_metrics": {name: columns[name][index] for name in static_fields},
+                "dynamic_metrics": {name: columns[name][index] for name in dynamic_fields},
+                "cash_flows": [
+                    {"year": year, "cf": cf}
+                    for year, cf in enumerate(flows[index][:columns["holding_years"][index] + 1])
+                ]
+            }
+            for index in range(len(self))
+        ]
+
+
+def calculate_metrics_batch(
+    purchase_price,
+    area,
+    rent_start,  # R0 в руб/м²/год (годовая ставка)
+    rent_growth_annual,  # g_r' с учётом сценария
+    price_growth_annual,  # g_p' с учётом сценария
+    holding_years,
+    discount_rate=0.12,
+    max_years: int = 50
+) -> BatchResult:
+    """
+    Все статические и динамические метрики для пакета строк
+
+    Аргументы — массивы одинаковой длины (или скаляры, которые растягиваются).
+    Окупаемости ищутся по матрице строки × годы 1..max_years, NPV и IRR —
+    по замкнутым формулам.
+    """
+    purchase_price, area, rent_start, rent_growth_annual, price_growth_annual, discount_rate = (
+        np.asarray(values, dtype=float) for values in np.broadcast_arrays(
+            purchase_price, area, rent_start, rent_growth_annual, price_growth_annual, discount_rate
+        )
+    )
+    holding_years = np.broadcast_to(np.asarray(holding_years, dtype=int), purchase_price.shape)
+    rows = purchase_price.shape[0]
+    annual_rent = area * rent_start
+
+    # Матрица графика: аренда, накопленная аренда и цена по годам 0..horizon
+    horizon = max(max_years, int(holding_years.max()) if rows else 1)
+    years = np.arange(horizon + 1)
+    with np.errstate(over="ignore", invalid="ignore"):
+        rent_factor = (1 + rent_growth_annual[:, None]) ** np.maximum(years - 2, 0)
+        sale_prices = purchase_price[:, None] * (1 + price_growth_annual[:, None]) ** years
+    rents = annual_rent[:, None] * rent_factor
+    rents[:, 0] = 0.0
+    rents[:, 1] = 0.5 * annual_rent
+    cumulative_rent = np.cumsum(rents, axis=1)
+
+    # Статические метрики
+    payback_rent_years, payback_rent_sale_years = payback_years_from_schedule(
+        cumulative_rent, sale_prices, purchase_price, max_years
+    )
+
+    with np.errstate(divide="ignore"):
+        double_price_years = np.where(
+            price_growth_annual > 0,
+            np.log(2) / np.log1p(np.maximum(price_growth_annual, 0)),
+            np.inf
+        )
+
+    # Динамические метрики
+    rows_index = np.arange(rows)
+    rent_income_total = cumulative_rent[rows_index, holding_years]
+    sale_profit = sale_prices[rows_index, holding_years] - purchase_price
+    total_profit = rent_income_total + sale_profit
+    with np.errstate(divide="ignore", invalid="ignore"):
+        positive_price = purchase_price > 0
+        rent_income_yield_percent = np.where(positive_price, rent_income_total / purchase_price, 0.0)
+        sale_profit_percent = np.where(positive_price, sale_profit / purchase_price, 0.0)
+        total_profit_percent = np.where(positive_price, total_profit / purchase_price, 0.0)
+
+    npv = npv_array(
+        purchase_price, annual_rent, rent_growth_annual, price_growth_annual,
+        holding_years, discount_rate
+    )
+    irr, irr_iterations, irr_converged = solve_irr_array(
+        purchase_price, annual_rent, rent_growth_annual, price_growth_annual, holding_years
+    )
+
+    # Денежные потоки: CF_0 = -P0, CF_t = Rent_t, CF_N = Rent_N + Price_N (при N >= 2)
+    cash_flow_matrix = rents.copy()
+    cash_flow_matrix[:, 0] = -purchase_price
+    cash_flow_matrix[rows_index, holding_years] += np.where(
+        holding_years >= 2, sale_prices[rows_index, holding_years], 0.0
+    )
+
+    return BatchResult(
+        purchase_price=purchase_price,
+        holding_years=holding_years,
+        payback_rent_years=payback_rent_years,
+        payback_rent_sale_years=payback_rent_sale_years,
+        double_price_years=double_price_years,
+        rent_income_total=rent_income_total,
+        rent_income_yield_percent=rent_income_yield_percent,
+        sale_profit=sale_profit,
+        sale_profit_percent=sale_profit_percent,
+        total_profit=total_profit,
+        total_profit_percent=total_profit_percent,
+        npv=npv,
+        irr_percent=irr,
+        irr_iterations=irr_iterations,
+        irr_converged=irr_converged,
+        cash_flow_matrix=cash_flow_matrix
+    )
@@ -3,7 +3,10 @@
 Согласно ТЗ, раздел 4
 """
 import math
-from typing import List, Dict
+from typing import List, Dict, Optional
+from app.calc.analytic import (
+    IRRResult, calculate_npv_closed_form, calculate_payback_rent_closed_form, solve_irr
+)
 
 
 def calculate_rent_income(
@@ -300,3 +303,165 @@ def calculate_cash_flows(
         cash_flows.append({"year": holding_years, "cf": cf_n})
     
     return cash_flows
+
+
+class CashFlowSchedule:
+    """
+    Годовой график денежных потоков, рассчитываемый один раз за O(N)
+
+    rents[t]            — Rent_t (rents[0] = 0)
+    cumulative_rent[t]  — SUM(i=1 to t) Rent_i
+    sale_prices[t]      — Price_t = P0 * (1 + g_p')^t
+
+    Все метрики calculate_metrics выводятся из этих массивов без повторного
+    построения ряда аренды; NPV и окупаемость по аренде — по замкнутым
+    формулам из app.calc.analytic за O(1).
+    """
+
+    def __init__(
+        self,
+        purchase_price: float,
+        area: float,
+        rent_start: float,  # R0 в руб/м²/год (годовая ставка)
+        rent_growth_annual: float,  # g_r'
+        price_growth_annual: float,  # g_p'
+        horizon_years: int  # не меньше 1
+    ):
+        self.purchase_price = purchase_price
+        self.area = area
+        self.rent_start = rent_start
+        self.rent_growth_annual = rent_growth_annual
+        self.price_growth_annual = price_growth_annual
+        self.horizon_years = horizon_years
+
+        rents = [0.0] * (horizon_years + 1)
+        cumulative_rent = [0.0] * (horizon_years + 1)
+        sale_prices = [purchase_price] * (horizon_years + 1)
+
+        # Год 1: 6 месяцев аренды (половина годовой ставки)
+        annual_rent = area * rent_start
+        rents[1] = 0.5 * annual_rent
+        cumulative_rent[1] = rents[1]
+        price = purchase_price * (1 + price_growth_annual)
+        sale_prices[1] = price
+
+        # Годы 2..N: Rent_t = A * R0 * (1 + g_r')^(t-2), Price_t = Price_(t-1) * (1 + g_p')
+        rent_factor = 1.0
+        for year in range(2, horizon_years + 1):
+            rents[year] = annual_rent * rent_factor
+            cumulative_rent[year] = cumulative_rent[year - 1] + rents[year]
+            rent_factor *= 1 + rent_growth_annual
+            price *= 1 + price_growth_annual
+            sale_prices[year] = price
+
+        self.rents = rents
+        self.cumulative_rent = cumulative_rent
+        self.sale_prices = sale_prices
+
+    def rent_income(self, holding_years: int) -> float:
+        """Совокупная прибыль от аренды за N лет"""
+        return self.cumulative_rent[holding_years]
+
+    def sale_price(self, holding_years: int) -> float:
+        """Стоимость объекта к концу года N"""
+        return self.sale_prices[holding_years]
+
+    def sale_profit(self, holding_years: int) -> float:
+        """Прибыль от продажи"""
+        return self.sale_prices[holding_years] - self.purchase_price
+
+    def cash_flow_values(self, holding_years: int) -> List[float]:
+        """
+        Денежные потоки CF_0..CF_N
+        CF_0 = -P0, CF_t (1..N-1) = Rent_t, CF_N = Rent_N + Price_N (при N >= 2)
+        """
+        flows = [-self.purchase_price] + self.rents[1:holding_years + 1]
+        if holding_years >= 2:
+            flows[holding_years] += self.sale_prices[holding_years]
+        return flows
+
+    def cash_flows(self, holding_years: int) -> List[Dict[str, float]]:
+        """Денежные потоки в формате ответа API"""
+        return [
+            {"year": year, "cf": cf}
+            for year, cf in enumerate(self.cash_flow_values(holding_years))
+        ]
+
+    def npv(self, holding_years: int, discount_rate: float = 0.12) -> float:
+        """NPV = SUM(t=0 to N) CF_t / (1+d)^t, в замкнутой форме"""
+        return calculate_npv_closed_form(
+            self.purchase_price, self.area, self.rent_start,
+            self.rent_growth_annual, self.price_growth_annual,
+            holding_years, discount_rate
+        )
+
+    def npv_by_holding_years(self, discount_rate: float, max_holding_years: int) -> List[float]:
+        """
+        NPV для каждого срока владения N = 1..max_holding_years (индекс списка = N)
+
+        Префиксная сумма дисконтированной аренды и дисконт-факторы строятся один
+        раз, после чего NPV(N) = -P0 + SUM(t<=N) Rent_t * v^t + Price_N * v^N — O(1) на срок.
+        """
+        discount = 1.0 / (1.0 + discount_rate)
+        npvs = [-self.purchase_price] * (max_holding_years + 1)
+        discounted_rent = 0.0
+        factor = 1.0
+        for year in range(1, max_holding_years + 1):
+            factor *= discount
+            discounted_rent += self.rents[year] * factor
+            npvs[year] = -self.purchase_price + discounted_rent
+            if year >= 2:
+                npvs[year] += self.sale_prices[year] * factor
+        return npvs
+
+    def irr(self, holding_years: int, guess: Optional[float] = None) -> IRRResult:
+        """
+        IRR — ставка r, при которой NPV(r) = 0
+        Метод Ньютона с аналитической производной (см. app.calc.analytic.solve_irr)
+        """
+        return solve_irr(
+            self.purchase_price, self.area, self.rent_start,
+            self.rent_growth_annual, self.price_growth_annual,
+            holding_years, guess=guess
+        )
+
+    def payback_rent(self, max_years: int = 50) -> float:
+        """
+        Срок окупаемости при сдаче в аренду (без продажи)
+        Минимальный t, при котором SUM(i=1 to t) Rent_i >= P0, с линейной интерполяцией
+        """
+        return calculate_payback_rent_closed_form(
+            self.purchase_price, self.area, self.rent_start,
+            self.rent_growth_annual, max_years
+        )
+
+    def payback_rent_and_sale(self, max_years: int = 50) -> float:
+        """
+        Минимальный t, при котором SUM(i=1 to t) Rent_i + Price_t >= 2 * P0
+        Повторяет интерполяцию calculate_payback_rent_and_sale
+        """
+        max_years = min(max_years, self.horizon_years)
+        target_value = 2.0 * self.purchase_price
+
+        accumulated_rent_1 = self.cumulative_rent[1]
+        sale_price_1 = self.sale_prices[1]
+        if accumulated_rent_1 + sale_price_1 >= target_value:
+            if accumulated_rent_1 >= target_value:
+                return 1.0
+            remaining = target_value - accumulated_rent_1
+            if sale_price_1 > 0:
+                fraction = remaining / sale_price_1
+                return 1.0 + fraction * 0.5  # Упрощённо
+            return 1.0
+
+        for year in range(2, max_years + 1):
+            total_value = self.cumulative_rent[year] + self.sale_prices[year]
+            if total_value >= target_value:
+                prev_total = self.cumulative_rent[year - 1] + self.sale_prices[year - 1]
+                remaining = target_value - prev_total
+                growth = total_value - prev_total
+                if growth > 0:
+                    return year - 1 + remaining / growth
+                return float(year)
+
+        return float(max_years)
@@ -0,0 +1,324 @@
+"""
+Write-behind запись расчётов в таблицу calculations
+
+Маршрут расчёта только кладёт запись в ограниченную очередь в памяти процесса и сразу
+отвечает. Фоновая задача забирает записи пачками и пишет их многострочным INSERT:
+пачка уходит, когда набралось CALC_HISTORY_BATCH_SIZE записей или прошло
+CALC_HISTORY_FLUSH_INTERVAL_MS с первой записи пачки.
+
+Back-pressure: при заполненной очереди запрос ждёт свободного места не дольше
+CALC_HISTORY_PUT_TIMEOUT_MS, после чего запись отбрасывается (счётчик dropped) —
+история не должна ронять или заметно замедлять расчёт. При остановке приложения
+очередь дописывается целиком.
+
+Хранение рассчитано на объём: в Postgres таблица секционирована по месяцам
+created_at (секции на несколько месяцев вперёд создаёт ensure_partitions при старте),
+результат хранится в JSONB компактно (encode_result), а сводные метрики лежат в
+отдельных колонках — список истории (list_history) читает только их и листается
+курсором по (created_at, id) вместо OFFSET. Секции проверяются и при работе процесса
+(maintain_partitions, раз в CALC_HISTORY_PARTITION_CHECK_INTERVAL_SECONDS).
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import insert, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Calculation
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Сводные метрики, которые хранятся отдельными колонками
+SUMMARY_FIELDS = ("npv", "irr_percent", "total_profit", "total_profit_percent")
+
+# Колонки списка истории без result_json
+LIST_COLUMNS = (
+    Calculation.id, Calculation.created_at, Calculation.lot_id, Calculation.purchase_price,
+    Calculation.area, Calculation.location_group_id, Calculation.rve_date,
+    Calculation.holding_years, Calculation.scenario_id, Calculation.report_id,
+    *(getattr(Calculation, field) for field in SUMMARY_FIELDS)
+)
+
+
+def encode_result(result: dict) -> dict:
+    """Результат расчёта для result_json: cash-flows — массив сумм, индекс = год"""
+    return {
+        "static_metrics": result["static_metrics"],
+        "dynamic_metrics": result["dynamic_metrics"],
+        "cash_flows": [flow["cf"] for flow in result["cash_flows"]],
+    }
+
+
+def decode_result(stored: dict) -> dict:
+    """Обратное encode_result; строки старого формата ({year, cf}) возвращаются как есть"""
+    cash_flows = stored.get("cash_flows", [])
+    if cash_flows and not isinstance(cash_flows[0], dict):
+        cash_flows = [{"year": year, "cf": cf} for year, cf in enumerate(cash_flows)]
+    return {**stored, "cash_flows": cash_flows}
+
+
+def encode_cursor(created_at: datetime, calculation_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), calculation_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) последней строки предыдущей страницы; ValueError для чужой строки"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, calculation_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(calculation_id)
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный курсор истории")
+
+
+async def list_history(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    details: bool = False
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Страница истории пользователя, новые расчёты первыми, и курсор следующей страницы
+    Запрос идёт по индексу ix_calculations_user_created и не зависит от номера страницы
+    """
+    columns = LIST_COLUMNS + ((Calculation.result_json,) if details else ())
+    query = (
+        select(*columns)
+        .where(Calculation.user_id == user_id)
+        .order_by(Calculation.created_at.desc(), Calculation.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        query = query.where(tuple_(Calculation.created_at, Calculation.id) < decode_cursor(cursor))
+
+    rows = (await db.execute(query)).all()
+    items = []
+    for row in rows[:limit]:
+        item = dict(row._mapping)
+        if details:
+            item["result"] = decode_result(item.pop("result_json"))
+        items.append(item)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return items, next_cursor
+
+
+def _month_start(value: date, months: int = 0) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+async def ensure_partitions(connection: AsyncConnection, months_ahead: int, today: Optional[date] = None):
+    """
+    Секции calculations на текущий месяц и months_ahead следующих (только Postgres)
+    Строки вне созданных секций попадают в calculations_default. Если там уже есть строки
+    месяца новой секции (секцию не успели создать заранее), Postgres не даст создать её
+    рядом с DEFAULT: default-секция отсоединяется, строки месяца переносятся в новую
+    секцию и default подключается обратно — всё в транзакции connection.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    today = today or datetime.now(timezone.utc).date()
+    for offset in range(months_ahead + 1):
+        start = _month_start(today, offset)
+        end = _month_start(start, 1)
+        name = f"calculations_{start:%Y_%m}"
+        if await connection.scalar(text(f"SELECT to_regclass('{name}') IS NOT NULL")):
+            continue
+        bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        in_month = f"created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}'"
+        stranded = await connection.scalar(text(
+            f"SELECT EXISTS (SELECT 1 FROM calculations_default WHERE {in_month})"
+        ))
+        if not stranded:
+            await connection.execute(text(f"CREATE TABLE {name} PARTITION OF calculations FOR VALUES {bounds}"))
+            continue
+        logger.warning("Строки %s в calculations_default переносятся в новую секцию", name)
+        await connection.execute(text("ALTER TABLE calculations DETACH PARTITION calculations_default"))
+        await connection.execute(text(f"CREATE TABLE {name} PARTITION OF calculations FOR VALUES {bounds}"))
+        await connection.execute(text(f"INSERT INTO {name} SELECT * FROM calculations_default WHERE {in_month}"))
+        await connection.execute(text(f"DELETE FROM calculations_default WHERE {in_month}"))
+        await connection.execute(text("ALTER TABLE calculations ATTACH PARTITION calculations_default DEFAULT"))
+
+
+async def maintain_partitions(engine, months_ahead: int, interval_seconds: float):
+    """
+    Фоновая задача: ensure_partitions раз в interval_seconds, чтобы процесс, работающий
+    дольше months_ahead месяцев, не начал писать новые месяцы в calculations_default
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with engine.begin() as connection:
+                await ensure_partitions(connection, months_ahead)
+        except Exception:
+            logger.exception("Секции calculations не созданы, повтор через %s с", interval_seconds)
+
+
+class CalculationWriter:
+    """Очередь записей calculations с фоновой пакетной записью"""
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval_ms: int,
+        queue_size: int,
+        put_timeout_ms: int,
+        session_factory=AsyncSessionLocal
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout_ms / 1000
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописывает всё, что уже в очереди, и останавливает фоновую задачу"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def record(
+        self,
+        *,
+        purchase_price: float,
+        area: float,
+        location_group_id: str,
+        holding_years: int,
+        scenario_id: str,
+        report_id: int,
+        result: dict,
+        rve_date: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        lot_id: Optional[int] = None
+    ):
+        """Постановка расчёта в очередь на запись"""
+        if not self.running:
+            return
+        dynamic_metrics = result["dynamic_metrics"]
+        row = {
+            "user_id": user_id,
+            "lot_id": lot_id,
+            "purchase_price": purchase_price,
+            "area": area,
+            "location_group_id": location_group_id,
+            "rve_date": rve_date,
+            "holding_years": holding_years,
+            "scenario_id": scenario_id,
+            "report_id": report_id,
+            "result_json": encode_result(result),
+            "created_at": datetime.now(timezone.utc),
+            **{field: dynamic_metrics.get(field) for field in SUMMARY_FIELDS},
+        }
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(row), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return
+        self.enqueued += 1
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+        # Остановка: всё, что осталось в очереди, дописывается без ожидания таймера
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[start:start + self.batch_size])
+
+    async def _write(self, batch: List[dict]):
+        try:
+            async with self.session_factory() as db:
+                await db.execute(insert(Calculation), batch)
+                await db.commit()
+        except IntegrityError:
+            if len(batch) == 1:
+                self.failed += 1
+                logger.exception("Расчёт не записан в историю")
+                return
+            # Одна плохая строка (например, удалённый пользователь) не должна терять всю пачку
+            for row in batch:
+                await self._write([row])
+            return
+        except Exception:
+            # БД недоступна: пачка теряется, фоновая задача продолжает работу
+            self.failed += len(batch)
+            logger.exception("Пачка расчётов (%d) не записана в историю", len(batch))
+            return
+        self.batches += 1
+        self.written += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+calculation_writer = CalculationWriter(
+    batch_size=settings.CALC_HISTORY_BATCH_SIZE,
+    flush_interval_ms=settings.CALC_HISTORY_FLUSH_INTERVAL_MS,
+    queue_size=settings.CALC_HISTORY_QUEUE_SIZE,
+    put_timeout_ms=settings.CALC_HISTORY_PUT_TIMEOUT_MS
+)
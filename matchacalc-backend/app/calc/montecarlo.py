@@ -0,0 +1,174 @@
+"""
+Монте-Карло: стохастические темпы роста аренды и цены, опционально — вакантность
+
+Каждый путь — свой ряд годовых темпов роста g_r'(t), g_p'(t) ~ N(среднее сценария, σ)
+с корреляцией ρ. Пути считаются векторно блоками по CHUNK_PATHS; блоки раздаются
+пулу процессов. Каждый блок получает своё зерно из SeedSequence(seed).spawn(...),
+поэтому результат зависит только от seed и числа путей, но не от числа процессов.
+"""
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.calc.batch import npv_cash_flows, payback_years_from_schedule, solve_irr_cash_flows
+from app.config import settings
+
+# Число путей в одном блоке (≈ 25k × 50 лет × 8 байт = 10 МБ на матрицу)
+CHUNK_PATHS = 25_000
+
+# Разброс годовой вакантности вокруг значения из отчёта: σ = sqrt(v * (1 - v) / (k + 1)),
+# как у бета-распределения с концентрацией k (нормальное приближение в 4–5 раз быстрее)
+VACANCY_CONCENTRATION = 50.0
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов создаётся при первом обращении; None — считать в текущем процессе"""
+    global _pool
+    workers = settings.MONTE_CARLO_WORKERS or multiprocessing.cpu_count()
+    if workers <= 1:
+        return None
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    """Остановка пула процессов (при остановке приложения)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _simulate_chunk(
+    paths: int,
+    seed: np.random.SeedSequence,
+    purchase_price: float,
+    area: float,
+    rent_start: float,
+    rent_growth_annual: float,
+    price_growth_annual: float,
+    holding_years: int,
+    discount_rate: float,
+    rent_growth_volatility: float,
+    price_growth_volatility: float,
+    growth_correlation: float,
+    vacancy_rate: Optional[float],
+    max_years: int
+) -> dict:
+    """Один блок путей: NPV, IRR и сроки окупаемости по каждому пути"""
+    rng = np.random.default_rng(seed)
+    horizon = max(holding_years, max_years)
+
+    # Коррелированные шоки темпов роста по годам 1..horizon
+    rent_shock = rng.standard_normal((paths, horizon))
+    price_shock = (
+        growth_correlation * rent_shock
+        + np.sqrt(1 - growth_correlation ** 2) * rng.standard_normal((paths, horizon))
+    )
+    rent_growth = np.maximum(rent_growth_annual + rent_growth_volatility * rent_shock, -0.99)
+    price_growth = np.maximum(price_growth_annual + price_growth_volatility * price_shock, -0.99)
+
+    # Графики по годам 0..horizon (столбец = год)
+    rent_factor = np.ones((paths, horizon + 1))
+    # Rent_2 = A * R0, далее Rent_t = Rent_(t-1) * (1 + g_r'(t)) для t >= 3
+    rent_factor[:, 3:] = np.cumprod(1 + rent_growth[:, 2:], axis=1)
+    rents = area * rent_start * rent_factor
+    rents[:, 0] = 0.0
+    rents[:, 1] = 0.5 * area * rent_start
+
+    if vacancy_rate is not None and 0 < vacancy_rate < 1:
+        vacancy_sigma = np.sqrt(vacancy_rate * (1 - vacancy_rate) / (VACANCY_CONCENTRATION + 1))
+        vacancy = vacancy_rate + vacancy_sigma * rng.standard_normal((paths, horizon))
+        rents[:, 1:] *= 1 - np.clip(vacancy, 0.0, 0.99)
+
+    sale_prices = np.empty((paths, horizon + 1))
+    sale_prices[:, 0] = purchase_price
+    sale_prices[:, 1:] = purchase_price * np.cumprod(1 + price_growth, axis=1)
+    cumulative_rent = np.cumsum(rents, axis=1)
+
+    # Денежные потоки за срок владения
+    flows = rents[:, :holding_years + 1].copy()
+    flows[:, 0] = -purchase_price
+    if holding_years >= 2:
+        flows[:, holding_years] += sale_prices[:, holding_years]
+
+    prices = np.full(paths, purchase_price)
+    payback_rent, payback_rent_sale = payback_years_from_schedule(
+        cumulative_rent, sale_prices, prices, max_years
+    )
+    irr, _, _ = solve_irr_cash_flows(flows)
+    return {
+        "npv": npv_cash_flows(flows, np.full(paths, discount_rate)),
+        "irr": irr,
+        "payback_rent_years": payback_rent,
+        "payback_rent_sale_years": payback_rent_sale,
+    }
+
+
+def _bands(values: np.ndarray) -> dict:
+    """Среднее и перцентили"""
+    percentiles = np.percentile(values, PERCENTILES)
+    bands = {f"p{p}": float(value) for p, value in zip(PERCENTILES, percentiles)}
+    bands["mean"] = float(values.mean())
+    return bands
+
+
+def run_monte_carlo(
+    purchase_price: float,
+    area: float,
+    rent_start: float,  # R0 в руб/м²/год (годовая ставка)
+    rent_growth_annual: float,  # g_r' с учётом сценария — среднее
+    price_growth_annual: float,  # g_p' с учётом сценария — среднее
+    holding_years: int,
+    paths: int = 10_000,
+    seed: Optional[int] = None,
+    discount_rate: float = 0.12,
+    rent_growth_volatility: float = 0.05,
+    price_growth_volatility: float = 0.04,
+    growth_correlation: float = 0.5,
+    vacancy_rate: Optional[float] = None,
+    max_years: int = 50
+) -> dict:
+    """
+    Перцентильные полосы NPV, IRR и сроков окупаемости по paths путям
+    seed=None — случайное зерно, которое возвращается в ответе для воспроизведения
+    """
+    if seed is None:
+        # Зерно укладывается в 2^53, чтобы без потерь пройти через JSON в браузер
+        seed = int(np.random.SeedSequence().entropy % 2 ** 53)
+    seed_sequence = np.random.SeedSequence(seed)
+    chunk_sizes = [CHUNK_PATHS] * (paths // CHUNK_PATHS)
+    if paths % CHUNK_PATHS:
+        chunk_sizes.append(paths % CHUNK_PATHS)
+    chunk_seeds = seed_sequence.spawn(len(chunk_sizes))
+
+    params = (
+        purchase_price, area, rent_start, rent_growth_annual, price_growth_annual,
+        holding_years, discount_rate, rent_growth_volatility, price_growth_volatility,
+        growth_correlation, vacancy_rate, max_years
+    )
+    pool = _get_pool() if len(chunk_sizes) > 1 else None
+    if pool is None:
+        chunks = [_simulate_chunk(size, chunk_seed, *params) for size, chunk_seed in zip(chunk_sizes, chunk_seeds)]
+    else:
+        futures = [
+            pool.submit(_simulate_chunk, size, chunk_seed, *params)
+            for size, chunk_seed in zip(chunk_sizes, chunk_seeds)
+        ]
+        chunks = [future.result() for future in futures]
+
+    results = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    return {
+        "paths": paths,
+        "seed": seed,
+        "npv": _bands(results["npv"]),
+        "irr": _bands(results["irr"]),
+        "payback_rent_years": _bands(results["payback_rent_years"]),
+        "payback_rent_sale_years": _bands(results["payback_rent_sale_years"]),
+        "probability_npv_negative": float((results["npv"] < 0).mean()),
+    }
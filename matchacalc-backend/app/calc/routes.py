@@ -1,24 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
-from app.calc.schemas import CalculationRequest, CalculationResponse
-from app.calc.service import calculate_metrics
+from typing import List, Optional
+from app.calc.schemas import (
+    CalculationRequest, CalculationResponse, BatchCalculationRequest, CalculationHistoryResponse,
+    SweepRequest, SweepResponse, SensitivityRequest, SensitivityResponse,
+    MonteCarloRequest, MonteCarloResponse
+)
+from app.calc.service import (
+    calculate_metrics, calculate_batch, calculate_sweep, calculate_metrics_sensitivity,
+    calculate_metrics_monte_carlo
+)
 from app.db.models import PropertyClass
+from app.auth.dependencies import get_current_user, get_optional_user_id
+from app.calc.history import calculation_writer, list_history
 
 router = APIRouter()
 
 
 @router.post("/preview", response_model=CalculationResponse)
-def calculate_preview(
+async def calculate_preview(
     request: CalculationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    user_id: Optional[int] = Depends(get_optional_user_id)
 ):
     """
     Разовый расчёт по ручному вводу
-    Rate-limiting применяется через middleware
+    Rate-limiting применяется через middleware, запись в историю — в фоне (app.calc.history)
     """
     try:
-        result = calculate_metrics(
+        result = await calculate_metrics(
             db=db,
             purchase_price=request.purchase_price,
             area=request.area,
@@ -28,7 +39,174 @@ def calculate_preview(
             holding_years=request.holding_years,
             property_class=request.property_class or PropertyClass.A
         )
-        return CalculationResponse(**result)
+        response = CalculationResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка расчёта: {str(e)}"
+        )
+
+    await calculation_writer.record(
+        user_id=user_id,
+        purchase_price=request.purchase_price,
+        area=request.area,
+        location_group_id=request.location_group_id,
+        rve_date=request.rve_date,
+        holding_years=request.holding_years,
+        scenario_id=request.scenario_id,
+        report_id=request.report_id,
+        result=result
+    )
+    return response
+
+
+@router.get("/history", response_model=CalculationHistoryResponse)
+async def get_history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    details: bool = Query(False, description="Включить полный результат с cash-flows"),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    История расчётов текущего пользователя, новые первыми
+    По умолчанию — только сводные метрики; страницы листаются курсором, а не OFFSET
+    """
+    try:
+        items, next_cursor = await list_history(db, current_user.id, limit, cursor, details)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return CalculationHistoryResponse(items=items, next_cursor=next_cursor)
+
+
+@router.post("/batch", response_model=List[CalculationResponse])
+async def calculate_batch_preview(
+    request: BatchCalculationRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Пакетный расчёт до 1000 лотов за один запрос
+    Ответ — по одному CalculationResponse на строку, в порядке запроса
+    """
+    try:
+        results = await calculate_batch(db=db, items=request.items)
+        return [CalculationResponse(**result) for result in results]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка расчёта: {str(e)}"
+        )
+
+
+@router.post("/sweep", response_model=SweepResponse)
+async def calculate_sweep_preview(
+    request: SweepRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Все сценарии × сроки владения 1..max_holding_years одним ответом
+    Заменяет серию запросов /preview при переборе сценариев и сроков
+    """
+    try:
+        result = await calculate_sweep(
+            db=db,
+            purchase_price=request.purchase_price,
+            area=request.area,
+            location_group_id=request.location_group_id,
+            report_id=request.report_id,
+            property_class=request.property_class or PropertyClass.A,
+            max_holding_years=request.max_holding_years
+        )
+        return SweepResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка расчёта: {str(e)}"
+        )
+
+
+@router.post("/sensitivity", response_model=SensitivityResponse)
+async def calculate_sensitivity_preview(
+    request: SensitivityRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Чувствительность NPV и IRR к ±delta_percent по ключевым параметрам
+    Данные для торнадо-диаграммы и таблица «рост цены × рост аренды»
+    """
+    try:
+        result = await calculate_metrics_sensitivity(
+            db=db,
+            purchase_price=request.purchase_price,
+            area=request.area,
+            location_group_id=request.location_group_id,
+            report_id=request.report_id,
+            scenario_id=request.scenario_id,
+            holding_years=request.holding_years,
+            property_class=request.property_class or PropertyClass.A,
+            discount_rate=request.discount_rate,
+            delta=request.delta_percent / 100,
+            grid_steps=request.grid_steps
+        )
+        return SensitivityResponse(**result)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка расчёта: {str(e)}"
+        )
+
+
+@router.post("/monte-carlo", response_model=MonteCarloResponse)
+async def calculate_monte_carlo_preview(
+    request: MonteCarloRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Стохастический расчёт: перцентили NPV, IRR и сроков окупаемости
+    по случайным траекториям роста аренды и цены
+    """
+    try:
+        result = await calculate_metrics_monte_carlo(
+            db=db,
+            purchase_price=request.purchase_price,
+            area=request.area,
+            location_group_id=request.location_group_id,
+            report_id=request.report_id,
+            scenario_id=request.scenario_id,
+            holding_years=request.holding_years,
+            property_class=request.property_class or PropertyClass.A,
+            discount_rate=request.discount_rate,
+            paths=request.paths,
+            seed=request.seed,
+            rent_growth_volatility=request.rent_growth_volatility,
+            price_growth_volatility=request.price_growth_volatility,
+            growth_correlation=request.growth_correlation,
+            include_vacancy=request.include_vacancy
+        )
+        return MonteCarloResponse(**result)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -42,3 +42,114 @@ class CalculationResponse(BaseModel):
     static_metrics: StaticMetrics
     dynamic_metrics: DynamicMetrics
     cash_flows: List[CashFlow]
+
+
+class CalculationHistoryItem(BaseModel):
+    id: int
+    created_at: datetime
+    lot_id: Optional[int] = None
+    purchase_price: float
+    area: float
+    location_group_id: str
+    rve_date: Optional[datetime] = None
+    holding_years: int
+    scenario_id: str
+    report_id: int
+    npv: Optional[float] = None
+    irr_percent: Optional[float] = None
+    total_profit: Optional[float] = None
+    total_profit_percent: Optional[float] = None
+    result: Optional[CalculationResponse] = None  # только при details=true
+
+
+class CalculationHistoryResponse(BaseModel):
+    items: List[CalculationHistoryItem]
+    next_cursor: Optional[str] = None  # None — страниц больше нет
+
+
+class BatchCalculationRequest(BaseModel):
+    items: List[CalculationRequest] = Field(..., min_length=1, max_length=1000, description="Лоты для расчёта")
+
+
+class SweepRequest(BaseModel):
+    purchase_price: float = Field(..., gt=0, description="Стоимость объекта в рублях")
+    area: float = Field(..., gt=0, description="Площадь в м²")
+    location_group_id: str = Field(..., description="ID группы локаций")
+    rve_date: Optional[datetime] = Field(None, description="Дата ввода в эксплуатацию (необязательно, если уже введён)")
+    report_id: int = Field(..., description="ID отчёта")
+    property_class: Optional[PropertyClass] = Field(PropertyClass.A, description="Класс недвижимости")
+    max_holding_years: int = Field(15, ge=1, le=15, description="Максимальный срок владения в сетке")
+
+
+class SweepScenarioResult(BaseModel):
+    scenario_id: str
+    scenario_name: str
+    static_metrics: StaticMetrics
+    dynamic_metrics: List[DynamicMetrics]  # по срокам владения 1..max_holding_years
+
+
+class SweepResponse(BaseModel):
+    scenarios: List[SweepScenarioResult]
+
+
+class SensitivityRequest(CalculationRequest):
+    delta_percent: float = Field(10.0, gt=0, lt=100, description="Отклонение параметров, ±%")
+    grid_steps: int = Field(5, ge=3, le=21, description="Число шагов по каждой оси таблицы")
+    discount_rate: float = Field(0.12, gt=-1, description="Ставка дисконтирования")
+
+
+class TornadoBar(BaseModel):
+    parameter: str
+    base_value: float
+    low_value: float
+    high_value: float
+    npv_low: float
+    npv_high: float
+    irr_low: float
+    irr_high: float
+
+
+class SensitivityTable(BaseModel):
+    row_parameter: str
+    column_parameter: str
+    row_values: List[float]
+    column_values: List[float]
+    npv: List[List[float]]  # [строка][столбец]
+    irr: List[List[float]]
+
+
+class SensitivityResponse(BaseModel):
+    base_npv: float
+    base_irr: float
+    delta_percent: float
+    tornado: List[TornadoBar]
+    table: SensitivityTable
+
+
+class MonteCarloRequest(CalculationRequest):
+    paths: int = Field(10_000, ge=1_000, le=100_000, description="Число сценарных путей")
+    seed: Optional[int] = Field(None, ge=0, description="Зерно генератора (для воспроизведения)")
+    rent_growth_volatility: float = Field(0.05, ge=0, le=1, description="σ годового роста аренды")
+    price_growth_volatility: float = Field(0.04, ge=0, le=1, description="σ годового роста цены")
+    growth_correlation: float = Field(0.5, ge=-1, le=1, description="Корреляция роста аренды и цены")
+    include_vacancy: bool = Field(False, description="Учитывать вакантность из отчёта")
+    discount_rate: float = Field(0.12, gt=-1, description="Ставка дисконтирования")
+
+
+class PercentileBands(BaseModel):
+    mean: float
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+
+class MonteCarloResponse(BaseModel):
+    paths: int
+    seed: int
+    npv: PercentileBands
+    irr: PercentileBands
+    payback_rent_years: PercentileBands
+    payback_rent_sale_years: PercentileBands
+    probability_npv_negative: float
@@ -0,0 +1,121 @@
+"""
+Анализ чувствительности NPV и IRR: данные для торнадо-диаграммы и двумерная таблица
+Все варианты собираются в массивы и считаются одним векторным вызовом (app.calc.batch).
+"""
+import numpy as np
+from app.calc.batch import npv_array, solve_irr_array
+
+# Параметры торнадо-диаграммы в порядке вывода до сортировки
+SENSITIVITY_PARAMETERS = (
+    "rent_start", "rent_growth_annual", "price_growth_annual", "purchase_price", "discount_rate"
+)
+
+
+def _evaluate(
+    purchase_price: np.ndarray,
+    area: float,
+    rent_start: np.ndarray,
+    rent_growth_annual: np.ndarray,
+    price_growth_annual: np.ndarray,
+    holding_years: int,
+    discount_rate: np.ndarray
+):
+    """NPV и IRR для массива вариантов"""
+    holding_years = np.full(purchase_price.shape, holding_years)
+    annual_rent = area * rent_start
+    npv = npv_array(
+        purchase_price, annual_rent, rent_growth_annual, price_growth_annual,
+        holding_years, discount_rate
+    )
+    irr, _, _ = solve_irr_array(
+        purchase_price, annual_rent, rent_growth_annual, price_growth_annual, holding_years
+    )
+    return npv, irr
+
+
+def calculate_sensitivity(
+    purchase_price: float,
+    area: float,
+    rent_start: float,  # R0 в руб/м²/год (годовая ставка)
+    rent_growth_annual: float,  # g_r' с учётом сценария
+    price_growth_annual: float,  # g_p' с учётом сценария
+    holding_years: int,
+    discount_rate: float = 0.12,
+    delta: float = 0.1,  # относительное отклонение, 0.1 = ±10%
+    grid_steps: int = 5
+) -> dict:
+    """
+    Торнадо: каждый параметр отклоняется на ±delta (относительно), остальные — базовые.
+    Таблица: g_p' × g_r' на сетке множителей от (1 - delta) до (1 + delta).
+    Базовый вариант, 2 × 5 вариантов торнадо и grid_steps² ячеек таблицы
+    считаются одним векторным вызовом.
+    """
+    base = {
+        "rent_start": rent_start,
+        "rent_growth_annual": rent_growth_annual,
+        "price_growth_annual": price_growth_annual,
+        "purchase_price": purchase_price,
+        "discount_rate": discount_rate,
+    }
+
+    # Варианты: [база, (параметр −, параметр +) × 5, ячейки таблицы]
+    variants = {name: [value] for name, value in base.items()}
+    for parameter in SENSITIVITY_PARAMETERS:
+        for multiplier in (1 - delta, 1 + delta):
+            for name, value in base.items():
+                variants[name].append(value * multiplier if name == parameter else value)
+
+    multipliers = np.linspace(1 - delta, 1 + delta, grid_steps)
+    price_growth_values = price_growth_annual * multipliers
+    rent_growth_values = rent_growth_annual * multipliers
+    price_grid, rent_grid = np.meshgrid(price_growth_values, rent_growth_values, indexing="ij")
+    table_start = len(variants["purchase_price"])
+    for name, value in base.items():
+        if name == "price_growth_annual":
+            variants[name].extend(price_grid.ravel())
+        elif name == "rent_growth_annual":
+            variants[name].extend(rent_grid.ravel())
+        else:
+            variants[name].extend([value] * price_grid.size)
+
+    npv, irr = _evaluate(
+        np.asarray(variants["purchase_price"], dtype=float),
+        area,
+        np.asarray(variants["rent_start"], dtype=float),
+        np.asarray(variants["rent_growth_annual"], dtype=float),
+        np.asarray(variants["price_growth_annual"], dtype=float),
+        holding_years,
+        np.asarray(variants["discount_rate"], dtype=float),
+    )
+
+    tornado = []
+    for index, parameter in enumerate(SENSITIVITY_PARAMETERS):
+        low, high = 1 + 2 * index, 2 + 2 * index
+        tornado.append({
+            "parameter": parameter,
+            "base_value": base[parameter],
+            "low_value": base[parameter] * (1 - delta),
+            "high_value": base[parameter] * (1 + delta),
+            "npv_low": float(npv[low]),
+            "npv_high": float(npv[high]),
+            "irr_low": float(irr[low]),
+            "irr_high": float(irr[high]),
+        })
+    # Торнадо: самые влиятельные параметры сверху
+    tornado.sort(key=lambda bar: abs(bar["npv_high"] - bar["npv_low"]), reverse=True)
+
+    shape = price_grid.shape
+    return {
+        "base_npv": float(npv[0]),
+        "base_irr": float(irr[0]),
+        "delta_percent": delta * 100,
+        "tornado": tornado,
+        "table": {
+            "row_parameter": "price_growth_annual",
+            "column_parameter": "rent_growth_annual",
+            "row_values": price_growth_values.tolist(),
+            "column_values": rent_growth_values.tolist(),
+            "npv": npv[table_start:].reshape(shape).tolist(),
+            "irr": irr[table_start:].reshape(shape).tolist(),
+        },
+    }
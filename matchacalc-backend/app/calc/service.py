@@ -1,124 +1,376 @@
-from sqlalchemy.orm import Session
-from app.db.models import MarketReportValue, ScenarioConfig, LocationGroup, PropertyClass
-from app.calc.formulas import (
-    calculate_rent_income, calculate_sale_profit, calculate_payback_rent,
-    calculate_payback_rent_and_sale, calculate_double_price,
-    calculate_npv, calculate_irr, calculate_cash_flows
-)
-from typing import Optional
-
-
-def get_market_data(
-    db: Session,
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.db.models import MarketReportValue, ScenarioConfig, PropertyClass
+from app.calc.formulas import CashFlowSchedule, calculate_double_price
+from app.calc.batch import calculate_metrics_batch
+from app.calc.sensitivity import calculate_sensitivity
+from app.calc.montecarlo import run_monte_carlo
+from app.calc.schemas import CalculationRequest
+from app.cache.refdata import MarketValueSnapshot, ScenarioSnapshot, get_reference_snapshot
+from app.cache.results import make_key, result_cache
+from typing import Optional, List, Dict, Tuple
+
+# Горизонт поиска сроков окупаемости (лет)
+PAYBACK_MAX_YEARS = 50
+
+
+async def get_market_data(
+    db: AsyncSession,
     report_id: int,
     location_group_id: str,
     property_class: PropertyClass = PropertyClass.A
-) -> Optional[MarketReportValue]:
-    """Получение данных рынка для расчёта"""
-    return db.query(MarketReportValue).filter(
-        MarketReportValue.report_id == report_id,
-        MarketReportValue.location_group_id == location_group_id,
-        MarketReportValue.property_class == property_class
-    ).first()
+) -> Optional[MarketValueSnapshot]:
+    """Получение данных рынка для расчёта (из кэша справочника)"""
+    key = (report_id, location_group_id, property_class)
+    market_data = (await get_reference_snapshot(db)).market_values.get(key)
+    if market_data is None:
+        # Промах: запись могла появиться в другом процессе до рассылки инвалидации
+        value = await db.scalar(select(MarketReportValue).where(
+            MarketReportValue.report_id == report_id,
+            MarketReportValue.location_group_id == location_group_id,
+            MarketReportValue.property_class == property_class
+        ))
+        market_data = MarketValueSnapshot.from_model(value) if value else None
+    return market_data
 
 
-def get_scenario_config(db: Session, scenario_id: str) -> Optional[ScenarioConfig]:
-    """Получение конфигурации сценария"""
-    return db.query(ScenarioConfig).filter(ScenarioConfig.id == scenario_id).first()
+async def get_scenario_config(db: AsyncSession, scenario_id: str) -> Optional[ScenarioSnapshot]:
+    """Получение конфигурации сценария (из кэша справочника)"""
+    scenario = (await get_reference_snapshot(db)).scenarios.get(scenario_id)
+    if scenario is None:
+        config = await db.get(ScenarioConfig, scenario_id)
+        scenario = ScenarioSnapshot.from_model(config) if config else None
+    return scenario
 
 
-def calculate_metrics(
-    db: Session,
-    purchase_price: float,
-    area: float,
-    location_group_id: str,
+async def get_market_data_bulk(
+    db: AsyncSession,
+    keys: List[Tuple[int, str, PropertyClass]]
+) -> Dict[Tuple[int, str, PropertyClass], MarketValueSnapshot]:
+    """
+    Данные рынка для набора ключей (report_id, location_group_id, property_class)
+    Из кэша справочника; ключи, которых в нём нет, дочитываются одним запросом IN
+    """
+    market_values = (await get_reference_snapshot(db)).market_values
+    result = {key: market_values[key] for key in keys if key in market_values}
+    missing = [key for key in keys if key not in result]
+    if missing:
+        values = await db.scalars(select(MarketReportValue).where(tuple_(
+            MarketReportValue.report_id,
+            MarketReportValue.location_group_id,
+            MarketReportValue.property_class
+        ).in_(missing)))
+        for value in values:
+            result[(value.report_id, value.location_group_id, value.property_class)] = (
+                MarketValueSnapshot.from_model(value)
+            )
+    return result
+
+
+async def get_scenario_configs(db: AsyncSession, scenario_ids: List[str]) -> Dict[str, ScenarioSnapshot]:
+    """Конфигурации сценариев по списку ID"""
+    result = {}
+    for scenario_id in scenario_ids:
+        scenario = await get_scenario_config(db, scenario_id)
+        if scenario:
+            result[scenario_id] = scenario
+    return result
+
+
+async def resolve_market_inputs(
+    db: AsyncSession,
     report_id: int,
-    scenario_id: str,
-    holding_years: int,
-    property_class: PropertyClass = PropertyClass.A,
-    discount_rate: float = 0.12
-) -> dict:
+    location_group_id: str,
+    property_class: PropertyClass,
+    scenario_id: str
+) -> Tuple[MarketValueSnapshot, float, float]:
     """
-    Основная функция расчёта всех метрик
+    Данные рынка и темпы роста с учётом сценария
+    Возвращает (market_data, g_r', g_p')
     """
     # Получаем данные рынка
-    market_data = get_market_data(db, report_id, location_group_id, property_class)
+    market_data = await get_market_data(db, report_id, location_group_id, property_class)
     if not market_data:
         raise ValueError(f"Данные рынка не найдены для report_id={report_id}, location_group_id={location_group_id}, property_class={property_class}")
     
     # Получаем конфигурацию сценария
-    scenario = get_scenario_config(db, scenario_id)
+    scenario = await get_scenario_config(db, scenario_id)
     if not scenario:
         raise ValueError(f"Сценарий не найден: {scenario_id}")
     
     # Применяем коэффициенты сценария
     rent_growth_effective = market_data.rent_growth_annual * scenario.rent_growth_multiplier
     price_growth_effective = market_data.price_growth_annual * scenario.price_growth_multiplier
-    
-    # rent_start уже в годовом выражении (руб/м²/год)
-    
-    # Статические метрики
-    payback_rent_years = calculate_payback_rent(
-        purchase_price, area, market_data.rent_start, rent_growth_effective
+    return market_data, rent_growth_effective, price_growth_effective
+
+
+async def calculate_metrics(
+    db: AsyncSession,
+    purchase_price: float,
+    area: float,
+    location_group_id: str,
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    property_class: PropertyClass = PropertyClass.A,
+    discount_rate: float = 0.12
+) -> dict:
+    """
+    Основная функция расчёта всех метрик
+    Результат кэшируется (app.cache.results) с учётом версии справочника
+    """
+    snapshot = await get_reference_snapshot(db)
+    # Без версии из Redis общий уровень недоступен, ключ привязан к поколению снимка
+    shared = snapshot.version is not None
+    version = str(snapshot.version) if shared else f"local-{snapshot.generation}"
+    key = make_key(
+        "metrics", version,
+        purchase_price=float(purchase_price),
+        area=float(area),
+        location_group_id=location_group_id,
+        property_class=PropertyClass(property_class).value,
+        report_id=int(report_id),
+        scenario_id=scenario_id,
+        holding_years=int(holding_years),
+        discount_rate=float(discount_rate)
     )
-    
-    payback_rent_sale_years = calculate_payback_rent_and_sale(
-        purchase_price, area, market_data.rent_start,
-        rent_growth_effective, price_growth_effective
+    return await result_cache.get_or_compute(
+        key,
+        lambda: _calculate_metrics(
+            db, purchase_price, area, location_group_id, report_id, scenario_id,
+            holding_years, property_class, discount_rate
+        ),
+        shared=shared
+    )
+
+
+async def _calculate_metrics(
+    db: AsyncSession,
+    purchase_price: float,
+    area: float,
+    location_group_id: str,
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    property_class: PropertyClass,
+    discount_rate: float
+) -> dict:
+    """Расчёт всех метрик без кэша"""
+    market_data, rent_growth_effective, price_growth_effective = await resolve_market_inputs(
+        db, report_id, location_group_id, property_class, scenario_id
     )
     
-    double_price_years = calculate_double_price(price_growth_effective)
+    # rent_start уже в годовом выражении (руб/м²/год)
     
-    # Динамические метрики
-    rent_income_total = calculate_rent_income(
-        area, market_data.rent_start, rent_growth_effective, holding_years
+    # Один годовой график на весь расчёт: аренда, накопленная аренда, цена продажи
+    schedule = CashFlowSchedule(
+        purchase_price, area, market_data.rent_start,
+        rent_growth_effective, price_growth_effective,
+        horizon_years=max(holding_years, PAYBACK_MAX_YEARS)
     )
     
-    sale_profit = calculate_sale_profit(
-        purchase_price, price_growth_effective, holding_years
-    )
+    # NPV и IRR
+    npv = schedule.npv(holding_years, discount_rate)
+    irr = schedule.irr(holding_years).rate
     
+    return {
+        "static_metrics": _static_metrics(schedule, price_growth_effective),
+        "dynamic_metrics": _dynamic_metrics(schedule, holding_years, npv, irr),
+        "cash_flows": schedule.cash_flows(holding_years)
+    }
+
+
+def _static_metrics(schedule: CashFlowSchedule, price_growth_effective: float) -> dict:
+    """Статические метрики (не зависят от срока владения)"""
+    return {
+        "payback_rent_years": schedule.payback_rent(PAYBACK_MAX_YEARS),
+        "payback_rent_sale_years": schedule.payback_rent_and_sale(PAYBACK_MAX_YEARS),
+        "double_price_years": calculate_double_price(price_growth_effective)
+    }
+
+
+def _dynamic_metrics(schedule: CashFlowSchedule, holding_years: int, npv: float, irr: float) -> dict:
+    """Динамические метрики для срока владения N по готовому графику"""
+    purchase_price = schedule.purchase_price
+    rent_income_total = schedule.rent_income(holding_years)
+    sale_profit = schedule.sale_profit(holding_years)
     total_profit = rent_income_total + sale_profit
     
     # Проценты (за весь срок владения, не среднегодовые)
-    rent_yield_percent = rent_income_total / purchase_price if purchase_price > 0 else 0
-    sale_profit_percent = sale_profit / purchase_price if purchase_price > 0 else 0
-    total_profit_percent = total_profit / purchase_price if purchase_price > 0 else 0
+    return {
+        "holding_years": holding_years,
+        "rent_income_total": rent_income_total,
+        "rent_income_yield_percent": rent_income_total / purchase_price if purchase_price > 0 else 0,
+        "sale_profit": sale_profit,
+        "sale_profit_percent": sale_profit / purchase_price if purchase_price > 0 else 0,
+        "total_profit": total_profit,
+        "total_profit_percent": total_profit / purchase_price if purchase_price > 0 else 0,
+        "npv": npv,
+        "irr_percent": irr
+    }
+
+
+async def calculate_sweep(
+    db: AsyncSession,
+    purchase_price: float,
+    area: float,
+    location_group_id: str,
+    report_id: int,
+    property_class: PropertyClass = PropertyClass.A,
+    max_holding_years: int = 15,
+    discount_rate: float = 0.12
+) -> dict:
+    """
+    Сетка «сценарий × срок владения 1..max_holding_years» за один вызов
     
-    # NPV и IRR
-    npv = calculate_npv(
-        purchase_price, area, market_data.rent_start,
-        rent_growth_effective, price_growth_effective,
-        holding_years, discount_rate
-    )
+    Справочные данные — из кэша в памяти. На сценарий строится один график и префиксные
+    суммы NPV; каждый срок владения добавляет O(1), IRR стартует с IRR предыдущего срока.
+    """
+    market_data = await get_market_data(db, report_id, location_group_id, property_class)
+    if not market_data:
+        raise ValueError(f"Данные рынка не найдены для report_id={report_id}, location_group_id={location_group_id}, property_class={property_class}")
+    
+    scenarios = (await get_reference_snapshot(db)).ordered_scenarios()
     
-    irr = calculate_irr(
+    results = []
+    for scenario in scenarios:
+        rent_growth_effective = market_data.rent_growth_annual * scenario.rent_growth_multiplier
+        price_growth_effective = market_data.price_growth_annual * scenario.price_growth_multiplier
+        
+        schedule = CashFlowSchedule(
+            purchase_price, area, market_data.rent_start,
+            rent_growth_effective, price_growth_effective,
+            horizon_years=max(max_holding_years, PAYBACK_MAX_YEARS)
+        )
+        npvs = schedule.npv_by_holding_years(discount_rate, max_holding_years)
+        
+        dynamic_metrics = []
+        irr_guess = None
+        for holding_years in range(1, max_holding_years + 1):
+            irr_result = schedule.irr(holding_years, guess=irr_guess)
+            if irr_result.converged:
+                irr_guess = irr_result.rate
+            dynamic_metrics.append(
+                _dynamic_metrics(schedule, holding_years, npvs[holding_years], irr_result.rate)
+            )
+        
+        results.append({
+            "scenario_id": scenario.id,
+            "scenario_name": scenario.name,
+            "static_metrics": _static_metrics(schedule, price_growth_effective),
+            "dynamic_metrics": dynamic_metrics
+        })
+    
+    return {"scenarios": results}
+
+
+async def calculate_metrics_sensitivity(
+    db: AsyncSession,
+    purchase_price: float,
+    area: float,
+    location_group_id: str,
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    property_class: PropertyClass = PropertyClass.A,
+    discount_rate: float = 0.12,
+    delta: float = 0.1,
+    grid_steps: int = 5
+) -> dict:
+    """Анализ чувствительности NPV и IRR для одного лота (см. app.calc.sensitivity)"""
+    market_data, rent_growth_effective, price_growth_effective = await resolve_market_inputs(
+        db, report_id, location_group_id, property_class, scenario_id
+    )
+    return calculate_sensitivity(
         purchase_price, area, market_data.rent_start,
-        rent_growth_effective, price_growth_effective, holding_years
+        rent_growth_effective, price_growth_effective, holding_years,
+        discount_rate=discount_rate, delta=delta, grid_steps=grid_steps
     )
-    
-    # Cash flows
-    cash_flows = calculate_cash_flows(
+
+
+async def calculate_metrics_monte_carlo(
+    db: AsyncSession,
+    purchase_price: float,
+    area: float,
+    location_group_id: str,
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    property_class: PropertyClass = PropertyClass.A,
+    discount_rate: float = 0.12,
+    paths: int = 10_000,
+    seed: Optional[int] = None,
+    rent_growth_volatility: float = 0.05,
+    price_growth_volatility: float = 0.04,
+    growth_correlation: float = 0.5,
+    include_vacancy: bool = False
+) -> dict:
+    """
+    Монте-Карло вокруг сценария: средние темпы роста — g_r' и g_p' сценария,
+    вакантность (если запрошена) — MarketReportValue.vacancy_rate
+    """
+    market_data, rent_growth_effective, price_growth_effective = await resolve_market_inputs(
+        db, report_id, location_group_id, property_class, scenario_id
+    )
+    # Десятки миллисекунд и больше CPU — вне event loop
+    return await run_in_threadpool(
+        run_monte_carlo,
         purchase_price, area, market_data.rent_start,
-        rent_growth_effective, price_growth_effective, holding_years
+        rent_growth_effective, price_growth_effective, holding_years,
+        paths=paths,
+        seed=seed,
+        discount_rate=discount_rate,
+        rent_growth_volatility=rent_growth_volatility,
+        price_growth_volatility=price_growth_volatility,
+        growth_correlation=growth_correlation,
+        vacancy_rate=market_data.vacancy_rate if include_vacancy else None,
+        max_years=PAYBACK_MAX_YEARS
     )
-    
-    return {
-        "static_metrics": {
-            "payback_rent_years": payback_rent_years,
-            "payback_rent_sale_years": payback_rent_sale_years,
-            "double_price_years": double_price_years
-        },
-        "dynamic_metrics": {
-            "holding_years": holding_years,
-            "rent_income_total": rent_income_total,
-            "rent_income_yield_percent": rent_yield_percent,
-            "sale_profit": sale_profit,
-            "sale_profit_percent": sale_profit_percent,
-            "total_profit": total_profit,
-            "total_profit_percent": total_profit_percent,
-            "npv": npv,
-            "irr_percent": irr
-        },
-        "cash_flows": cash_flows
-    }
+
+
+async def calculate_batch(
+    db: AsyncSession,
+    items: List[CalculationRequest],
+    discount_rate: float = 0.12,
+    market_values: Optional[Dict[Tuple[int, str, PropertyClass], MarketValueSnapshot]] = None
+) -> List[dict]:
+    """
+    Пакетный расчёт: справочные данные берутся из кэша в памяти,
+    метрики считаются векторно (app.calc.batch)
+    market_values — уже загруженные get_market_data_bulk данные рынка (без повторного запроса)
+    """
+    keys = [
+        (item.report_id, item.location_group_id, item.property_class or PropertyClass.A)
+        for item in items
+    ]
+    if market_values is None:
+        market_values = await get_market_data_bulk(db, list(set(keys)))
+    scenarios = await get_scenario_configs(db, list({item.scenario_id for item in items}))
+
+    rent_start = []
+    rent_growth = []
+    price_growth = []
+    for index, (item, key) in enumerate(zip(items, keys)):
+        market_data = market_values.get(key)
+        if not market_data:
+            raise ValueError(f"Строка {index}: данные рынка не найдены для report_id={key[0]}, location_group_id={key[1]}, property_class={key[2]}")
+        scenario = scenarios.get(item.scenario_id)
+        if not scenario:
+            raise ValueError(f"Строка {index}: сценарий не найден: {item.scenario_id}")
+        rent_start.append(market_data.rent_start)
+        rent_growth.append(market_data.rent_growth_annual * scenario.rent_growth_multiplier)
+        price_growth.append(market_data.price_growth_annual * scenario.price_growth_multiplier)
+
+    result = await run_in_threadpool(
+        calculate_metrics_batch,
+        purchase_price=[item.purchase_price for item in items],
+        area=[item.area for item in items],
+        rent_start=rent_start,
+        rent_growth_annual=rent_growth,
+        price_growth_annual=price_growth,
+        holding_years=[item.holding_years for item in items],
+        discount_rate=discount_rate,
+        max_years=PAYBACK_MAX_YEARS
+    )
+    return await run_in_threadpool(result.to_dicts)
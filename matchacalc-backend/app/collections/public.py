@@ -0,0 +1,235 @@
+"""
+Публичная страница коллекции /collections/public/{slug}: кэш в Redis и ETag
+
+Ответ (лоты с ценами и метриками) вычисляется один раз и хранится в Redis готовым
+JSON под ключом collection:public:{slug}:{версия справочника}:{версия коллекции}.
+Версия справочника — refdata:version (меняется при правке отчётов и сценариев,
+app.cache.refdata), версия коллекции — счётчик collection:public:version:{slug},
+который увеличивает invalidate_public_collection() после изменения лотов, их позиций
+или скидок. Старые ключи перестают находиться и истекают по TTL.
+
+ETag — SHA-256 тела ответа, поэтому повторный просмотр с If-None-Match получает 304
+после одного обращения к Redis, без запросов к Postgres и расчёта.
+
+Версия коллекции увеличивается автоматически после коммита любой сессии, которая
+через ORM изменила Collection, CollectionLot или Lot опубликованной коллекции
+(события after_flush/after_commit ниже). Массовые UPDATE/DELETE в обход ORM событий
+не дают — после них нужно вызвать invalidate_public_collection() явно.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Set, Tuple
+import redis
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.models import Collection, CollectionLot, Lot, MarketReport, PropertyClass
+from app.cache.refdata import VERSION_KEY as REFDATA_VERSION_KEY, get_reference_snapshot, reference_cache
+from app.cache.singleflight import SingleFlight
+from app.collections.schemas import PublicCollectionResponse
+from app.collections.service import calculate_collection_metrics, discounted_price, get_collection_lots
+from app.ratelimit.middleware import get_async_redis_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "collection:public"
+
+# Параметры расчёта публичной страницы: последний активный отчёт, базовый сценарий
+PUBLIC_SCENARIO_ID = "base"
+PUBLIC_HOLDING_YEARS = 5
+PUBLIC_PROPERTY_CLASS = PropertyClass.A
+
+_flights = SingleFlight()
+
+
+def version_key(slug: str) -> str:
+    return f"{KEY_PREFIX}:version:{slug}"
+
+
+def payload_key(slug: str, refdata_version: str, collection_version: str) -> str:
+    return f"{KEY_PREFIX}:{slug}:{refdata_version}:{collection_version}"
+
+
+def make_etag(payload: str) -> str:
+    """Сильный ETag тела ответа"""
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадение If-None-Match (список через запятую, W/-префикс, *) с ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def build_public_payload(db: AsyncSession, slug: str) -> Optional[str]:
+    """
+    JSON публичной страницы из БД; None, если опубликованной коллекции нет
+    Лоты без данных рынка в отчёте (или при отсутствии активного отчёта) выводятся
+    без метрик — страница не должна падать из-за одной группы локаций.
+    """
+    collection_id = await db.scalar(select(Collection.id).where(Collection.public_slug == slug))
+    if collection_id is None:
+        return None
+    report_id = await db.scalar(
+        select(MarketReport.id).where(MarketReport.active == True).order_by(MarketReport.id.desc()).limit(1)
+    )
+    collection, lots = await get_collection_lots(db, collection_id)
+
+    metrics = {}
+    if report_id is not None and lots:
+        try:
+            # Лоты без данных рынка для группы получают metrics=None
+            results = await calculate_collection_metrics(
+                db, lots, report_id=report_id, scenario_id=PUBLIC_SCENARIO_ID,
+                holding_years=PUBLIC_HOLDING_YEARS, property_class=PUBLIC_PROPERTY_CLASS
+            )
+        except ValueError:
+            # Например, нет сценария base — лоты выводятся без метрик
+            logger.warning("Метрики публичной коллекции %s не рассчитаны", slug, exc_info=True)
+            results = []
+        metrics = {row["lot_id"]: row["metrics"] for row in results}
+
+    response = PublicCollectionResponse(
+        title=collection.name,
+        description=collection.description,
+        report_id=report_id,
+        scenario_id=PUBLIC_SCENARIO_ID,
+        holding_years=PUBLIC_HOLDING_YEARS,
+        lots=[
+            {
+                "id": lot.id,
+                "layout_image_url": lot.layout_image_url,
+                "address": lot.address,
+                "area": lot.area,
+                "location_group_id": lot.location_group_id,
+                "original_price": lot.purchase_price,
+                "discounted_price": discounted_price(lot),
+                "discount_percent": lot.custom_discount_percent,
+                "metrics": metrics.get(lot.id),
+            }
+            for _, lot in lots
+        ]
+    )
+    return response.model_dump_json()
+
+
+async def get_public_payload(db: AsyncSession, slug: str) -> Optional[Tuple[str, str]]:
+    """
+    (JSON, ETag) публичной страницы: из Redis или, при промахе, из БД с записью в Redis
+    None, если опубликованной коллекции нет. Без Redis страница считается на каждый запрос.
+    """
+    client = get_async_redis_client()
+    try:
+        refdata_version, collection_version = await client.mget(REFDATA_VERSION_KEY, version_key(slug))
+        key = payload_key(slug, refdata_version or "0", collection_version or "0")
+        payload = await client.get(key)
+    except redis.RedisError:
+        key = payload = None
+    if payload is not None:
+        return payload, make_etag(payload)
+
+    async def compute() -> Optional[str]:
+        if key is not None:
+            # Ответ сохраняется под прочитанной версией справочника: снимок процесса,
+            # ещё не получивший инвалидацию, перезагружается до расчёта
+            snapshot = await get_reference_snapshot(db)
+            if snapshot.version is None or snapshot.version < int(refdata_version or 0):
+                reference_cache.mark_stale()
+        payload = await build_public_payload(db, slug)
+        if payload is not None and key is not None:
+            try:
+                await client.setex(key, settings.COLLECTION_PUBLIC_CACHE_TTL_SECONDS, payload)
+            except redis.RedisError:
+                pass
+        return payload
+
+    payload = await _flights.do(key or f"{KEY_PREFIX}:{slug}", compute)
+    if payload is None:
+        return None
+    return payload, make_etag(payload)
+
+
+async def invalidate_public_collection(slug: str):
+    """Вызывается после изменения лотов, позиций или скидок опубликованной коллекции"""
+    try:
+        await get_async_redis_client().incr(version_key(slug))
+    except redis.RedisError:
+        pass  # Страница обновится по TTL
+
+
+def invalidate_public_collection_sync(slug: str):
+    """То же для синхронных скриптов"""
+    try:
+        get_redis_client().incr(version_key(slug))
+    except redis.RedisError:
+        pass  # Страница обновится по TTL
+
+
+# Автоматическая инвалидация после изменений через ORM
+
+_PENDING_SLUGS = "public_collection_slugs"
+# Ссылки на задачи инвалидации, чтобы их не собрал сборщик мусора до выполнения
+_tasks: Set[asyncio.Task] = set()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_collections(session: Session, flush_context):
+    """Slug опубликованных коллекций, затронутых flush; инвалидируются после коммита"""
+    slugs: Set[str] = session.info.setdefault(_PENDING_SLUGS, set())
+    collection_ids = set()
+    lot_ids = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Collection):
+            slugs.update(
+                slug for slug in (instance.public_slug, *_previous_values(instance, "public_slug")) if slug
+            )
+        elif isinstance(instance, CollectionLot):
+            collection_ids.add(instance.collection_id)
+        elif isinstance(instance, Lot) and instance.id is not None:
+            lot_ids.add(instance.id)
+    conditions = []
+    if collection_ids:
+        conditions.append(Collection.id.in_(collection_ids))
+    if lot_ids:
+        conditions.append(Collection.id.in_(
+            select(CollectionLot.collection_id).where(CollectionLot.lot_id.in_(lot_ids))
+        ))
+    if conditions:
+        slugs.update(session.scalars(
+            select(Collection.public_slug).where(Collection.public_slug.is_not(None), or_(*conditions))
+        ))
+
+
+def _previous_values(instance, attribute: str):
+    """Значения атрибута до изменения (например, прежний public_slug)"""
+    return inspect(instance).attrs[attribute].history.deleted or ()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_collections(session: Session):
+    slugs = session.info.pop(_PENDING_SLUGS, None)
+    if not slugs:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    for slug in slugs:
+        if loop is not None:
+            task = loop.create_task(invalidate_public_collection(slug))
+            _tasks.add(task)
+            task.add_done_callback(_tasks.discard)
+        else:
+            invalidate_public_collection_sync(slug)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_collections(session: Session):
+    session.info.pop(_PENDING_SLUGS, None)
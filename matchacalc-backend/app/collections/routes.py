@@ -0,0 +1,85 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db
+from app.db.models import PropertyClass
+from app.auth.dependencies import get_current_user
+from app.config import settings
+from app.collections.public import etag_matches, get_public_payload
+from app.collections.schemas import CollectionMetricsResponse, PublicCollectionResponse
+from app.collections.service import calculate_collection_metrics, get_collection_lots
+
+router = APIRouter()
+
+
+@router.get("/public/{slug}", response_model=PublicCollectionResponse)
+async def get_public_collection(
+    slug: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Публичная страница коллекции: лоты с ценами и метриками
+    Готовый ответ хранится в Redis (app.collections.public); повтор с If-None-Match — 304
+    """
+    found = await get_public_payload(db, slug)
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Коллекция не найдена"
+        )
+    payload, etag = found
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.COLLECTION_PUBLIC_MAX_AGE_SECONDS}, must-revalidate",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+@router.get("/{collection_id}/metrics", response_model=CollectionMetricsResponse)
+async def get_collection_metrics(
+    collection_id: int,
+    report_id: int = Query(..., description="ID отчёта"),
+    scenario_id: str = Query("base", description="ID сценария (pes, base, opt)"),
+    holding_years: int = Query(5, ge=1, le=15, description="Срок владения в годах"),
+    property_class: PropertyClass = Query(PropertyClass.A, description="Класс недвижимости"),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Метрики всех лотов коллекции одним запросом
+    Лоты загружаются одним JOIN-запросом и считаются одним векторным проходом
+    """
+    found = await get_collection_lots(db, collection_id)
+    if found is None or found[0].owner_user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Коллекция не найдена"
+        )
+    collection, lots = found
+    
+    try:
+        results = await calculate_collection_metrics(
+            db=db,
+            lots=lots,
+            report_id=report_id,
+            scenario_id=scenario_id,
+            holding_years=holding_years,
+            property_class=property_class
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return CollectionMetricsResponse(
+        collection_id=collection.id,
+        report_id=report_id,
+        scenario_id=scenario_id,
+        holding_years=holding_years,
+        property_class=property_class,
+        lots=results
+    )
@@ -0,0 +1,46 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from app.calc.schemas import CalculationResponse
+from app.db.models import PropertyClass
+
+
+class CollectionLotMetrics(BaseModel):
+    lot_id: int
+    position: int
+    address: str
+    original_price: float
+    discount_percent: Optional[float] = None
+    purchase_price: float  # цена с учётом скидки лота — она идёт в расчёт
+    area: float
+    location_group_id: str
+    metrics: Optional[CalculationResponse] = None  # None — нет данных рынка для группы лота
+
+
+class CollectionMetricsResponse(BaseModel):
+    collection_id: int
+    report_id: int
+    scenario_id: str
+    holding_years: int
+    property_class: PropertyClass
+    lots: List[CollectionLotMetrics]  # в порядке CollectionLot.position
+
+
+class PublicCollectionLot(BaseModel):
+    id: int
+    layout_image_url: Optional[str] = None
+    address: str
+    area: float
+    location_group_id: str
+    original_price: float
+    discounted_price: float
+    discount_percent: Optional[float] = None
+    metrics: Optional[CalculationResponse] = None  # None — нет данных рынка для группы лота
+
+
+class PublicCollectionResponse(BaseModel):
+    title: str
+    description: Optional[str] = None
+    report_id: Optional[int] = None  # последний активный отчёт; None — отчётов нет, лоты без метрик
+    scenario_id: str
+    holding_years: int
+    lots: List[PublicCollectionLot]
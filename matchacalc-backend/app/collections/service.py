@@ -0,0 +1,89 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Collection, CollectionLot, Lot, PropertyClass
+from app.calc.schemas import CalculationRequest
+from app.calc.service import calculate_batch, get_market_data_bulk
+
+
+def discounted_price(lot: Lot) -> float:
+    """Цена лота с учётом скидки, согласованной для коллекции"""
+    if not lot.custom_discount_percent:
+        return lot.purchase_price
+    return lot.purchase_price * (1 - lot.custom_discount_percent / 100)
+
+
+async def get_collection_lots(
+    db: AsyncSession,
+    collection_id: int
+) -> Optional[Tuple[Collection, List[Tuple[int, Lot]]]]:
+    """
+    Коллекция и её лоты с позициями одним запросом (JOIN), в порядке CollectionLot.position
+    None, если коллекции нет
+    """
+    rows = (await db.execute(
+        select(Collection, CollectionLot.position, Lot)
+        .outerjoin(CollectionLot, CollectionLot.collection_id == Collection.id)
+        .outerjoin(Lot, Lot.id == CollectionLot.lot_id)
+        .where(Collection.id == collection_id)
+        .order_by(CollectionLot.position, Lot.id)
+    )).all()
+    if not rows:
+        return None
+    collection = rows[0][0]
+    return collection, [(position, lot) for _, position, lot in rows if lot is not None]
+
+
+async def calculate_collection_metrics(
+    db: AsyncSession,
+    lots: List[Tuple[int, Lot]],
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    property_class: PropertyClass = PropertyClass.A,
+    discount_rate: float = 0.12
+) -> List[dict]:
+    """
+    Метрики всех лотов коллекции одним векторным расчётом (calculate_batch)
+    Данные рынка для всех лотов — из кэша справочника, промахи одним запросом.
+    Лоты без данных рынка для отчёта и класса возвращаются с metrics=None: одна группа
+    локаций без значений не должна лишать метрик всю коллекцию.
+    """
+    items = [
+        CalculationRequest(
+            purchase_price=discounted_price(lot),
+            area=lot.area,
+            location_group_id=lot.location_group_id,
+            rve_date=lot.rve_date,
+            holding_years=holding_years,
+            scenario_id=scenario_id,
+            report_id=report_id,
+            property_class=property_class
+        )
+        for _, lot in lots
+    ]
+    market_values = await get_market_data_bulk(
+        db, list({(report_id, lot.location_group_id, property_class) for _, lot in lots})
+    ) if items else {}
+    priced = [
+        (lot.id, item) for (_, lot), item in zip(lots, items)
+        if (report_id, lot.location_group_id, property_class) in market_values
+    ]
+    metrics = {}
+    if priced:
+        results = await calculate_batch(db, [item for _, item in priced], discount_rate, market_values)
+        metrics = {lot_id: result for (lot_id, _), result in zip(priced, results)}
+    return [
+        {
+            "lot_id": lot.id,
+            "position": position,
+            "address": lot.address,
+            "original_price": lot.purchase_price,
+            "discount_percent": lot.custom_discount_percent,
+            "purchase_price": item.purchase_price,
+            "area": lot.area,
+            "location_group_id": lot.location_group_id,
+            "metrics": metrics.get(lot.id),
+        }
+        for (position, lot), item in zip(lots, items)
+    ]
@@ -1,18 +1,39 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.db.pool import pool_options
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+
+def get_async_database_url(url: str) -> str:
+    """URL для асинхронного драйвера: postgresql → asyncpg, sqlite → aiosqlite"""
+    driver, separator, rest = url.partition("://")
+    drivers = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }
+    return drivers.get(driver, driver) + separator + rest
+
+
+# Синхронный движок: скрипты, сиды, миграции
+engine = create_engine(
+    settings.DATABASE_URL, pool_pre_ping=True, **pool_options(settings.DATABASE_URL, asynchronous=False)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок: запросы API (конкурентность ограничена пулом соединений)
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL), pool_pre_ping=True,
+    **pool_options(settings.DATABASE_URL, asynchronous=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency для получения сессии БД"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
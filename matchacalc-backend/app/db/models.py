@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -110,6 +111,15 @@ class MarketReportValue(Base):
     # Relationships
     report = relationship("MarketReport", back_populates="values")
     location_group = relationship("LocationGroup", back_populates="market_report_values")
+    
+    # Одно значение на (отчёт, локация, класс); индекс обслуживает и поиск для расчёта
+    __table_args__ = (
+        Index(
+            "uq_market_report_values_lookup",
+            "report_id", "location_group_id", "property_class",
+            unique=True
+        ),
+    )
 
 
 class ScenarioConfig(Base):
@@ -174,19 +184,60 @@ class CollectionLot(Base):
 
 class Calculation(Base):
     __tablename__ = "calculations"
-    
-    id = Column(Integer, primary_key=True, index=True)
+    # В Postgres таблица секционирована по месяцам created_at (миграция d5e7a3b19c04),
+    # первичный ключ секционированной таблицы — (id, created_at)
+    __table_args__ = (
+        # История пользователя: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_calculations_user_created", "user_id", "created_at", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     lot_id = Column(Integer, ForeignKey("lots.id"), nullable=True)
     purchase_price = Column(Float, nullable=False)
     area = Column(Float, nullable=False)
     location_group_id = Column(String, nullable=False)
-    rve_date = Column(DateTime(timezone=True), nullable=False)
+    rve_date = Column(DateTime(timezone=True), nullable=True)  # необязательна в запросе расчёта
     holding_years = Column(Integer, nullable=False)
     scenario_id = Column(String, nullable=False)
     report_id = Column(Integer, nullable=False)
-    result_json = Column(JSON, nullable=False)  # все рассчитанные метрики и cash-flows
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Сводные метрики — отдельными колонками, чтобы список истории не читал result_json
+    npv = Column(Float, nullable=True)
+    irr_percent = Column(Float, nullable=True)
+    total_profit = Column(Float, nullable=True)
+    total_profit_percent = Column(Float, nullable=True)
+    # Все метрики и cash-flows (JSONB; cash-flows — массивом сумм по годам, см. app.calc.history)
+    result_json = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="calculations")
+
+
+class LotMetric(Base):
+    """
+    Материализованные метрики лота по (отчёт, сценарий, срок владения)
+    Пересчитываются фоном (app.lots.metrics) при изменении лота или значений отчёта
+    """
+    __tablename__ = "lot_metrics"
+    # Списки лотов: WHERE report_id = ? AND scenario_id = ? AND holding_years = ? ORDER BY <метрика>
+    __table_args__ = (
+        Index("ix_lot_metrics_irr", "report_id", "scenario_id", "holding_years", "irr_percent"),
+        Index("ix_lot_metrics_npv", "report_id", "scenario_id", "holding_years", "npv"),
+        Index("ix_lot_metrics_payback", "report_id", "scenario_id", "holding_years", "payback_rent_years"),
+    )
+    
+    lot_id = Column(Integer, ForeignKey("lots.id", ondelete="CASCADE"), primary_key=True)
+    report_id = Column(Integer, ForeignKey("market_reports.id", ondelete="CASCADE"), primary_key=True)
+    scenario_id = Column(String, primary_key=True)
+    holding_years = Column(Integer, primary_key=True)
+    location_group_id = Column(String, nullable=False)  # копия из лота для фильтра без JOIN
+    purchase_price = Column(Float, nullable=False)  # с учётом скидки лота
+    npv = Column(Float, nullable=False)
+    irr_percent = Column(Float, nullable=False)
+    total_profit = Column(Float, nullable=False)
+    total_profit_percent = Column(Float, nullable=False)
+    # NULL — не окупается за горизонт расчёта
+    payback_rent_years = Column(Float, nullable=True)
+    payback_rent_sale_years = Column(Float, nullable=True)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,115 @@
+"""
+Пул соединений с БД: настройки из Settings и счётчики ожидания соединения
+
+Пул каждого движка — подкласс QueuePool, который замеряет время connect():
+ожидание свободного соединения (или открытие нового) плюс pre-ping. Гистограмма
+показывает, сколько запросов ждали пул, а timeouts — сколько не дождались
+(sqlalchemy.exc.TimeoutError, ответ 500). Счётчики — по текущему процессу.
+"""
+import time
+from typing import Optional
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from app.config import settings
+
+# Верхние границы корзин гистограммы ожидания, мс
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolWaitMetrics:
+    """Гистограмма времени получения соединения из пула"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float):
+        self.checkouts += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for index, bound in enumerate(WAIT_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self._buckets[index] += 1
+                return
+        self._buckets[-1] += 1
+
+    def stats(self) -> dict:
+        histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self._buckets)}
+        histogram["inf"] = self._buckets[-1]
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "histogram": histogram,
+        }
+
+
+class _InstrumentedPool:
+    """Примесь к QueuePool: замер connect() в wait_metrics"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_metrics = PoolWaitMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_metrics = self.wait_metrics
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.wait_metrics.timeouts += 1
+            raise
+        self.wait_metrics.observe((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str, asynchronous: bool) -> dict:
+    """Аргументы create_engine/create_async_engine для пула из Settings"""
+    if url.startswith("sqlite"):
+        # SQLite (разработка, тесты): пул по умолчанию для файла или памяти
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+
+def pool_stats(pool: Pool) -> dict:
+    """Текущее состояние пула и счётчики ожидания"""
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+            recycle_seconds=pool._recycle,
+        )
+    wait_metrics: Optional[PoolWaitMetrics] = getattr(pool, "wait_metrics", None)
+    if wait_metrics is not None:
+        stats["wait"] = wait_metrics.stats()
+    return stats
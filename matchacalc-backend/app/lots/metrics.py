@@ -0,0 +1,385 @@
+"""
+Материализованные метрики лотов: таблица lot_metrics
+
+Для каждого лота хранятся сводные метрики по всем активным отчётам, сценариям и срокам
+владения из LOT_METRICS_HOLDING_YEARS, поэтому список лотов с сортировкой и фильтром
+по IRR, NPV или окупаемости (list_lot_metrics) — обычное чтение по индексу, без расчёта.
+
+Строки пересчитываются фоновой задачей (LotMetricsRefresher) пачками по
+LOT_METRICS_CHUNK_SIZE лотов, каждая пачка — отдельной короткой транзакцией:
+- изменение лота — только строки этого лота (schedule_lots; ставится автоматически
+  после коммита сессии, которая создала или изменила Lot через ORM, — события ниже);
+- изменение значения отчёта — только лоты его группы локаций и только строки этого
+  отчёта (schedule_market); значения других классов лотов не касаются — лоты
+  считаются по классу A, как и в коллекциях;
+- изменение сценариев или загрузка файла данных рынка — все лоты.
+
+Очередь задач — в памяти процесса, как у истории расчётов; задачи, не выполненные
+к остановке или поставленные при выключенном пересчёте (счётчик not_running), теряются.
+Пустая таблица заполняется при старте (backfill_if_empty); полный пересчёт —
+POST /api/v1/admin/lot-metrics/refresh или scripts/refresh_lot_metrics.py.
+"""
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, event, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import LotMetric, Lot, MarketReport, MarketReportValue, PropertyClass
+from app.cache.refdata import get_reference_snapshot
+from app.calc.schemas import CalculationRequest
+from app.calc.service import calculate_batch
+from app.collections.service import discounted_price
+
+logger = logging.getLogger(__name__)
+
+# Класс лотов при расчёте (у лота нет своего класса)
+LOT_PROPERTY_CLASS = PropertyClass.A
+
+# Метрики, по которым сортируется список лотов
+SORT_FIELDS = ("irr_percent", "npv", "payback_rent_years")
+
+
+def _finite(value: float) -> Optional[float]:
+    """Бесконечная окупаемость (не окупается за горизонт) хранится как NULL"""
+    return value if math.isfinite(value) else None
+
+
+async def refresh_lot_metrics(
+    db: AsyncSession,
+    lot_ids: List[int],
+    report_ids: Optional[List[int]] = None,
+    discount_rate: float = 0.12
+) -> int:
+    """
+    Пересчёт строк lot_metrics для лотов lot_ids одной транзакцией: старые строки
+    удаляются, новые считаются одним calculate_batch и вставляются пакетом.
+    report_ids ограничивает пересчёт этими отчётами (None — все); строки неактивных
+    отчётов и отчётов без значений для группы лота только удаляются.
+    Возвращает число записанных строк.
+    """
+    lots = (await db.scalars(select(Lot).where(Lot.id.in_(lot_ids)).order_by(Lot.id))).all()
+    reports_query = select(MarketReport.id).where(MarketReport.active == True)
+    stale = delete(LotMetric).where(LotMetric.lot_id.in_(lot_ids))
+    if report_ids is not None:
+        reports_query = reports_query.where(MarketReport.id.in_(report_ids))
+        stale = stale.where(LotMetric.report_id.in_(report_ids))
+    active_reports = (await db.scalars(reports_query.order_by(MarketReport.id))).all()
+
+    # Пары (отчёт, группа), для которых есть значения: без них calculate_batch отказывает
+    available = set()
+    if lots and active_reports:
+        available = set((await db.execute(
+            select(MarketReportValue.report_id, MarketReportValue.location_group_id).where(
+                MarketReportValue.report_id.in_(active_reports),
+                MarketReportValue.location_group_id.in_({lot.location_group_id for lot in lots}),
+                MarketReportValue.property_class == LOT_PROPERTY_CLASS
+            )
+        )).all())
+    scenario_ids = [scenario.id for scenario in (await get_reference_snapshot(db)).ordered_scenarios()]
+
+    keys: List[Tuple[Lot, int, str, int]] = [
+        (lot, report_id, scenario_id, holding_years)
+        for lot in lots
+        for report_id in active_reports
+        if (report_id, lot.location_group_id) in available
+        for scenario_id in scenario_ids
+        for holding_years in settings.LOT_METRICS_HOLDING_YEARS
+    ]
+    items = [
+        CalculationRequest(
+            purchase_price=discounted_price(lot),
+            area=lot.area,
+            location_group_id=lot.location_group_id,
+            rve_date=lot.rve_date,
+            holding_years=holding_years,
+            scenario_id=scenario_id,
+            report_id=report_id,
+            property_class=LOT_PROPERTY_CLASS
+        )
+        for lot, report_id, scenario_id, holding_years in keys
+    ]
+    results = await calculate_batch(db, items, discount_rate) if items else []
+
+    computed_at = datetime.now(timezone.utc)
+    rows = []
+    for (lot, report_id, scenario_id, holding_years), item, result in zip(keys, items, results):
+        static_metrics = result["static_metrics"]
+        dynamic_metrics = result["dynamic_metrics"]
+        rows.append({
+            "lot_id": lot.id,
+            "report_id": report_id,
+            "scenario_id": scenario_id,
+            "holding_years": holding_years,
+            "location_group_id": lot.location_group_id,
+            "purchase_price": item.purchase_price,
+            "npv": dynamic_metrics["npv"],
+            "irr_percent": dynamic_metrics["irr_percent"],
+            "total_profit": dynamic_metrics["total_profit"],
+            "total_profit_percent": dynamic_metrics["total_profit_percent"],
+            "payback_rent_years": _finite(static_metrics["payback_rent_years"]),
+            "payback_rent_sale_years": _finite(static_metrics["payback_rent_sale_years"]),
+            "computed_at": computed_at,
+        })
+
+    await db.execute(stale)
+    if rows:
+        await db.execute(insert(LotMetric), rows)
+    await db.commit()
+    return len(rows)
+
+
+async def list_lot_metrics(
+    db: AsyncSession,
+    report_id: int,
+    scenario_id: str,
+    holding_years: int,
+    sort: str = "irr_percent",
+    descending: bool = True,
+    location_group_id: Optional[str] = None,
+    min_irr_percent: Optional[float] = None,
+    max_payback_years: Optional[float] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Tuple[List[dict], Optional[int]]:
+    """
+    Страница лотов с материализованными метриками и offset следующей страницы
+    Фильтр и сортировка — по индексам ix_lot_metrics_* (прямой или обратный проход).
+    Порядок NULL — как в индексе (ASC NULLS LAST, назад — DESC NULLS FIRST): лоты без
+    окупаемости (дольше горизонта) считаются самыми долгими — в конце по возрастанию и
+    в начале по убыванию
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Неизвестное поле сортировки: {sort}")
+    order = getattr(LotMetric, sort)
+    order = order.desc().nulls_first() if descending else order.asc().nulls_last()
+    query = (
+        select(
+            LotMetric.lot_id, Lot.cian_url, Lot.address, Lot.area, LotMetric.location_group_id,
+            Lot.purchase_price.label("original_price"), LotMetric.purchase_price,
+            LotMetric.npv, LotMetric.irr_percent, LotMetric.total_profit, LotMetric.total_profit_percent,
+            LotMetric.payback_rent_years, LotMetric.payback_rent_sale_years, LotMetric.computed_at
+        )
+        .join(Lot, Lot.id == LotMetric.lot_id)
+        .where(
+            LotMetric.report_id == report_id,
+            LotMetric.scenario_id == scenario_id,
+            LotMetric.holding_years == holding_years
+        )
+        .order_by(order, LotMetric.lot_id)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    if location_group_id is not None:
+        query = query.where(LotMetric.location_group_id == location_group_id)
+    if min_irr_percent is not None:
+        query = query.where(LotMetric.irr_percent >= min_irr_percent)
+    if max_payback_years is not None:
+        query = query.where(LotMetric.payback_rent_years <= max_payback_years)
+
+    rows = (await db.execute(query)).all()
+    next_offset = offset + limit if len(rows) > limit else None
+    return [dict(row._mapping) for row in rows[:limit]], next_offset
+
+
+@dataclass(frozen=True)
+class RefreshJob:
+    """Задача пересчёта: явные лоты или лоты групп локаций (None — все лоты)"""
+    lot_ids: Optional[Tuple[int, ...]] = None
+    location_group_ids: Optional[Tuple[str, ...]] = None
+    report_ids: Optional[Tuple[int, ...]] = None  # None — все активные отчёты
+
+
+class LotMetricsRefresher:
+    """Очередь задач пересчёта lot_metrics с фоновым выполнением пачками"""
+
+    def __init__(self, chunk_size: int, queue_size: int, session_factory=AsyncSessionLocal):
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.scheduled = 0
+        self.dropped = 0
+        self.not_running = 0
+        self.skipped = 0
+        self.jobs = 0
+        self.chunks = 0
+        self.lots = 0
+        self.rows = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу; текущая пачка откатывается, очередь теряется"""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def join(self):
+        """Ожидание выполнения всех поставленных задач"""
+        if self.running:
+            await self._queue.join()
+
+    def _schedule(self, job: RefreshJob):
+        if not self.running:
+            # LOT_METRICS_ENABLED=false или процесс без lifespan: строки устареют до
+            # полного пересчёта (scripts/refresh_lot_metrics.py)
+            self.not_running += 1
+            logger.warning("Пересчёт метрик лотов не запущен, задача отброшена: %s", job)
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Очередь пересчёта метрик лотов заполнена, задача отброшена: %s", job)
+            return
+        self.scheduled += 1
+
+    def schedule_lots(self, lot_ids: Iterable[int]):
+        """Вызывается после создания или изменения лотов"""
+        self._schedule(RefreshJob(lot_ids=tuple(sorted(set(lot_ids)))))
+
+    def schedule_market(
+        self,
+        report_id: Optional[int] = None,
+        location_group_ids: Optional[Iterable[str]] = None,
+        property_class: Optional[PropertyClass] = None
+    ):
+        """
+        Вызывается после записи значений отчёта report_id для групп location_group_ids
+        (None — отчёт целиком; report_id=None — все отчёты, например после правки сценария).
+        Значения других классов, кроме LOT_PROPERTY_CLASS, на лоты не влияют.
+        """
+        if location_group_ids is not None:
+            location_group_ids = tuple(sorted(set(location_group_ids)))
+        if (property_class is not None and property_class != LOT_PROPERTY_CLASS) or location_group_ids == ():
+            self.skipped += 1
+            return
+        self._schedule(RefreshJob(
+            location_group_ids=location_group_ids,
+            report_ids=(report_id,) if report_id is not None else None
+        ))
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception:
+                logger.exception("Задача пересчёта метрик лотов не выполнена: %s", job)
+            finally:
+                self._queue.task_done()
+
+    async def refresh_all(self):
+        """Полный пересчёт всех лотов по всем активным отчётам, без очереди"""
+        await self._process(RefreshJob())
+
+    async def backfill_if_empty(self) -> bool:
+        """
+        Ставит полный пересчёт, если lot_metrics пуста, а лоты есть (первый запуск после
+        миграции на существующей базе); True, если пересчёт поставлен
+        """
+        async with self.session_factory() as db:
+            empty = not await db.scalar(select(exists().where(LotMetric.lot_id.is_not(None))))
+            has_lots = await db.scalar(select(exists().where(Lot.id.is_not(None))))
+        if empty and has_lots:
+            logger.info("Таблица lot_metrics пуста, запущен полный пересчёт")
+            self.schedule_market()
+            return True
+        return False
+
+    async def _process(self, job: RefreshJob):
+        lot_ids = job.lot_ids
+        if lot_ids is None:
+            query = select(Lot.id).order_by(Lot.id)
+            if job.location_group_ids is not None:
+                query = query.where(Lot.location_group_id.in_(job.location_group_ids))
+            async with self.session_factory() as db:
+                lot_ids = (await db.scalars(query)).all()
+        report_ids = list(job.report_ids) if job.report_ids is not None else None
+
+        for start in range(0, len(lot_ids), self.chunk_size):
+            chunk = list(lot_ids[start:start + self.chunk_size])
+            try:
+                async with self.session_factory() as db:
+                    self.rows += await refresh_lot_metrics(db, chunk, report_ids)
+            except Exception:
+                # Пачка остаётся со старыми строками, остальные пачки пересчитываются
+                self.failed += len(chunk)
+                logger.exception("Метрики %d лотов не пересчитаны", len(chunk))
+                continue
+            self.chunks += 1
+            self.lots += len(chunk)
+            # Пачки не занимают цикл событий подряд
+            await asyncio.sleep(0)
+        self.jobs += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "not_running": self.not_running,
+            "skipped": self.skipped,
+            "jobs": self.jobs,
+            "chunks": self.chunks,
+            "lots": self.lots,
+            "rows": self.rows,
+            "failed": self.failed,
+        }
+
+
+lot_metrics_refresher = LotMetricsRefresher(
+    chunk_size=settings.LOT_METRICS_CHUNK_SIZE,
+    queue_size=settings.LOT_METRICS_QUEUE_SIZE
+)
+
+
+# Автоматический пересчёт после изменения лотов через ORM
+
+_PENDING_LOTS = "lot_metrics_lot_ids"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_lots(session: Session, flush_context):
+    """Новые и изменённые лоты; строки удалённых удаляет ON DELETE CASCADE"""
+    lot_ids: Set[int] = session.info.setdefault(_PENDING_LOTS, set())
+    for instance in session.new:
+        if isinstance(instance, Lot):
+            lot_ids.add(instance.id)
+    for instance in session.dirty:
+        if isinstance(instance, Lot) and session.is_modified(instance):
+            lot_ids.add(instance.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_changed_lots(session: Session):
+    lot_ids = session.info.pop(_PENDING_LOTS, None)
+    if lot_ids:
+        lot_metrics_refresher.schedule_lots(lot_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_lots(session: Session):
+    session.info.pop(_PENDING_LOTS, None)
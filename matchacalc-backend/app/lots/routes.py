@@ -0,0 +1,56 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db
+from app.auth.dependencies import get_current_user
+from app.config import settings
+from app.lots.metrics import list_lot_metrics
+from app.lots.schemas import LotMetricsListResponse
+
+router = APIRouter()
+
+
+@router.get("", response_model=LotMetricsListResponse)
+async def get_lots(
+    report_id: int = Query(..., description="ID отчёта"),
+    scenario_id: str = Query("base", description="ID сценария"),
+    holding_years: int = Query(5, description="Срок владения (из LOT_METRICS_HOLDING_YEARS)"),
+    sort: Literal["irr_percent", "npv", "payback_rent_years"] = Query("irr_percent"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    location_group_id: Optional[str] = Query(None),
+    min_irr_percent: Optional[float] = Query(None, description="IRR не ниже, %"),
+    max_payback_years: Optional[float] = Query(None, description="Окупаемость арендой не дольше, лет"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Лоты с метриками, отсортированные и отфильтрованные по IRR, NPV или окупаемости
+    Метрики читаются из материализованной таблицы lot_metrics (app.lots.metrics)
+    """
+    if holding_years not in settings.LOT_METRICS_HOLDING_YEARS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Метрики лотов считаются для сроков владения: {settings.LOT_METRICS_HOLDING_YEARS}"
+        )
+    items, next_offset = await list_lot_metrics(
+        db,
+        report_id=report_id,
+        scenario_id=scenario_id,
+        holding_years=holding_years,
+        sort=sort,
+        descending=order == "desc",
+        location_group_id=location_group_id,
+        min_irr_percent=min_irr_percent,
+        max_payback_years=max_payback_years,
+        limit=limit,
+        offset=offset
+    )
+    return LotMetricsListResponse(
+        report_id=report_id,
+        scenario_id=scenario_id,
+        holding_years=holding_years,
+        items=items,
+        next_offset=next_offset
+    )
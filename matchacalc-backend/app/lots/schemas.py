@@ -0,0 +1,28 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class LotMetricsItem(BaseModel):
+    lot_id: int
+    cian_url: str
+    address: str
+    area: float
+    location_group_id: str
+    original_price: float
+    purchase_price: float  # с учётом скидки лота — она идёт в расчёт
+    npv: float
+    irr_percent: float
+    total_profit: float
+    total_profit_percent: float
+    payback_rent_years: Optional[float] = None  # None — не окупается за горизонт расчёта
+    payback_rent_sale_years: Optional[float] = None
+    computed_at: datetime
+
+
+class LotMetricsListResponse(BaseModel):
+    report_id: int
+    scenario_id: str
+    holding_years: int
+    items: List[LotMetricsItem]
+    next_offset: Optional[int] = None  # None — страниц больше нет
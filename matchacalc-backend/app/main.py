@@ -1,3 +1,6 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -7,12 +10,67 @@ from app.auth.routes import router as auth_router
 from app.calc.routes import router as calc_router
 from app.reports.routes import router as reports_router
 from app.admin.routes import router as admin_router
+from app.collections.routes import router as collections_router
+from app.lots.routes import router as lots_router
 from app.ratelimit.middleware import RateLimitMiddleware
+from app.calc.montecarlo import shutdown_pool as shutdown_monte_carlo_pool
+from app.auth.hashing import password_hasher
+from app.cache.refdata import reference_cache
+from app.cache.principals import principal_cache
+from app.calc.history import calculation_writer, ensure_partitions, maintain_partitions
+from app.lots.metrics import lot_metrics_refresher
+from app.config import settings
+from app.db.database import AsyncSessionLocal, async_engine
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновых ресурсов приложения"""
+    # Справочник расчёта загружается заранее, чтобы первый запрос не ходил в БД
+    try:
+        async with AsyncSessionLocal() as db:
+            await reference_cache.load(db)
+    except Exception:
+        logger.exception("Справочник не загружен при старте, загрузка при первом запросе")
+    reference_cache.start_listener()
+    principal_cache.start_listener()
+    try:
+        async with async_engine.begin() as connection:
+            await ensure_partitions(connection, settings.CALC_HISTORY_PARTITION_MONTHS_AHEAD)
+    except Exception:
+        logger.exception("Секции calculations не созданы, новые строки попадут в calculations_default")
+    partitions_task = asyncio.create_task(maintain_partitions(
+        async_engine,
+        settings.CALC_HISTORY_PARTITION_MONTHS_AHEAD,
+        settings.CALC_HISTORY_PARTITION_CHECK_INTERVAL_SECONDS
+    ))
+    if settings.CALC_HISTORY_ENABLED:
+        calculation_writer.start()
+    if settings.LOT_METRICS_ENABLED:
+        lot_metrics_refresher.start()
+        try:
+            await lot_metrics_refresher.backfill_if_empty()
+        except Exception:
+            logger.exception("Не удалось проверить lot_metrics, заполнение — scripts/refresh_lot_metrics.py")
+    yield
+    partitions_task.cancel()
+    await lot_metrics_refresher.stop()
+    # Очередь истории дописывается до закрытия пула соединений
+    await calculation_writer.stop()
+    reference_cache.stop_listener()
+    principal_cache.stop_listener()
+    shutdown_monte_carlo_pool()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="MatchaCalc",
     version="0.1.0",
-    description="Калькулятор доходности коммерческой недвижимости"
+    description="Калькулятор доходности коммерческой недвижимости",
+    lifespan=lifespan
 )
 
 # CORS
@@ -32,6 +90,8 @@ app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(calc_router, prefix="/api/v1/calc", tags=["calc"])
 app.include_router(reports_router, prefix="/api/v1/reports", tags=["reports"])
 app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(collections_router, prefix="/api/v1/collections", tags=["collections"])
+app.include_router(lots_router, prefix="/api/v1/lots", tags=["lots"])
 
 
 @app.get("/")
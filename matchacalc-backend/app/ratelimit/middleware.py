@@ -1,16 +1,52 @@
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+import math
+import uuid
 import redis
-import time
+import redis.asyncio
+from sqlalchemy import select
 from app.config import settings
-from app.db.database import get_db
-from app.auth.dependencies import get_current_user
-from app.db.models import SubscriptionStatus
-from typing import Optional
+from app.auth.jwt_handler import decode_access_token
+from app.db.database import AsyncSessionLocal
+from app.db.models import Subscription, SubscriptionPlan, SubscriptionStatus
+from typing import Optional, Tuple
 
 
+# Ограничиваются только эндпоинты калькулятора
+LIMITED_PATH_PREFIX = "/api/v1/calc"
+# ...кроме чтения истории: это не расчёт
+UNLIMITED_PATHS = ("/api/v1/calc/history",)
+
 redis_client = None
+async_redis_client = None
+sliding_window_script = None
+
+# Число запросов в скользящем окне (окно — RATE_LIMIT_* секунд)
+REQUESTS_PER_WINDOW = 1
+
+# Скользящее окно: журнал отметок времени в ZSET, проверка и запись атомарно на сервере.
+# KEYS[1] — ключ клиента; ARGV: окно (мс), лимит, уникальный идентификатор запроса.
+# Возвращает 0, если запрос разрешён, иначе миллисекунды до освобождения окна.
+_SLIDING_WINDOW_SCRIPT = """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return math.max(tonumber(oldest[2]) + window - now, 1)
+"""
+
+# Тариф пользователя кэшируется в Redis: без запросов к БД на каждом расчёте
+PLAN_KEY_PREFIX = "ratelimit:plan"
 
 
 def get_redis_client():
@@ -21,77 +57,144 @@ def get_redis_client():
     return redis_client
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware для ограничения частоты запросов"""
+def get_async_redis_client():
+    """Получение асинхронного клиента Redis (общий пул соединений)"""
+    global async_redis_client
+    if async_redis_client is None:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+            decode_responses=True
+        )
+        async_redis_client = redis.asyncio.Redis(connection_pool=pool)
+    return async_redis_client
+
+
+async def check_rate_limit(key: str, window_seconds: int, limit: int = REQUESTS_PER_WINDOW) -> float:
+    """
+    Один вызов скрипта (EVALSHA) на запрос: 0 — запрос разрешён,
+    иначе секунды до момента, когда окно освободится
+    """
+    global sliding_window_script
+    if sliding_window_script is None:
+        sliding_window_script = get_async_redis_client().register_script(_SLIDING_WINDOW_SCRIPT)
+    retry_after_ms = await sliding_window_script(
+        keys=[key], args=[window_seconds * 1000, limit, uuid.uuid4().hex]
+    )
+    return int(retry_after_ms) / 1000
+
+
+def plan_key(user_id: int) -> str:
+    return f"{PLAN_KEY_PREFIX}:{user_id}"
+
+
+async def load_subscription_plan(user_id: int) -> str:
+    """План активной подписки из БД ("none", если подписки нет)"""
+    async with AsyncSessionLocal() as db:
+        plan = await db.scalar(select(Subscription.plan).where(
+            Subscription.user_id == user_id,
+            Subscription.status == SubscriptionStatus.ACTIVE
+        ).limit(1))
+    return (plan or SubscriptionPlan.NONE).value
+
+
+async def get_subscription_plan(user_id: int) -> Optional[str]:
+    """
+    План из Redis; при промахе — из БД с записью в Redis на RATE_LIMIT_PLAN_TTL_SECONDS
+    None, если Redis недоступен: лимит тогда всё равно не проверяется, и запрос к БД не нужен
+    """
+    client = get_async_redis_client()
+    key = plan_key(user_id)
+    try:
+        plan = await client.get(key)
+    except redis.RedisError:
+        return None
+    if plan is None:
+        plan = await load_subscription_plan(user_id)
+        try:
+            await client.setex(key, settings.RATE_LIMIT_PLAN_TTL_SECONDS, plan)
+        except redis.RedisError:
+            pass  # План прочитан, в кэш попадёт при следующем промахе
+    return plan
+
+
+async def invalidate_subscription_plan(user_id: int):
+    """Вызывается после изменения подписок пользователя"""
+    try:
+        await get_async_redis_client().delete(plan_key(user_id))
+    except redis.RedisError:
+        pass  # Запись истечёт по TTL
+
+
+def invalidate_subscription_plan_sync(user_id: int):
+    """То же для синхронных скриптов"""
+    try:
+        get_redis_client().delete(plan_key(user_id))
+    except redis.RedisError:
+        pass  # Запись истечёт по TTL
+
+
+async def resolve_limit(headers: Headers, client: Optional[tuple]) -> Tuple[str, int]:
+    """Ключ и окно (секунды) для запроса: подписчик, пользователь или гость по IP"""
+    user_id = None
+    subscription_status = None
+    
+    # Простая проверка токена без полной аутентификации
+    try:
+        auth_header = headers.get("authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            payload = decode_access_token(auth_header[len("Bearer "):])
+            if payload:
+                user_id = int(payload.get("sub"))
+                # Тариф из кэша в Redis, БД — только при промахе
+                subscription_status = await get_subscription_plan(user_id)
+    except Exception:
+        pass
+    
+    if subscription_status in (SubscriptionPlan.AGENT.value, SubscriptionPlan.DEVELOPER.value):
+        return f"ratelimit:subscriber:{user_id}", settings.RATE_LIMIT_SUBSCRIBER
+    if user_id:
+        return f"ratelimit:user:{user_id}", settings.RATE_LIMIT_USER
+    # Гость - используем IP
+    client_ip = client[0] if client else "unknown"
+    return f"ratelimit:guest:{client_ip}", settings.RATE_LIMIT_GUEST
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware ограничения частоты запросов
+    Запросы вне /api/v1/calc и к UNLIMITED_PATHS передаются приложению без какой-либо обработки.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         # Применяем rate-limiting только к эндпоинтам калькулятора
-        if not request.url.path.startswith("/api/v1/calc"):
-            response = await call_next(request)
-            return response
-        
-        # Определяем ключ для rate-limiting
-        user_id = None
-        subscription_status = None
-        
-        # Пытаемся получить пользователя из токена
-        try:
-            # Простая проверка токена без полной аутентификации
-            auth_header = request.headers.get("Authorization")
-            if auth_header and auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-                from app.auth.jwt_handler import decode_access_token
-                payload = decode_access_token(token)
-                if payload:
-                    user_id = payload.get("sub")
-                    # Получаем статус подписки из БД
-                    from app.db.database import SessionLocal
-                    db = SessionLocal()
-                    try:
-                        from app.db.models import User, Subscription
-                        user = db.query(User).filter(User.id == user_id).first()
-                        if user:
-                            subscription = db.query(Subscription).filter(
-                                Subscription.user_id == user_id,
-                                Subscription.status == SubscriptionStatus.ACTIVE
-                            ).first()
-                            if subscription:
-                                subscription_status = subscription.plan.value
-                    finally:
-                        db.close()
-        except Exception:
-            pass
-        
-        # Определяем лимит
-        if subscription_status == "agent" or subscription_status == "developer":
-            limit_seconds = settings.RATE_LIMIT_SUBSCRIBER
-            key_prefix = f"ratelimit:subscriber:{user_id}"
-        elif user_id:
-            limit_seconds = settings.RATE_LIMIT_USER
-            key_prefix = f"ratelimit:user:{user_id}"
-        else:
-            # Гость - используем IP
-            client_ip = request.client.host if request.client else "unknown"
-            limit_seconds = settings.RATE_LIMIT_GUEST
-            key_prefix = f"ratelimit:guest:{client_ip}"
-        
-        # Проверяем rate limit
-        redis_cli = get_redis_client()
-        key = f"{key_prefix}:{int(time.time() / limit_seconds)}"
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(LIMITED_PATH_PREFIX)
+            or scope["path"] in UNLIMITED_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
         
+        key, limit_seconds = await resolve_limit(Headers(scope=scope), scope.get("client"))
         try:
-            current = redis_cli.incr(key)
-            if current == 1:
-                redis_cli.expire(key, limit_seconds)
-            
-            if current > 1:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Превышен лимит запросов. Попробуйте через {limit_seconds} секунд."
-                )
+            retry_after = await check_rate_limit(key, limit_seconds)
         except redis.RedisError:
             # Если Redis недоступен, пропускаем запрос (fallback)
-            pass
+            retry_after = 0
+        
+        if retry_after > 0:
+            seconds = math.ceil(retry_after)
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": f"Превышен лимит запросов. Попробуйте через {seconds} секунд."},
+                headers={"Retry-After": str(seconds)}
+            )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
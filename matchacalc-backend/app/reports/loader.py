@@ -0,0 +1,316 @@
+"""
+Потоковая загрузка данных рынка из JSON
+
+Поддерживаются оба формата файлов:
+  - market_data_Q4_2025.json: [ {provider, title, period, ..., "values": [...]}, ... ]
+  - market_reports_data.json: {"metadata": {...}, "reports": [
+        {"market_report": {...}, "market_report_values": [...]}, ... ]}
+
+MarketDataParser разбирает текст по частям и отдаёт отчёты по одному, поэтому в памяти
+одновременно находится только текущий отчёт. Значения пишутся пакетами
+INSERT ... ON CONFLICT DO UPDATE по уникальному индексу uq_market_report_values_lookup,
+всё — в одной транзакции.
+"""
+import codecs
+import json
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, Iterator, List, Optional, TextIO, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import MarketReport, MarketReportValue, PropertyClass
+
+# Строк market_report_values в одном INSERT
+BATCH_SIZE = 1000
+
+# Размер части файла при чтении (символов)
+CHUNK_SIZE = 64 * 1024
+
+REPORT_FIELDS = ("provider", "title", "period", "file_url", "active")
+VALUE_FIELDS = (
+    "rent_start", "rent_growth_annual", "price_per_m2_start", "price_growth_annual", "vacancy_rate"
+)
+LOOKUP_COLUMNS = ("report_id", "location_group_id", "property_class")
+
+_WHITESPACE = " \t\n\r"
+
+
+# Самый длинный обрезанный токен без структурных символов: число, литерал, \uXXXX
+_MAX_PARTIAL_TOKEN = 64
+
+
+def _truncated(buffer: str, error: json.JSONDecodeError) -> bool:
+    """
+    Ошибка из-за того, что текст ещё не дочитан: незакрытая строка или короткий обрезанный
+    токен в конце буфера. Любая другая ошибка — некорректный JSON, и ждать конца потока
+    (копя его в памяти и разбирая буфер заново на каждой части) незачем.
+    """
+    if error.msg.startswith("Unterminated string"):
+        return True
+    tail = buffer[error.pos:]
+    return len(tail) <= _MAX_PARTIAL_TOKEN and not any(
+        char in _WHITESPACE or char in ",:[]{}" for char in tail
+    )
+
+
+class MarketDataParser:
+    """
+    Инкрементальный разбор файла данных рынка: feed() принимает очередную часть текста
+    и возвращает отчёты, полностью попавшие в прочитанный текст
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._closed = False
+        # root: начало документа; key/colon/value/next: поля корневого объекта;
+        # item/item_next: элементы массива отчётов; done: документ разобран
+        self._state = "root"
+        self._key: Optional[str] = None
+        self._in_object = False
+
+    def feed(self, text: str) -> List[dict]:
+        self._buffer += text
+        return self._parse()
+
+    def close(self) -> List[dict]:
+        self._closed = True
+        reports = self._parse()
+        if self._state != "done" or self._buffer.strip(_WHITESPACE):
+            raise ValueError("Некорректный или неполный JSON данных рынка")
+        return reports
+
+    def _parse(self) -> List[dict]:
+        reports = []
+        position = 0
+        buffer = self._buffer
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position == len(buffer) or self._state == "done":
+                break
+            char = buffer[position]
+
+            if self._state == "root":
+                if char not in "[{":
+                    raise ValueError("Ожидается массив отчётов или объект с ключом reports")
+                self._in_object = char == "{"
+                self._state = "key" if self._in_object else "item"
+                position += 1
+            elif self._state == "key":
+                if char == "}":
+                    self._state = "done"
+                    position += 1
+                    continue
+                decoded = self._decode(buffer, position)
+                if decoded is None:
+                    break
+                self._key, position = decoded
+                self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    raise ValueError("Ожидается ':' после ключа")
+                self._state = "value"
+                position += 1
+            elif self._state == "value":
+                if self._key == "reports":
+                    if char != "[":
+                        raise ValueError("Ключ reports должен содержать массив")
+                    self._state = "item"
+                    position += 1
+                    continue
+                # metadata и прочие ключи пропускаются
+                decoded = self._decode(buffer, position)
+                if decoded is None:
+                    break
+                position = decoded[1]
+                self._state = "next"
+            elif self._state == "next":
+                if char not in ",}":
+                    raise ValueError("Ожидается ',' или '}'")
+                self._state = "key" if char == "," else "done"
+                position += 1
+            elif self._state == "item":
+                if char == "]":
+                    self._array_done()
+                    position += 1
+                    continue
+                decoded = self._decode(buffer, position)
+                if decoded is None:
+                    break
+                item, position = decoded
+                reports.append(item)
+                self._state = "item_next"
+            elif self._state == "item_next":
+                if char == ",":
+                    self._state = "item"
+                elif char == "]":
+                    self._array_done()
+                else:
+                    raise ValueError("Ожидается ',' или ']' между отчётами")
+                position += 1
+
+        self._buffer = buffer[position:]
+        return reports
+
+    def _array_done(self):
+        self._state = "next" if self._in_object else "done"
+
+    def _decode(self, buffer: str, position: int) -> Optional[Tuple[object, int]]:
+        """Значение JSON с позиции position или None, если оно ещё не дочитано"""
+        try:
+            value, end = self._decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if self._closed or not _truncated(buffer, e):
+                raise ValueError(f"Некорректный JSON данных рынка (символ {e.pos})")
+            return None
+        # Число или литерал на границе части мог быть обрезан
+        if end == len(buffer) and not self._closed:
+            return None
+        return value, end
+
+
+def iter_file_reports(file: TextIO) -> Iterator[dict]:
+    """Отчёты из открытого текстового файла, по одному"""
+    parser = MarketDataParser()
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def iter_stream_reports(chunks: AsyncIterable[bytes]) -> AsyncIterable[dict]:
+    """Отчёты из потока байтов UTF-8 (например, тела HTTP-запроса), по одному"""
+    parser = MarketDataParser()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        for report in parser.feed(decoder.decode(chunk)):
+            yield report
+    parser.feed(decoder.decode(b"", final=True))
+    for report in parser.close():
+        yield report
+
+
+def split_report(item: dict) -> Tuple[dict, List[dict]]:
+    """Поля отчёта и список значений для любого из двух форматов"""
+    if "market_report" in item:
+        return item["market_report"], item.get("market_report_values", [])
+    return item, item.get("values", [])
+
+
+def upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT (report_id, location_group_id, property_class) DO UPDATE"""
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(MarketReportValue)
+    return statement.on_conflict_do_update(
+        index_elements=list(LOOKUP_COLUMNS),
+        set_={field: statement.excluded[field] for field in VALUE_FIELDS}
+    )
+
+
+@dataclass
+class LoadStats:
+    reports_created: int = 0
+    reports_existing: int = 0
+    values_upserted: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.values_upserted / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "reports_created": self.reports_created,
+            "reports_existing": self.reports_existing,
+            "values_upserted": self.values_upserted,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+class MarketDataLoader:
+    """Запись отчётов в БД: отчёт ищется по (provider, period), значения — пакетный upsert"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.stats = LoadStats()
+        # Ключ → строка: повтор ключа внутри пакета заменяет предыдущую строку,
+        # иначе ON CONFLICT затронул бы одну строку дважды
+        self._pending = {}
+        # (provider, period) → id отчёта
+        self._report_ids: Optional[dict] = None
+        self._upsert = None
+
+    async def add(self, item: dict):
+        report_data, values = split_report(item)
+        report_id = await self._report_id(report_data)
+        for value_data in values:
+            row = {field: value_data.get(field) for field in VALUE_FIELDS}
+            row.update(
+                report_id=report_id,
+                location_group_id=value_data["location_group_id"],
+                property_class=PropertyClass(value_data["property_class"]),
+            )
+            self._pending[(report_id, row["location_group_id"], row["property_class"])] = row
+            if len(self._pending) >= self.batch_size:
+                await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows = list(self._pending.values())
+        self._pending = {}
+        if self._upsert is None:
+            self._upsert = upsert_statement(self.db.bind.dialect.name)
+        # executemany: оператор компилируется один раз, строки уходят многострочными VALUES
+        await self.db.execute(self._upsert, rows)
+        self.stats.values_upserted += len(rows)
+
+    async def _report_id(self, report_data: dict) -> int:
+        key = (report_data["provider"], report_data["period"])
+        if self._report_ids is None:
+            # Все существующие отчёты — одним запросом на загрузку
+            rows = await self.db.execute(select(MarketReport.provider, MarketReport.period, MarketReport.id))
+            self._report_ids = {}
+            for provider, period, report_id in rows:
+                self._report_ids.setdefault((provider, period), report_id)
+        report_id = self._report_ids.get(key)
+        if report_id is not None:
+            self.stats.reports_existing += 1
+            return report_id
+        report_id = await self.db.scalar(
+            insert(MarketReport)
+            .values({field: report_data[field] for field in REPORT_FIELDS if report_data.get(field) is not None})
+            .returning(MarketReport.id)
+        )
+        self._report_ids[key] = report_id
+        self.stats.reports_created += 1
+        return report_id
+
+
+async def load_market_data(db: AsyncSession, reports, batch_size: int = BATCH_SIZE) -> LoadStats:
+    """
+    Загрузка отчётов (итератор или асинхронный итератор) в одной транзакции
+    При ошибке транзакция откатывается целиком
+    """
+    started = time.perf_counter()
+    loader = MarketDataLoader(db, batch_size)
+    try:
+        if hasattr(reports, "__aiter__"):
+            async for item in reports:
+                await loader.add(item)
+        else:
+            for item in reports:
+                await loader.add(item)
+        await loader.flush()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    loader.stats.seconds = time.perf_counter() - started
+    return loader.stats
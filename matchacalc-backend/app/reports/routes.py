@@ -1,6 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.db.models import MarketReport, LocationGroup, ScenarioConfig
 from app.reports.schemas import MarketReportResponse, LocationGroupResponse, ScenarioResponse
@@ -9,21 +10,21 @@ router = APIRouter()
 
 
 @router.get("/", response_model=List[MarketReportResponse])
-def get_reports(db: Session = Depends(get_db)):
+async def get_reports(db: AsyncSession = Depends(get_db)):
     """Список доступных отчётов"""
-    reports = db.query(MarketReport).filter(MarketReport.active == True).all()
+    reports = (await db.scalars(select(MarketReport).where(MarketReport.active == True))).all()
     return reports
 
 
 @router.get("/location-groups", response_model=List[LocationGroupResponse])
-def get_location_groups(db: Session = Depends(get_db)):
+async def get_location_groups(db: AsyncSession = Depends(get_db)):
     """Список групп локаций"""
-    groups = db.query(LocationGroup).all()
+    groups = (await db.scalars(select(LocationGroup))).all()
     return groups
 
 
 @router.get("/scenarios", response_model=List[ScenarioResponse])
-def get_scenarios(db: Session = Depends(get_db)):
+async def get_scenarios(db: AsyncSession = Depends(get_db)):
     """Список сценариев"""
-    scenarios = db.query(ScenarioConfig).all()
+    scenarios = (await db.scalars(select(ScenarioConfig))).all()
     return scenarios
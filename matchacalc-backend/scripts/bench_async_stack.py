@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное сравнение синхронного и асинхронного стека запросов к БД
+Использование:
+    python scripts/bench_async_stack.py [одновременных_запросов] [задержка_БД_мс] [размер_пула]
+
+Два одинаковых маршрута, каждый делает один запрос с задержкой на стороне БД
+(pg_sleep; для SQLite — функция pg_sleep, зарегистрированная в соединении):
+  sync  — def-маршрут и Session (psycopg2): каждый запрос держит поток пула Starlette
+  async — async-маршрут и AsyncSession (asyncpg): запрос ждёт соединение из пула БД
+Оба движка получают одинаковый пул соединений, поэтому разница в пропускной
+способности — это лимит пула потоков Starlette (по умолчанию 40).
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.db.database import get_async_database_url
+
+LATENCY_QUERY = text("SELECT pg_sleep(:seconds)")
+
+
+def register_sleep(engine):
+    """pg_sleep для SQLite: блокирует поток соединения, как ожидание ответа Postgres"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pg_sleep", 1, time.sleep)
+
+
+def build_apps(latency: float, pool_size: int):
+    """Приложения sync и async с общим размером пула соединений"""
+    pool = dict(pool_size=pool_size, max_overflow=0, pool_timeout=60)
+    sync_engine = create_engine(settings.DATABASE_URL, **pool)
+    async_engine = create_async_engine(get_async_database_url(settings.DATABASE_URL), **pool)
+    register_sleep(sync_engine)
+    register_sleep(async_engine.sync_engine)
+    sync_sessions = sessionmaker(bind=sync_engine)
+    async_sessions = async_sessionmaker(async_engine)
+
+    def get_sync_db():
+        db = sync_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    sync_app = FastAPI()
+    async_app = FastAPI()
+
+    @sync_app.get("/")
+    def sync_route(db: Session = Depends(get_sync_db)):
+        db.execute(LATENCY_QUERY, {"seconds": latency})
+        return {"ok": True}
+
+    @async_app.get("/")
+    async def async_route(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(LATENCY_QUERY, {"seconds": latency})
+        return {"ok": True}
+
+    return (sync_app, sync_engine.dispose), (async_app, async_engine.dispose)
+
+
+async def load(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Секунд на requests запросов при concurrency одновременных клиентах"""
+    transport = httpx.ASGITransport(app=app)
+    queue = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in queue:
+                response = await client.get("/")
+                response.raise_for_status()
+
+        await client.get("/")  # Прогрев пула соединений
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 100.0) / 1000
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    requests = concurrency * 10
+    threads = anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    print(f"{requests} запросов, {concurrency} одновременно, задержка БД {latency * 1000:.0f} мс")
+    print(f"пул соединений {pool_size}, пул потоков Starlette {threads:.0f}")
+    for name, (app, dispose) in zip(("sync", "async"), build_apps(latency, pool_size)):
+        seconds = await load(app, requests, concurrency)
+        result = dispose()
+        if asyncio.iscoroutine(result):
+            await result
+        print(f"  {name:5s}: {requests / seconds:8.1f} запросов/с, {seconds * 1000 / requests * concurrency:7.1f} мс на запрос")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетного расчёта: строк в секунду на одно ядро
+Использование:
+    python scripts/bench_calc_batch.py [число_строк ...]
+"""
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.calc.batch import calculate_metrics_batch
+from app.calc.formulas import CashFlowSchedule, calculate_double_price
+
+
+def random_rows(rows: int, seed: int = 0) -> dict:
+    """Случайные, но реалистичные параметры лотов"""
+    rng = np.random.default_rng(seed)
+    return dict(
+        purchase_price=rng.uniform(10e6, 500e6, rows),
+        area=rng.uniform(30, 1000, rows),
+        rent_start=rng.uniform(15000, 80000, rows),
+        rent_growth_annual=rng.uniform(-0.05, 0.2, rows),
+        price_growth_annual=rng.uniform(-0.05, 0.1, rows),
+        holding_years=rng.integers(1, 16, rows),
+    )
+
+
+def bench_batch(rows: int, repeats: int = 5) -> float:
+    """Лучшее время векторного расчёта (вместе со сборкой ответов)"""
+    data = random_rows(rows)
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        calculate_metrics_batch(**data).to_dicts()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_scalar(rows: int) -> float:
+    """Время того же объёма скалярным расчётом по CashFlowSchedule"""
+    data = random_rows(rows)
+    started = time.perf_counter()
+    for index in range(rows):
+        holding_years = int(data["holding_years"][index])
+        schedule = CashFlowSchedule(
+            data["purchase_price"][index], data["area"][index], data["rent_start"][index],
+            data["rent_growth_annual"][index], data["price_growth_annual"][index],
+            horizon_years=max(holding_years, 50)
+        )
+        schedule.payback_rent()
+        schedule.payback_rent_and_sale()
+        calculate_double_price(data["price_growth_annual"][index])
+        schedule.rent_income(holding_years)
+        schedule.npv(holding_years)
+        schedule.irr(holding_years)
+        schedule.cash_flows(holding_years)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+
+    print(f"{'строк':>8} | {'пакет, строк/с':>15} | {'скаляр, строк/с':>16}")
+    for rows in sizes:
+        batch_time = bench_batch(rows)
+        scalar_time = bench_scalar(rows)
+        print(f"{rows:>8} | {rows / batch_time:>15,.0f} | {rows / scalar_time:>16,.0f}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Всплеск одинаковых расчётов: число SQL-запросов и расчётов с объединением и без
+Использование:
+    python scripts/bench_calc_burst.py [число_одновременных_запросов]
+
+Без объединения каждый запрос сам читает справочник из БД и считает метрики
+(как до кэша справочника и single-flight). С объединением — холодные кэши,
+все запросы одновременно идут в calculate_metrics.
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import MarketReportValue, ScenarioConfig
+from app.cache.refdata import reference_cache
+from app.cache.results import result_cache
+from app.calc import service
+
+statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+async def burst(requests: int, handler) -> tuple:
+    """Запуск requests одновременных вызовов handler(db); (SQL-запросов, секунд)"""
+    global statements
+    statements = 0
+
+    async def request():
+        async with AsyncSessionLocal() as db:
+            return await handler(db)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(requests)))
+    return statements, time.perf_counter() - started
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    async with AsyncSessionLocal() as db:
+        value = await db.scalar(select(MarketReportValue).order_by(MarketReportValue.id).limit(1))
+        scenario = await db.scalar(select(ScenarioConfig).limit(1))
+    if not value or not scenario:
+        print("В БД нет данных рынка или сценариев: запустите seed_db.py и load_market_data.py")
+        return
+    params = dict(
+        purchase_price=50_000_000, area=150, location_group_id=value.location_group_id,
+        report_id=value.report_id, scenario_id=scenario.id, holding_years=7,
+        property_class=value.property_class
+    )
+
+    async def legacy(db):
+        market_data = await db.scalar(select(MarketReportValue).where(
+            MarketReportValue.report_id == value.report_id,
+            MarketReportValue.location_group_id == value.location_group_id,
+            MarketReportValue.property_class == value.property_class
+        ).limit(1))
+        config = await db.get(ScenarioConfig, scenario.id)
+        if market_data and config:
+            return await service._calculate_metrics(db, **params, discount_rate=0.12)
+
+    async def coalesced(db):
+        return await service.calculate_metrics(db, **params)
+
+    reference_cache.mark_stale()
+    result_cache.clear()
+    legacy_statements, legacy_seconds = await burst(requests, legacy)
+
+    reference_cache.mark_stale()
+    result_cache.clear()
+    leaders_before = result_cache.stats()["single_flight"]["leaders"]
+    coalesced_statements, coalesced_seconds = await burst(requests, coalesced)
+    computations = result_cache.stats()["single_flight"]["leaders"] - leaders_before
+
+    print(f"{requests} одновременных одинаковых запросов")
+    print(f"  без объединения: {legacy_statements:5d} SQL-запросов, {requests:4d} расчётов, {legacy_seconds * 1000:7.1f} мс")
+    print(f"  с объединением:  {coalesced_statements:5d} SQL-запросов, {computations:4d} расчётов, {coalesced_seconds * 1000:7.1f} мс")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность входа при разной конкурентности
+Использование:
+    python scripts/bench_login.py [стоимость_bcrypt] [входов_на_уровень]
+
+Сравниваются два варианта /auth/login поверх одной SQLite в памяти:
+  threadpool — прежняя проверка пароля в общем пуле потоков Starlette
+  hasher     — app.auth.hashing.password_hasher (свой пул, ограничение очереди, 503)
+Параллельно с входами раз в 20 мс вызывается синхронный def-эндпоинт, которому нужен
+поток Starlette: его p95 показывает, насколько шторм входов задерживает остальные запросы.
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from starlette.concurrency import run_in_threadpool
+from app.auth.hashing import hash_password_sync, password_hasher, verify_password_sync
+from app.auth.routes import router as auth_router
+from app.auth.schemas import UserLogin
+from app.auth.service import get_user_by_email
+from app.config import settings
+from app.db.database import Base, get_db
+from app.db.models import User
+
+CONCURRENCY = (1, 4, 16, 64)
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+async def build_app(mode: str, rounds: int):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    async with sessions() as db:
+        db.add(User(email=EMAIL, password_hash=hash_password_sync(PASSWORD, rounds)))
+        await db.commit()
+
+    async def get_bench_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    if mode == "hasher":
+        app.include_router(auth_router, prefix="/api/v1/auth")
+        app.dependency_overrides[get_db] = get_bench_db
+    else:
+        @app.post("/api/v1/auth/login")
+        async def login(credentials: UserLogin, db: AsyncSession = Depends(get_bench_db)):
+            user = await get_user_by_email(db, credentials.email)
+            if not user or not await run_in_threadpool(verify_password_sync, credentials.password, user.password_hash):
+                raise HTTPException(status_code=401)
+            return {"ok": True}
+
+    @app.get("/sync")
+    def sync_endpoint():
+        return {"ok": True}
+
+    return app, engine
+
+
+async def storm(app: FastAPI, logins: int, concurrency: int):
+    """Входов в секунду, число ответов 503 и p95 задержки /sync во время шторма, мс"""
+    transport = httpx.ASGITransport(app=app)
+    queue = iter(range(logins))
+    statuses = []
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            for _ in queue:
+                response = await client.post("/api/v1/auth/login", json={"email": EMAIL, "password": PASSWORD})
+                statuses.append(response.status_code)
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/sync")
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.02)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    succeeded = statuses.count(200)
+    probe_latencies.sort()
+    p95 = probe_latencies[int(len(probe_latencies) * 0.95)] if probe_latencies else 0.0
+    return succeeded / seconds, statuses.count(503), p95
+
+
+async def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else settings.PASSWORD_BCRYPT_ROUNDS
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    settings.PASSWORD_BCRYPT_ROUNDS = rounds
+
+    started = time.perf_counter()
+    verify_password_sync(PASSWORD, hash_password_sync(PASSWORD, rounds))
+    print(f"bcrypt cost {rounds}: проверка пароля ≈ {(time.perf_counter() - started) * 500:.0f} мс")
+    print(
+        f"пул хеширования: {password_hasher.workers} потоков, "
+        f"до {password_hasher.max_pending} операций; {logins} входов на уровень"
+    )
+    print(f"  {'':10s} {'конкурентность':>14s} {'входов/с':>9s} {'503':>5s} {'p95 /sync, мс':>14s}")
+    for mode in ("threadpool", "hasher"):
+        app, engine = await build_app(mode, rounds)
+        for concurrency in CONCURRENCY:
+            rate, rejected, p95 = await storm(app, logins, concurrency)
+            print(f"  {mode:10s} {concurrency:14d} {rate:9.1f} {rejected:5d} {p95:14.1f}")
+        await engine.dispose()
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
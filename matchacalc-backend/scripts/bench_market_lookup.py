@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска значения рынка по (report_id, location_group_id, property_class)
+Использование:
+    python scripts/bench_market_lookup.py [число_отчётов] [число_поисков]
+
+Строит SQLite в памяти: отчёты × группы локаций × классы объектов, и сравнивает
+задержку запроса get_market_data без индекса и с уникальным индексом
+uq_market_report_values_lookup (миграция b3c1e9f27d45).
+"""
+import random
+import statistics
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from app.db.database import Base
+from app.db.models import LocationGroup, MarketReport, MarketReportValue, PropertyClass
+
+LOCATION_GROUPS = 20
+INDEX = next(
+    index for index in MarketReportValue.__table__.indexes
+    if index.name == "uq_market_report_values_lookup"
+)
+
+
+def populate(db: Session, reports: int):
+    db.execute(insert(LocationGroup), [
+        {"id": f"group_{group}", "name": f"Группа {group}"} for group in range(LOCATION_GROUPS)
+    ])
+    db.execute(insert(MarketReport), [
+        {"id": report, "provider": "bench", "title": f"Отчёт {report}", "period": "2025-Q4"}
+        for report in range(1, reports + 1)
+    ])
+    db.execute(insert(MarketReportValue), [
+        {
+            "report_id": report, "location_group_id": f"group_{group}", "property_class": property_class,
+            "rent_start": 40000.0, "rent_growth_annual": 0.08, "price_growth_annual": 0.04
+        }
+        for report in range(1, reports + 1)
+        for group in range(LOCATION_GROUPS)
+        for property_class in PropertyClass
+    ])
+    db.commit()
+
+
+def lookup_latencies(db: Session, reports: int, lookups: int) -> list:
+    """Задержки (мкс) запроса, которым расчёт ищет значение рынка при промахе кэша"""
+    rng = random.Random(0)
+    classes = list(PropertyClass)
+    latencies = []
+    for _ in range(lookups):
+        started = time.perf_counter()
+        db.scalar(select(MarketReportValue).where(
+            MarketReportValue.report_id == rng.randint(1, reports),
+            MarketReportValue.location_group_id == f"group_{rng.randrange(LOCATION_GROUPS)}",
+            MarketReportValue.property_class == rng.choice(classes)
+        ))
+        latencies.append((time.perf_counter() - started) * 1e6)
+        db.expunge_all()
+    return latencies
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"  {name:12s} медиана {statistics.median(latencies):9.1f} мкс, p95 {p95:9.1f} мкс")
+
+
+def main():
+    reports = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    INDEX.drop(engine)
+
+    with Session(engine) as db:
+        populate(db, reports)
+        rows = reports * LOCATION_GROUPS * len(PropertyClass)
+        print(f"{reports} отчётов, {rows} строк market_report_values, {lookups} поисков")
+
+        report("без индекса", lookup_latencies(db, reports, lookups))
+        INDEX.create(engine)
+        report("с индексом", lookup_latencies(db, reports, lookups))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Накладные расходы rate-limit middleware: запросов в секунду для /health и /calc/preview
+Использование:
+    python scripts/bench_middleware.py [число_запросов]
+
+Сравниваются три стека поверх одинаковых пустых маршрутов:
+  none  — без middleware
+  base  — прежняя реализация на BaseHTTPMiddleware (dispatch + call_next)
+  asgi  — RateLimitMiddleware (чистый ASGI)
+Проверка лимита (Redis) заменена на мгновенный ответ "разрешено", поэтому
+измеряется только сама обвязка middleware.
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.ratelimit import middleware
+from app.ratelimit.middleware import LIMITED_PATH_PREFIX, RateLimitMiddleware, resolve_limit
+
+PATHS = ("/health", "/api/v1/calc/preview")
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """Прежняя реализация: каждый запрос проходит через dispatch и call_next"""
+
+    async def dispatch(self, request: Request, call_next):
+        if not request.url.path.startswith(LIMITED_PATH_PREFIX):
+            return await call_next(request)
+        key, limit_seconds = await resolve_limit(request.headers, request.client)
+        await middleware.check_rate_limit(key, limit_seconds)
+        return await call_next(request)
+
+
+async def allow(key: str, window_seconds: int) -> float:
+    return 0
+
+
+def build_app(middleware_class) -> FastAPI:
+    app = FastAPI()
+    if middleware_class is not None:
+        app.add_middleware(middleware_class)
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.post("/api/v1/calc/preview")
+    async def preview():
+        return {"ok": True}
+
+    return app
+
+
+async def requests_per_second(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    method = "GET" if path == "/health" else "POST"
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(requests // 10):  # Прогрев
+            await client.request(method, path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.request(method, path)
+        return requests / (time.perf_counter() - started)
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    middleware.check_rate_limit = allow
+
+    stacks = (("none", None), ("base", BaseHTTPRateLimitMiddleware), ("asgi", RateLimitMiddleware))
+    print(f"{requests} последовательных запросов на маршрут, запросов/с")
+    print(f"  {'':5s}" + "".join(f"{path:>24s}" for path in PATHS))
+    for name, middleware_class in stacks:
+        app = build_app(middleware_class)
+        rates = [await requests_per_second(app, path, requests) for path in PATHS]
+        print(f"  {name:5s}" + "".join(f"{rate:24.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -13,7 +13,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.db.models import User, UserRole
-import bcrypt
+from app.auth.hashing import hash_password_sync
+from app.cache.principals import invalidate_principal_sync
 
 def create_admin(email: str, password: str):
     """Создаёт пользователя с ролью администратора"""
@@ -22,18 +23,15 @@ def create_admin(email: str, password: str):
     try:
         existing_user = db.query(User).filter(User.email == email).first()
         
-        # Хешируем пароль
-        password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-        salt = bcrypt.gensalt()
-        password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        # Хешируем пароль (стоимость bcrypt — PASSWORD_BCRYPT_ROUNDS)
+        password_hash = hash_password_sync(password)
 
         if existing_user:
             print(f"Пользователь {email} уже существует. Назначаем роль ADMIN...")
             existing_user.password_hash = password_hash
             existing_user.role = UserRole.ADMIN
             db.commit()
+            invalidate_principal_sync(existing_user.id)
             print(f"✅ Роль администратора назначена пользователю {email}!")
         else:
             user = User(
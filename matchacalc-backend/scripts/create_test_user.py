@@ -19,7 +19,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.db.models import User, Subscription, UserRole, SubscriptionPlan, SubscriptionStatus
-import bcrypt
+from app.ratelimit.middleware import invalidate_subscription_plan_sync
+from app.cache.principals import invalidate_principal_sync
+from app.auth.hashing import hash_password_sync
 
 def create_test_user(email: str, password: str, expires_at_str: str, plan: str = "agent"):
     """Создаёт пользователя с премиум подпиской"""
@@ -54,23 +56,14 @@ def create_test_user(email: str, password: str, expires_at_str: str, plan: str =
         if existing_user:
             print(f"Пользователь {email} уже существует. Обновляем пароль и подписку...")
             user = existing_user
-            # Обновляем пароль (bcrypt ограничен 72 байтами)
-            password_bytes = password.encode('utf-8')
-            if len(password_bytes) > 72:
-                password_bytes = password_bytes[:72]
-            salt = bcrypt.gensalt()
-            password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
-            user.password_hash = password_hash
+            # Обновляем пароль
+            user.password_hash = hash_password_sync(password)
             db.commit()
             db.refresh(user)
         else:
             # Создаём пользователя
-            # Хешируем пароль напрямую через bcrypt (bcrypt ограничен 72 байтами)
-            password_bytes = password.encode('utf-8')
-            if len(password_bytes) > 72:
-                password_bytes = password_bytes[:72]
-            salt = bcrypt.gensalt()
-            password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+            # Хешируем пароль (стоимость bcrypt — PASSWORD_BCRYPT_ROUNDS)
+            password_hash = hash_password_sync(password)
             
             user = User(
                 email=email,
@@ -95,6 +88,9 @@ def create_test_user(email: str, password: str, expires_at_str: str, plan: str =
         )
         db.add(subscription)
         db.commit()
+        # Rate limiter перечитает тариф из БД
+        invalidate_subscription_plan_sync(user.id)
+        invalidate_principal_sync(user.id)
         
         print(f"\n✅ Пользователь создан/обновлён!")
         print(f"📧 Email: {email}")
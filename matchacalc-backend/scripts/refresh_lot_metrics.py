@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Полный пересчёт материализованных метрик лотов (таблица lot_metrics)
+Использование:
+    python scripts/refresh_lot_metrics.py
+
+Нужен после миграции на существующей базе, при LOT_METRICS_ENABLED=false и после
+скриптов, которые меняют лоты или данные рынка в обход API (scripts/load_market_data.py).
+Лоты пересчитываются пачками по LOT_METRICS_CHUNK_SIZE, каждая — своей транзакцией.
+"""
+import asyncio
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.db.database import async_engine
+from app.lots.metrics import LotMetricsRefresher
+
+
+async def refresh_lot_metrics() -> int:
+    refresher = LotMetricsRefresher(chunk_size=settings.LOT_METRICS_CHUNK_SIZE, queue_size=1)
+    try:
+        await refresher.refresh_all()
+    except Exception as e:
+        print(f"✗ Ошибка пересчёта: {e}")
+        return 1
+    finally:
+        await async_engine.dispose()
+
+    stats = refresher.stats()
+    print(f"✓ Лотов пересчитано: {stats['lots']}, строк записано: {stats['rows']}, пачек: {stats['chunks']}")
+    if stats["failed"]:
+        print(f"✗ Не пересчитано лотов: {stats['failed']} (подробности в логе)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(refresh_lot_metrics()))
@@ -0,0 +1,114 @@
+"""
+Общие фикстуры тестов: SQLite в памяти, справочные данные рынка, лоты и снимок справочника
+
+Тесты запускают сценарии через asyncio.run, а движок aiosqlite привязан к своему
+event loop, поэтому фикстуры отдают фабрики: база создаётся внутри сценария
+(async with memory_db() as database) и закрывается при выходе из него.
+"""
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.cache.refdata import ReferenceSnapshot, ScenarioSnapshot
+from app.calc import service as calc_service
+from app.collections import public
+from app.db.database import Base
+from app.db.models import LocationGroup, Lot, MarketReport, MarketReportValue, PropertyClass
+from app.lots import metrics
+
+BASE_SCENARIO = ScenarioSnapshot(
+    id="base", name="Базовый", rent_growth_multiplier=1.0, price_growth_multiplier=1.0,
+    discount_rate_adjustment=None
+)
+RVE_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class MemoryDatabase:
+    engine: AsyncEngine
+    sessions: async_sessionmaker
+    statements: List[str] = field(default_factory=list)  # SQL всех запросов после создания схемы
+
+
+@asynccontextmanager
+async def memory_database():
+    """Пустая схема в SQLite в памяти; одно соединение на все сессии (StaticPool)"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    database = MemoryDatabase(engine, async_sessionmaker(engine, expire_on_commit=False))
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: database.statements.append(args[2]))
+    try:
+        yield database
+    finally:
+        await engine.dispose()
+
+
+def add_market(
+    db: AsyncSession,
+    rents: Dict[str, float],
+    report_id: int = 1,
+    property_class: PropertyClass = PropertyClass.A,
+    rent_growth_annual: float = 0.08,
+    price_growth_annual: float = 0.04,
+    groups: Iterable[str] = ()
+):
+    """Группы локаций (из rents и groups), отчёт report_id и по значению рынка на группу из rents (без commit)"""
+    for group in dict.fromkeys((*rents, *groups)):
+        db.add(LocationGroup(id=group, name=group))
+    db.add(MarketReport(id=report_id, provider="nikoliers", title="Отчёт", period="2025-Q4"))
+    for group, rent in rents.items():
+        db.add(MarketReportValue(
+            report_id=report_id, location_group_id=group, property_class=property_class,
+            rent_start=rent, rent_growth_annual=rent_growth_annual, price_growth_annual=price_growth_annual
+        ))
+
+
+def add_lots(db: AsyncSession, lots: Iterable[Tuple[int, str, float, Optional[float]]]):
+    """Лоты (id, группа, цена, скидка %) площадью 100 м² (без commit)"""
+    for lot_id, group, price, discount in lots:
+        db.add(Lot(
+            id=lot_id, cian_url=f"https://cian.ru/{lot_id}", purchase_price=price, area=100.0,
+            address=f"Адрес {lot_id}", location_group_id=group, rve_date=RVE_DATE,
+            custom_discount_percent=discount
+        ))
+
+
+class ReferenceStub:
+    """Снимок справочника без значений рынка (они дочитываются из БД) и со сценарием base"""
+
+    def __init__(self):
+        self.version = None  # число или функция без аргументов
+        self.scenarios = {"base": BASE_SCENARIO}
+
+    async def __call__(self, db) -> ReferenceSnapshot:
+        version = self.version() if callable(self.version) else self.version
+        return ReferenceSnapshot(generation=0, version=version, scenarios=dict(self.scenarios))
+
+
+@pytest.fixture
+def memory_db():
+    return memory_database
+
+
+@pytest.fixture
+def market():
+    return add_market
+
+
+@pytest.fixture
+def lots():
+    return add_lots
+
+
+@pytest.fixture
+def reference_snapshot(monkeypatch) -> ReferenceStub:
+    """get_reference_snapshot во всех модулях расчёта заменяется на ReferenceStub"""
+    stub = ReferenceStub()
+    for module in (calc_service, metrics, public):
+        monkeypatch.setattr(module, "get_reference_snapshot", stub)
+    return stub
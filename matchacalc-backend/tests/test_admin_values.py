@@ -0,0 +1,59 @@
+"""
+Тесты пакетной замены значений отчёта
+"""
+import asyncio
+import pytest
+from app.admin.schemas import MarketReportValueItem
+from app.admin.service import get_report_values, replace_report_values
+from app.db.models import MarketReportValue, PropertyClass
+
+
+def item(location_group_id: str, property_class: PropertyClass, rent_start: float) -> MarketReportValueItem:
+    return MarketReportValueItem(
+        location_group_id=location_group_id, property_class=property_class, rent_start=rent_start,
+        rent_growth_annual=0.1, price_growth_annual=0.03
+    )
+
+
+@pytest.fixture
+def replace(memory_db, market):
+    """Отчёт с тремя значениями, затем замена матрицы на items"""
+    async def run(items):
+        async with memory_db() as database, database.sessions() as db:
+            market(db, {}, groups=("moscow_city", "big_city"))
+            for existing in (
+                item("moscow_city", PropertyClass.A, 58000),
+                item("moscow_city", PropertyClass.A_PRIME, 72000),
+                item("big_city", PropertyClass.A, 42000),
+            ):
+                db.add(MarketReportValue(report_id=1, **existing.model_dump()))
+            await db.commit()
+
+            counts = await replace_report_values(db, 1, items)
+            values = await get_report_values(db, 1)
+            return counts, {(v.location_group_id, v.property_class): v.rent_start for v in values}
+
+    return lambda items: asyncio.run(run(items))
+
+
+def test_diff_applies_inserts_updates_and_deletes(replace):
+    counts, values = replace([
+        item("moscow_city", PropertyClass.A, 58000),        # без изменений
+        item("moscow_city", PropertyClass.A_PRIME, 75000),  # обновление
+        item("big_city", PropertyClass.B_PLUS, 32000),      # вставка
+    ])                                                      # big_city / A — удаление
+
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert values == {
+        ("moscow_city", PropertyClass.A): 58000,
+        ("moscow_city", PropertyClass.A_PRIME): 75000,
+        ("big_city", PropertyClass.B_PLUS): 32000,
+    }
+
+
+def test_duplicate_keys_are_rejected(replace):
+    with pytest.raises(ValueError):
+        replace([
+            item("moscow_city", PropertyClass.A, 58000),
+            item("moscow_city", PropertyClass.A, 59000),
+        ])
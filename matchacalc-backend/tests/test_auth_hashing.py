@@ -0,0 +1,109 @@
+"""
+Тесты пула хеширования паролей и пересчёта хеша при входе
+"""
+import asyncio
+import threading
+import pytest
+from sqlalchemy import select
+from app.auth import service
+from app.auth.hashing import (
+    PasswordHasher, PasswordHasherBusy, hash_password_sync, hash_rounds, needs_rehash, verify_password_sync
+)
+from app.auth.service import authenticate_user
+from app.config import settings
+from app.db.models import User
+
+
+@pytest.fixture(autouse=True)
+def cheap_bcrypt(monkeypatch):
+    """Минимальная стоимость bcrypt, чтобы тесты не тратили секунды на хеширование"""
+    monkeypatch.setattr(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+
+
+def test_hash_uses_configured_rounds():
+    hashed = hash_password_sync("secret")
+
+    assert hash_rounds(hashed) == 4
+    assert verify_password_sync("secret", hashed)
+    assert not verify_password_sync("wrong", hashed)
+    assert not needs_rehash(hashed)
+    assert needs_rehash(hash_password_sync("secret", rounds=5))
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        hasher = PasswordHasher(workers=1, max_pending=2)
+        release = threading.Event()
+        blocked = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(PasswordHasherBusy):
+                await hasher.hash("secret")
+            stats = hasher.stats()
+        finally:
+            release.set()
+            await asyncio.gather(*blocked)
+            hasher.shutdown()
+        return stats, hasher.stats()
+
+    busy, idle = asyncio.run(scenario())
+
+    assert (busy["pending"], busy["rejected"]) == (2, 1)
+    assert (idle["pending"], idle["completed"]) == (0, 2)
+
+
+def test_failed_hash_is_not_counted_as_completed():
+    def broken():
+        raise ValueError("bcrypt")
+
+    async def scenario():
+        hasher = PasswordHasher(workers=1, max_pending=2)
+        try:
+            with pytest.raises(ValueError):
+                await hasher._run(broken)
+            return hasher.stats()
+        finally:
+            hasher.shutdown()
+
+    stats = asyncio.run(scenario())
+
+    assert (stats["pending"], stats["completed"], stats["failed"]) == (0, 0, 1)
+
+
+@pytest.fixture
+def login(memory_db):
+    """Вход пользователя с хешем stored_hash; (результат, хеш после входа)"""
+    async def run(stored_hash: str, password: str):
+        original, service.password_hasher = service.password_hasher, PasswordHasher(workers=1, max_pending=4)
+        try:
+            async with memory_db() as database, database.sessions() as db:
+                db.add(User(email="user@example.com", password_hash=stored_hash))
+                await db.commit()
+                user = await authenticate_user(db, "user@example.com", password)
+                stored = await db.scalar(select(User.password_hash))
+                return user, stored
+        finally:
+            service.password_hasher.shutdown()
+            service.password_hasher = original
+
+    return lambda stored_hash, password: asyncio.run(run(stored_hash, password))
+
+
+def test_login_rehashes_when_cost_changes(login):
+    old_hash = hash_password_sync("secret", rounds=5)
+
+    user, stored = login(old_hash, "secret")
+
+    assert user is not None
+    assert stored != old_hash
+    assert hash_rounds(stored) == 4
+    assert verify_password_sync("secret", stored)
+
+
+def test_login_keeps_current_hash_and_rejects_wrong_password(login):
+    current_hash = hash_password_sync("secret")
+
+    assert login(current_hash, "secret")[1] == current_hash
+    user, stored = login(hash_password_sync("secret", rounds=5), "wrong")
+    assert user is None
+    assert hash_rounds(stored) == 5
@@ -0,0 +1,111 @@
+"""
+Тесты кэша справочных данных
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+import redis
+from sqlalchemy import update
+from app.cache import refdata
+from app.cache.refdata import ReferenceDataCache
+from app.calc import service
+from app.db.models import ScenarioConfig, PropertyClass
+
+
+class _UnavailableRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("Redis недоступен")
+        return fail
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch):
+    """Свой кэш на тест; Redis недоступен"""
+    monkeypatch.setattr(refdata, "get_redis_client", lambda: _UnavailableRedis())
+    monkeypatch.setattr(refdata, "get_async_redis_client", lambda: _UnavailableRedis())
+    monkeypatch.setattr(refdata, "reference_cache", ReferenceDataCache())
+
+
+@pytest.fixture
+def seeded_db(memory_db, market):
+    """SQLite в памяти с одним отчётом и тремя сценариями; отдаёт (база, сессия)"""
+    @asynccontextmanager
+    async def seeded():
+        async with memory_db() as database, database.sessions() as session:
+            market(session, {"moscow_city": 58000.0}, rent_growth_annual=0.12, price_growth_annual=0.035)
+            for scenario_id, multiplier in (("pes", 0.8), ("base", 1.0), ("opt", 1.2)):
+                session.add(ScenarioConfig(
+                    id=scenario_id, name=scenario_id,
+                    rent_growth_multiplier=multiplier, price_growth_multiplier=multiplier
+                ))
+            await session.commit()
+            yield database, session
+
+    return seeded
+
+
+def test_cache_hit_does_not_query_database(seeded_db):
+    """После загрузки снимка расчёт не обращается к БД"""
+    async def scenario():
+        async with seeded_db() as (database, db):
+            await refdata.reference_cache.load(db)
+            database.statements.clear()
+            result = await service.resolve_market_inputs(db, 1, "moscow_city", PropertyClass.A, "opt")
+            return result, len(database.statements)
+
+    (market_data, rent_growth, price_growth), queries = asyncio.run(scenario())
+
+    assert queries == 0
+    assert market_data.rent_start == 58000
+    assert rent_growth == pytest.approx(0.12 * 1.2)
+    assert price_growth == pytest.approx(0.035 * 1.2)
+
+
+def test_invalidation_reloads_snapshot(seeded_db):
+    """После инвалидации следующий запрос видит изменения"""
+    async def scenario():
+        async with seeded_db() as (database, db):
+            await refdata.reference_cache.load(db)
+            await db.execute(
+                update(ScenarioConfig).where(ScenarioConfig.id == "opt").values(rent_growth_multiplier=1.5)
+            )
+            await db.commit()
+            before = (await service.get_scenario_config(db, "opt")).rent_growth_multiplier
+            await refdata.invalidate_reference_data()  # Redis недоступен — инвалидация только локальная
+            after = (await service.get_scenario_config(db, "opt")).rent_growth_multiplier
+            return before, after
+
+    assert asyncio.run(scenario()) == (1.2, 1.5)
+
+
+def test_miss_falls_back_to_database(seeded_db):
+    """Промах снимка проверяется в БД: запись могла появиться в другом процессе"""
+    async def scenario():
+        async with seeded_db() as (database, db):
+            await refdata.reference_cache.load(db)
+            db.add(ScenarioConfig(id="stress", name="stress", rent_growth_multiplier=0.5, price_growth_multiplier=0.5))
+            await db.commit()
+            stress = await service.get_scenario_config(db, "stress")
+            missing = await service.get_scenario_config(db, "missing")
+            ordered = (await refdata.reference_cache.get(db)).ordered_scenarios()
+            return stress, missing, ordered
+
+    stress, missing, ordered = asyncio.run(scenario())
+
+    assert stress.rent_growth_multiplier == 0.5
+    assert missing is None
+    assert [s.id for s in ordered] == ["pes", "base", "opt"]
+
+
+def test_concurrent_reload_queries_once(seeded_db):
+    """Одновременные запросы при устаревшем снимке ждут одну перезагрузку"""
+    async def scenario():
+        async with seeded_db() as (database, db):
+            await refdata.reference_cache.load(db)
+            refdata.reference_cache.mark_stale()
+            database.statements.clear()
+            await asyncio.gather(*(service.get_scenario_config(db, "base") for _ in range(10)))
+            return len(database.statements)
+
+    assert asyncio.run(scenario()) == 2
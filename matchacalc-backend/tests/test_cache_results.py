@@ -0,0 +1,209 @@
+"""
+Тесты кэша результатов расчёта
+"""
+import asyncio
+import pytest
+import redis
+from app.cache import results
+from app.cache.results import ResultCache, make_key
+from app.cache.singleflight import SingleFlight
+
+
+class _DictRedis:
+    """Минимальная замена асинхронного Redis: get/setex"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class _UnavailableRedis:
+    async def get(self, key):
+        raise redis.ConnectionError("Redis недоступен")
+
+    async def setex(self, key, ttl, value):
+        raise redis.ConnectionError("Redis недоступен")
+
+
+def _constant(value: dict, calls: list):
+    async def compute():
+        calls.append(1)
+        return value
+    return compute
+
+
+def test_make_key_is_canonical():
+    """Ключ не зависит от порядка аргументов и зависит от версии справочника"""
+    first = make_key("metrics", "1", area=150.0, purchase_price=5e7)
+    second = make_key("metrics", "1", purchase_price=5e7, area=150.0)
+
+    assert first == second
+    assert first != make_key("metrics", "2", area=150.0, purchase_price=5e7)
+    assert first != make_key("metrics", "1", area=151.0, purchase_price=5e7)
+
+
+def test_lru_eviction_and_counters(monkeypatch):
+    """Вытесняется давно не использованная запись, счётчики учитывают все исходы"""
+    monkeypatch.setattr(results, "get_async_redis_client", lambda: _UnavailableRedis())
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+
+    async def scenario():
+        await cache.set("a", {"value": 1})
+        await cache.set("b", {"value": 2})
+        assert await cache.get("a") == {"value": 1}
+        await cache.set("c", {"value": 3})  # вытесняет "b"
+
+        assert await cache.get("b") is None
+        assert await cache.get("c") == {"value": 3}
+
+    asyncio.run(scenario())
+    stats = cache.stats()
+    assert stats["local_hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+
+
+def test_redis_tier_shared_between_processes(monkeypatch):
+    """Запись одного процесса находится другим через Redis и попадает в его LRU"""
+    shared = _DictRedis()
+    monkeypatch.setattr(results, "get_async_redis_client", lambda: shared)
+    writer = ResultCache(max_entries=10, ttl_seconds=60)
+    reader = ResultCache(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    async def scenario():
+        await writer.get_or_compute("key", _constant({"npv": 1.5}, calls))
+        value = await reader.get_or_compute("key", _constant({"npv": 0.0}, calls))
+        value["npv"] = 99  # копия: кэш не меняется
+        return await reader.get_or_compute("key", _constant({"npv": 0.0}, calls))
+
+    again = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert again == {"npv": 1.5}
+    assert reader.stats()["redis_hits"] == 1
+    assert reader.stats()["local_hits"] == 1
+
+
+def test_concurrent_misses_compute_once(monkeypatch):
+    """Одновременные одинаковые запросы ждут одно вычисление и получают его результат"""
+    monkeypatch.setattr(results, "get_async_redis_client", lambda: _UnavailableRedis())
+    cache = ResultCache(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"npv": 1.5}
+
+    async def scenario():
+        return await asyncio.gather(*(
+            cache.get_or_compute("key", compute, shared=False) for _ in range(20)
+        ))
+
+    values = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert all(value == {"npv": 1.5} for value in values)
+    assert len({id(value) for value in values}) == 20  # каждому — своя копия
+    stats = cache.stats()["single_flight"]
+    assert stats["leaders"] == 1
+    assert stats["coalesced"] == 19
+
+
+def test_leader_error_is_shared():
+    """Исключение ведущего получают все ожидающие, следующий вызов считает заново"""
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("Сценарий не найден")
+
+    async def answer():
+        return 42
+
+    async def scenario():
+        outcomes = await asyncio.gather(
+            *(flights.do("key", failing) for _ in range(5)), return_exceptions=True
+        )
+        return [str(e) for e in outcomes], await flights.do("key", answer)
+
+    errors, value = asyncio.run(scenario())
+
+    assert errors == ["Сценарий не найден"] * 5
+    assert value == 42
+
+
+def test_waiter_cancellation_does_not_cancel_leader():
+    """Отмена ожидающего запроса не прерывает общее вычисление"""
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 7
+
+    async def scenario():
+        leader = asyncio.create_task(flights.do("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("key", slow))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(scenario()) == 7
+
+
+def test_leader_cancellation_hands_over_to_waiter():
+    """Отмена ведущего запроса не отменяет ожидающих: один из них считает заново"""
+    flights = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 7
+
+    async def scenario():
+        leader = asyncio.create_task(flights.do("key", slow))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flights.do("key", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == [7, 7, 7]
+    assert len(calls) == 2
+    assert (flights.stats()["leaders"], flights.stats()["takeovers"]) == (2, 2)
+
+
+def test_redis_lock_follower_waits_for_other_process(monkeypatch):
+    """С блокировкой в Redis процесс без блокировки берёт результат другого процесса"""
+    async def no_lock(key, ttl_ms):
+        return None
+
+    async def other_process_value(key, timeout_ms):
+        return '{"npv":2.5}'
+
+    async def compute():
+        pytest.fail("расчёт не должен выполняться")
+
+    monkeypatch.setattr(results, "get_async_redis_client", lambda: _DictRedis())
+    monkeypatch.setattr(results.settings, "SINGLE_FLIGHT_REDIS_LOCK", True)
+    monkeypatch.setattr(results, "acquire_lock", no_lock)
+    monkeypatch.setattr(results, "wait_for_value", other_process_value)
+    cache = ResultCache(max_entries=10, ttl_seconds=60)
+
+    value = asyncio.run(cache.get_or_compute("key", compute))
+
+    assert value == {"npv": 2.5}
+    assert cache.stats()["redis_waits"] == 1
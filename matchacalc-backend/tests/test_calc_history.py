@@ -0,0 +1,240 @@
+"""
+Тесты write-behind записи расчётов в историю
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import func, insert, select
+from app.calc.history import CalculationWriter, decode_result, encode_result, ensure_partitions, list_history
+from app.db.models import Calculation
+
+RESULT = {
+    "static_metrics": {"payback_rent_years": 11.2, "payback_rent_sale_years": 6.1, "double_price_years": 17.0},
+    "dynamic_metrics": {"holding_years": 2, "npv": 150_000.0, "irr_percent": 14.5, "total_profit": 300_000.0},
+    "cash_flows": [{"year": 0, "cf": -1_000_000.0}, {"year": 1, "cf": 80_000.0}, {"year": 2, "cf": 1_200_000.0}],
+}
+
+
+async def record(writer: CalculationWriter, number: int, user_id=None):
+    await writer.record(
+        purchase_price=1_000_000.0 + number, area=50.0, location_group_id="moscow_city",
+        holding_years=5, scenario_id="base", report_id=1, result=RESULT, user_id=user_id
+    )
+
+
+@pytest.fixture
+def run(memory_db):
+    """Запускает scenario(writer) на SQLite в памяти, возвращает (writer, строк в calculations)"""
+    async def run_writer(scenario, **options):
+        async with memory_db() as database:
+            settings = dict(batch_size=100, flush_interval_ms=1000, queue_size=1000, put_timeout_ms=50)
+            settings.update(options)
+            writer = CalculationWriter(session_factory=database.sessions, **settings)
+            try:
+                await scenario(writer)
+                async with database.sessions() as db:
+                    rows = await db.scalar(select(func.count()).select_from(Calculation))
+                return writer, rows
+            finally:
+                await writer.stop()
+
+    return run_writer
+
+
+def test_flush_by_batch_size(run):
+    async def scenario(writer):
+        writer.start()
+        for number in range(10):
+            await record(writer, number)
+        await asyncio.sleep(0.1)  # Таймер (1 с) не истёк — пишут только полные пачки
+
+    writer, rows = asyncio.run(run(scenario, batch_size=5))
+
+    assert rows == 10
+    assert writer.batches == 2
+
+
+def test_flush_by_interval(run):
+    async def scenario(writer):
+        writer.start()
+        for number in range(3):
+            await record(writer, number)
+        await asyncio.sleep(0.2)
+
+    writer, rows = asyncio.run(run(scenario, flush_interval_ms=50))
+
+    assert rows == 3
+    assert writer.batches == 1
+
+
+def test_stop_drains_queue(run):
+    async def scenario(writer):
+        writer.start()
+        for number in range(25):
+            await record(writer, number)
+        await writer.stop()
+
+    writer, rows = asyncio.run(run(scenario, batch_size=10, flush_interval_ms=60_000))
+
+    assert rows == 25
+    assert writer.written == 25
+    assert not writer.running
+
+
+def test_full_queue_drops_after_timeout(run):
+    async def scenario(writer):
+        released = asyncio.Event()
+        session_factory = writer.session_factory
+
+        class StalledSession:
+            """Сессия, ожидающая недоступную БД до released"""
+
+            async def __aenter__(self):
+                await released.wait()
+                self.db = session_factory()
+                return await self.db.__aenter__()
+
+            async def __aexit__(self, *exc_info):
+                return await self.db.__aexit__(*exc_info)
+
+        writer.session_factory = StalledSession
+        writer.start()
+        await record(writer, 0)
+        await asyncio.sleep(0.01)  # Первая запись забрана в пачку, запись в БД висит
+        await record(writer, 1)    # Занимает единственное место в очереди
+        await record(writer, 2)    # Не дождалась места — отброшена
+        released.set()
+        await writer.stop()
+
+    writer, rows = asyncio.run(run(scenario, batch_size=1, queue_size=1, put_timeout_ms=10))
+
+    assert writer.dropped == 1
+    assert writer.enqueued == 2
+    assert rows == 2
+
+
+def test_record_is_noop_when_not_started(run):
+    async def scenario(writer):
+        await record(writer, 0)
+
+    writer, rows = asyncio.run(run(scenario))
+
+    assert rows == 0
+    assert writer.stats()["enqueued"] == 0
+
+
+def test_result_encoding_roundtrip_and_legacy_rows():
+    stored = encode_result(RESULT)
+
+    assert stored["cash_flows"] == [-1_000_000.0, 80_000.0, 1_200_000.0]
+    assert decode_result(stored) == RESULT
+    assert decode_result(RESULT) == RESULT  # строки до компактного формата
+
+
+def test_record_fills_summary_columns(run):
+    async def scenario(writer):
+        writer.start()
+        await record(writer, 0, user_id=7)
+        await writer.stop()
+
+    async def check():
+        captured = {}
+
+        async def history(writer):
+            await scenario(writer)
+            async with writer.session_factory() as db:
+                captured["row"] = (await db.execute(select(Calculation))).scalar_one()
+
+        await run(history)
+        return captured["row"]
+
+    row = asyncio.run(check())
+
+    assert (row.user_id, row.npv, row.irr_percent, row.total_profit) == (7, 150_000.0, 14.5, 300_000.0)
+    assert row.total_profit_percent is None
+    assert row.result_json["cash_flows"] == [-1_000_000.0, 80_000.0, 1_200_000.0]
+
+
+@pytest.fixture
+def paginate(memory_db):
+    """Семь расчётов пользователя 1 (два — в одну секунду) и один чужой; все страницы истории"""
+    async def pages_of_history(limit: int, details: bool = False, cursor: str = None):
+        started = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        times = [started + timedelta(seconds=second) for second in (0, 1, 2, 3, 3, 4, 5)]
+        rows = [
+            {
+                "user_id": 1, "purchase_price": 1_000_000.0 + number, "area": 50.0,
+                "location_group_id": "moscow_city", "holding_years": 2, "scenario_id": "base",
+                "report_id": 1, "npv": float(number), "result_json": encode_result(RESULT), "created_at": created_at
+            }
+            for number, created_at in enumerate(times)
+        ]
+        rows.append({**rows[-1], "user_id": 2, "created_at": started + timedelta(seconds=9)})
+        pages = []
+        async with memory_db() as database, database.sessions() as db:
+            await db.execute(insert(Calculation), rows)
+            await db.commit()
+            while True:
+                items, cursor = await list_history(db, 1, limit, cursor, details)
+                pages.append(items)
+                if cursor is None:
+                    return pages
+
+    return pages_of_history
+
+
+def test_history_keyset_pages(paginate):
+    pages = asyncio.run(paginate(limit=3))
+
+    assert [[item["npv"] for item in page] for page in pages] == [[6.0, 5.0, 4.0], [3.0, 2.0, 1.0], [0.0]]
+    assert "result" not in pages[0][0]
+
+
+def test_history_details_include_decoded_result(paginate):
+    pages = asyncio.run(paginate(limit=10, details=True))
+
+    assert len(pages) == 1
+    assert pages[0][0]["result"] == RESULT
+
+
+def test_history_rejects_foreign_cursor(paginate):
+    with pytest.raises(ValueError):
+        asyncio.run(paginate(limit=3, cursor="not-a-cursor"))
+
+
+class _PostgresConnection:
+    """Записывает SQL ensure_partitions; existing — уже созданные секции, stranded — месяцы со строками в default"""
+
+    def __init__(self, existing=(), stranded=()):
+        self.dialect = SimpleNamespace(name="postgresql")
+        self.existing = set(existing)
+        self.stranded = set(stranded)
+        self.statements = []
+
+    async def scalar(self, statement):
+        sql = str(statement)
+        if "to_regclass" in sql:
+            return sql.split("'")[1] in self.existing
+        return any(f"'{month}-01'" in sql.split("AND")[0] for month in self.stranded)
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_partitions_skip_existing_and_move_stranded_rows():
+    connection = _PostgresConnection(existing={"calculations_2026_10"}, stranded={"2026-11"})
+
+    asyncio.run(ensure_partitions(connection, months_ahead=2, today=date(2026, 10, 17)))
+
+    assert connection.statements == [
+        "ALTER TABLE calculations DETACH PARTITION calculations_default",
+        "CREATE TABLE calculations_2026_11 PARTITION OF calculations "
+        "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        "INSERT INTO calculations_2026_11 SELECT * FROM calculations_default "
+        "WHERE created_at >= '2026-11-01' AND created_at < '2026-12-01'",
+        "DELETE FROM calculations_default WHERE created_at >= '2026-11-01' AND created_at < '2026-12-01'",
+        "ALTER TABLE calculations ATTACH PARTITION calculations_default DEFAULT",
+        "CREATE TABLE calculations_2026_12 PARTITION OF calculations "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+    ]
@@ -0,0 +1,48 @@
+"""
+Тесты режима Монте-Карло
+"""
+import pytest
+from app.calc import montecarlo
+from app.calc.formulas import CashFlowSchedule
+
+ARGS = (50_000_000, 150, 58000.0, 0.12, 0.035, 7)
+
+
+@pytest.fixture(autouse=True)
+def in_process(monkeypatch):
+    """Без пула процессов: тесты не должны порождать процессы"""
+    monkeypatch.setattr(montecarlo.settings, "MONTE_CARLO_WORKERS", 1)
+
+
+def test_zero_volatility_matches_deterministic():
+    """При нулевой волатильности все пути совпадают с детерминированным расчётом"""
+    result = montecarlo.run_monte_carlo(
+        *ARGS, paths=1000, seed=1, rent_growth_volatility=0, price_growth_volatility=0
+    )
+    schedule = CashFlowSchedule(*ARGS[:5], horizon_years=50)
+
+    for band in ("p5", "p50", "p95"):
+        assert result["npv"][band] == pytest.approx(schedule.npv(7))
+        assert result["irr"][band] == pytest.approx(schedule.irr(7).rate)
+        assert result["payback_rent_years"][band] == pytest.approx(schedule.payback_rent())
+        assert result["payback_rent_sale_years"][band] == pytest.approx(schedule.payback_rent_and_sale())
+
+
+def test_seed_reproducible_across_chunks(monkeypatch):
+    """Одинаковое зерно даёт одинаковый результат; блоки получают разные зёрна"""
+    monkeypatch.setattr(montecarlo, "CHUNK_PATHS", 1000)
+    first = montecarlo.run_monte_carlo(*ARGS, paths=3000, seed=42, vacancy_rate=0.05)
+    second = montecarlo.run_monte_carlo(*ARGS, paths=3000, seed=42, vacancy_rate=0.05)
+    other = montecarlo.run_monte_carlo(*ARGS, paths=3000, seed=43, vacancy_rate=0.05)
+
+    assert first == second
+    assert first["npv"] != other["npv"]
+    assert first["npv"]["p5"] < first["npv"]["p50"] < first["npv"]["p95"]
+
+
+def test_vacancy_lowers_npv():
+    """Вакантность уменьшает доход от аренды и медианный NPV"""
+    without = montecarlo.run_monte_carlo(*ARGS, paths=2000, seed=7)
+    with_vacancy = montecarlo.run_monte_carlo(*ARGS, paths=2000, seed=7, vacancy_rate=0.1)
+
+    assert with_vacancy["npv"]["p50"] < without["npv"]["p50"]
@@ -0,0 +1,42 @@
+"""
+Тесты анализа чувствительности
+"""
+import pytest
+from app.calc.analytic import calculate_npv_closed_form, solve_irr
+from app.calc.sensitivity import calculate_sensitivity, SENSITIVITY_PARAMETERS
+
+BASE = dict(
+    purchase_price=50_000_000, area=150, rent_start=58000.0,
+    rent_growth_annual=0.12, price_growth_annual=0.035, holding_years=7
+)
+
+
+def test_tornado_matches_scalar_formulas():
+    """Каждая полоса торнадо совпадает с отдельным скалярным расчётом"""
+    result = calculate_sensitivity(**BASE, discount_rate=0.12, delta=0.1)
+
+    assert {bar["parameter"] for bar in result["tornado"]} == set(SENSITIVITY_PARAMETERS)
+    for bar in result["tornado"]:
+        for side, multiplier in (("low", 0.9), ("high", 1.1)):
+            params = dict(BASE, discount_rate=0.12)
+            params[bar["parameter"]] *= multiplier
+            npv = calculate_npv_closed_form(**params)
+            irr = solve_irr(**{k: v for k, v in params.items() if k != "discount_rate"}).rate
+            assert bar[f"npv_{side}"] == pytest.approx(npv, rel=1e-9)
+            assert bar[f"irr_{side}"] == pytest.approx(irr, abs=1e-8)
+
+    swings = [abs(bar["npv_high"] - bar["npv_low"]) for bar in result["tornado"]]
+    assert swings == sorted(swings, reverse=True)
+
+
+def test_two_way_table_layout():
+    """Таблица: строки — рост цены, столбцы — рост аренды, центр — базовый вариант"""
+    result = calculate_sensitivity(**BASE, delta=0.2, grid_steps=5)
+    table = result["table"]
+
+    assert len(table["npv"]) == 5 and all(len(row) == 5 for row in table["npv"])
+    assert table["npv"][2][2] == pytest.approx(result["base_npv"])
+    assert table["irr"][2][2] == pytest.approx(result["base_irr"])
+
+    params = dict(BASE, price_growth_annual=table["row_values"][0], rent_growth_annual=table["column_values"][4])
+    assert table["npv"][0][4] == pytest.approx(calculate_npv_closed_form(**params, discount_rate=0.12), rel=1e-9)
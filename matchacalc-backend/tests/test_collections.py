@@ -0,0 +1,73 @@
+"""
+Тесты расчёта метрик коллекции
+"""
+import asyncio
+import pytest
+from app.calc.formulas import CashFlowSchedule
+from app.collections.service import calculate_collection_metrics, get_collection_lots
+from app.db.models import Collection, CollectionLot, User
+
+
+@pytest.fixture
+def collection_metrics(memory_db, market, lots, reference_snapshot):
+    """Коллекция 1 из четырёх лотов (у лота 4 в region нет данных рынка) и пустая коллекция 2; справочник без значений рынка"""
+    async def run(**params):
+        async with memory_db() as database, database.sessions() as db:
+            db.add(User(id=1, email="agent@example.com", password_hash="x"))
+            market(db, {"moscow_city": 60000.0, "big_city": 40000.0}, groups=["region"])
+            db.add(Collection(id=1, owner_user_id=1, name="Офисы"))
+            db.add(Collection(id=2, owner_user_id=1, name="Пустая"))
+            lots(db, [
+                (1, "moscow_city", 50_000_000.0, None),
+                (2, "big_city", 20_000_000.0, 10.0),
+                (3, "moscow_city", 80_000_000.0, None),
+                (4, "region", 10_000_000.0, None),
+            ])
+            for lot_id, position in ((1, 2), (2, 0), (3, 1), (4, 3)):
+                db.add(CollectionLot(collection_id=1, lot_id=lot_id, position=position))
+            await db.commit()
+
+            database.statements.clear()
+            collection, found = await get_collection_lots(db, params.pop("collection_id", 1))
+            results = await calculate_collection_metrics(db, found, **params)
+            return collection, results, len(database.statements), await get_collection_lots(db, 404)
+
+    return lambda **params: asyncio.run(run(**params))
+
+
+def test_lots_in_position_order_with_two_queries(collection_metrics):
+    collection, results, queries, missing = collection_metrics(
+        report_id=1, scenario_id="base", holding_years=5
+    )
+
+    assert collection.name == "Офисы"
+    assert missing is None
+    assert [row["lot_id"] for row in results] == [2, 3, 1, 4]
+    assert [row["position"] for row in results] == [0, 1, 2, 3]
+    # Нет данных рынка для группы лота — лот без метрик, остальные посчитаны
+    assert [row["metrics"] is None for row in results] == [False, False, False, True]
+    # Один JOIN для лотов и один IN для значений рынка
+    assert queries == 2
+
+
+def test_lot_metrics_use_discounted_price(collection_metrics):
+    _, results, _, _ = collection_metrics(report_id=1, scenario_id="base", holding_years=5)
+    discounted = results[0]
+
+    assert discounted["purchase_price"] == pytest.approx(18_000_000.0)
+    schedule = CashFlowSchedule(18_000_000.0, 100.0, 40000.0, 0.08, 0.04, horizon_years=50)
+    assert discounted["metrics"]["dynamic_metrics"]["npv"] == pytest.approx(schedule.npv(5), rel=1e-9)
+
+
+def test_empty_collection_and_missing_market_data(collection_metrics):
+    _, results, queries, _ = collection_metrics(
+        collection_id=2, report_id=1, scenario_id="base", holding_years=5
+    )
+    assert (results, queries) == ([], 1)
+
+    _, results, _, _ = collection_metrics(report_id=2, scenario_id="base", holding_years=5)
+    assert [row["lot_id"] for row in results] == [2, 3, 1, 4]
+    assert all(row["metrics"] is None for row in results)
+
+    with pytest.raises(ValueError):
+        collection_metrics(report_id=1, scenario_id="missing", holding_years=5)
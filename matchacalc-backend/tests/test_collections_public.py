@@ -0,0 +1,158 @@
+"""
+Тесты публичной страницы коллекции: кэш в Redis, версии и ETag
+"""
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.cache.refdata import VERSION_KEY
+from app.collections import public, routes
+from app.collections.public import etag_matches, get_public_payload, invalidate_public_collection
+from app.db.models import Collection, CollectionLot, Lot, MarketReport, User
+
+
+class _DictRedis:
+    """Минимальная замена асинхронного Redis: get/mget/setex/incr"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+
+@pytest.fixture
+def fake_redis(monkeypatch, reference_snapshot):
+    client = _DictRedis()
+    monkeypatch.setattr(public, "get_async_redis_client", lambda: client)
+    reference_snapshot.version = lambda: int(client.data.get(VERSION_KEY, 0))
+    return client
+
+
+@pytest.fixture
+def views(fake_redis, memory_db, market, lots):
+    """Опубликованная коллекция из трёх лотов (у третьего нет данных рынка); steps — список (действие, slug), по запросу на шаг"""
+    async def run(steps):
+        results = []
+        async with memory_db() as database, database.sessions() as db:
+            db.add(User(id=1, email="agent@example.com", password_hash="x"))
+            market(db, {"moscow_city": 60000.0}, groups=["region"])  # у region нет значений в отчёте
+            db.add(Collection(id=1, owner_user_id=1, name="Офисы для инвестора", public_slug="offices"))
+            lots(db, [
+                (1, "moscow_city", 50_000_000.0, None),
+                (2, "moscow_city", 50_000_000.0, 5.0),
+                (3, "region", 50_000_000.0, None),
+            ])
+            for lot_id in (1, 2, 3):
+                db.add(CollectionLot(collection_id=1, lot_id=lot_id, position=lot_id))
+            await db.commit()
+
+            for action, slug in steps:
+                if action == "invalidate":
+                    await invalidate_public_collection(slug)
+                elif action == "report_changed":
+                    await fake_redis.incr(VERSION_KEY)
+                elif action == "deactivate_report":
+                    (await db.get(MarketReport, 1)).active = False
+                    await db.commit()
+                    await fake_redis.incr(VERSION_KEY)
+                elif action == "edit_lot":
+                    # Обычная запись через ORM, без явной инвалидации
+                    (await db.get(Lot, 1)).custom_discount_percent = 10.0
+                    await db.commit()
+                    await asyncio.sleep(0)
+                database.statements.clear()
+                results.append((await get_public_payload(db, slug), len(database.statements)))
+        return results
+
+    return lambda steps: asyncio.run(run(steps))
+
+
+def test_repeat_view_is_served_from_redis(views):
+    (first, first_queries), (second, second_queries) = views([("view", "offices"), ("view", "offices")])
+
+    assert first_queries > 0
+    assert second_queries == 0
+    assert second == first
+    payload = json.loads(first[0])
+    assert payload["title"] == "Офисы для инвестора"
+    assert [lot["discounted_price"] for lot in payload["lots"]] == pytest.approx(
+        [50_000_000.0, 47_500_000.0, 50_000_000.0]
+    )
+    assert payload["lots"][0]["metrics"]["dynamic_metrics"]["holding_years"] == 5
+    # Нет значений рынка для группы лота — лот без метрик, а не ошибка всей страницы
+    assert payload["lots"][2]["metrics"] is None
+
+
+def test_collection_and_report_changes_rebuild_the_page(views):
+    results = views([
+        ("view", "offices"), ("invalidate", "offices"), ("report_changed", "offices"), ("view", "offices")
+    ])
+
+    assert [queries > 0 for _, queries in results] == [True, True, True, False]
+    # Данные не менялись — ETag тот же, хотя ответ пересчитан
+    assert len({payload[1] for payload, _ in results}) == 1
+
+
+def test_orm_changes_invalidate_the_page(views):
+    (first, _), (edited, queries) = views([("view", "offices"), ("edit_lot", "offices")])
+
+    assert queries > 0
+    assert edited[1] != first[1]
+    assert json.loads(edited[0])["lots"][0]["discounted_price"] == pytest.approx(45_000_000.0)
+
+
+def test_without_active_report_lots_have_no_metrics(views):
+    [(found, _)] = views([("deactivate_report", "offices")])
+    payload = json.loads(found[0])
+
+    assert payload["report_id"] is None
+    assert [lot["metrics"] for lot in payload["lots"]] == [None, None, None]
+
+
+def test_unknown_slug(views):
+    [(found, _)] = views([("view", "missing")])
+
+    assert found is None
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_route_returns_304_for_matching_etag(monkeypatch):
+    async def payload(db, slug):
+        return ('{"title":"Офисы"}', '"etag-1"') if slug == "offices" else None
+
+    monkeypatch.setattr(routes, "get_public_payload", payload)
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api/v1/collections")
+    client = TestClient(app)
+
+    response = client.get("/api/v1/collections/public/offices")
+    assert response.status_code == 200
+    assert response.json() == {"title": "Офисы"}
+    assert response.headers["ETag"] == '"etag-1"'
+    assert "max-age" in response.headers["Cache-Control"]
+
+    revalidated = client.get("/api/v1/collections/public/offices", headers={"If-None-Match": '"etag-1"'})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == '"etag-1"'
+
+    assert client.get("/api/v1/collections/public/missing").status_code == 404
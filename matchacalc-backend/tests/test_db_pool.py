@@ -0,0 +1,84 @@
+"""
+Тесты настроек и счётчиков пула соединений
+"""
+import asyncio
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.config import settings
+from app.db.pool import (
+    InstrumentedAsyncQueuePool, InstrumentedQueuePool, PoolWaitMetrics, pool_options, pool_stats
+)
+
+
+def test_wait_histogram_buckets():
+    metrics = PoolWaitMetrics()
+    for elapsed_ms in (0.2, 3, 3, 40, 9000):
+        metrics.observe(elapsed_ms)
+
+    stats = metrics.stats()
+
+    assert stats["checkouts"] == 5
+    assert stats["max_ms"] == 9000
+    assert stats["histogram"]["le_1ms"] == 1
+    assert stats["histogram"]["le_5ms"] == 2
+    assert stats["histogram"]["le_50ms"] == 1
+    assert stats["histogram"]["inf"] == 1
+
+
+def test_pool_options_from_settings():
+    options = pool_options("postgresql://db/matchacalc", asynchronous=True)
+
+    assert options["poolclass"] is InstrumentedAsyncQueuePool
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert options["pool_timeout"] == settings.DB_POOL_TIMEOUT_SECONDS
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE_SECONDS
+    assert pool_options("sqlite://", asynchronous=False) == {}
+
+
+def test_checkouts_and_timeouts_are_counted(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    try:
+        with engine.connect() as held:
+            held.execute(text("SELECT 1"))
+            busy = pool_stats(engine.pool)
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+        idle = pool_stats(engine.pool)
+    finally:
+        engine.dispose()
+
+    assert (busy["checked_out"], busy["checked_in"]) == (1, 0)
+    assert (idle["checked_out"], idle["checked_in"]) == (0, 1)
+    assert idle["wait"]["checkouts"] == 1
+    assert idle["wait"]["timeouts"] == 1
+
+
+def test_async_pool_counts_checkouts(tmp_path):
+    async def scenario():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedAsyncQueuePool,
+            pool_size=2, max_overflow=1
+        )
+        try:
+            async def query():
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(*(query() for _ in range(3)))
+            return pool_stats(engine.pool)
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["wait"]["checkouts"] == 3
+    # Третье соединение было сверх пула и закрыто при возврате
+    assert (stats["checked_in"], stats["overflow"]) == (2, 0)
+    assert (stats["size"], stats["max_overflow"]) == (2, 1)
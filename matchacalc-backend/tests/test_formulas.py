@@ -0,0 +1,147 @@
+"""
+Тесты формул расчёта: годовой график против эталонных функций
+"""
+import pytest
+from app.calc.analytic import (
+    calculate_rent_income_closed_form, calculate_npv_closed_form,
+    calculate_payback_rent_closed_form, solve_irr
+)
+from app.calc.formulas import (
+    CashFlowSchedule, calculate_rent_income, calculate_sale_profit,
+    calculate_payback_rent, calculate_payback_rent_and_sale,
+    calculate_npv, calculate_irr, calculate_cash_flows
+)
+
+# (purchase_price, area, rent_start, rent_growth_annual, price_growth_annual)
+CASES = [
+    (50_000_000, 150, 58000.0, 0.12, 0.035),
+    (50_000_000, 150, 58000.0, 0.0, 0.0),
+    (120_000_000, 300, 32000.0, -0.05, 0.02),
+    (10_000_000, 40, 72000.0, 0.15, 0.04),
+    (80_000_000, 100, 5000.0, 0.02, -0.03),
+]
+
+
+@pytest.mark.parametrize("purchase_price, area, rent_start, g_r, g_p", CASES)
+@pytest.mark.parametrize("holding_years", [1, 2, 3, 7, 15])
+def test_schedule_matches_reference(purchase_price, area, rent_start, g_r, g_p, holding_years):
+    """График даёт те же метрики, что и пошаговые функции"""
+    schedule = CashFlowSchedule(purchase_price, area, rent_start, g_r, g_p, horizon_years=50)
+
+    assert schedule.rent_income(holding_years) == pytest.approx(
+        calculate_rent_income(area, rent_start, g_r, holding_years))
+    assert schedule.sale_profit(holding_years) == pytest.approx(
+        calculate_sale_profit(purchase_price, g_p, holding_years))
+    assert schedule.npv(holding_years, 0.12) == pytest.approx(
+        calculate_npv(purchase_price, area, rent_start, g_r, g_p, holding_years, 0.12),
+        rel=1e-9, abs=1e-3)
+    assert schedule.irr(holding_years).rate == pytest.approx(
+        calculate_irr(purchase_price, area, rent_start, g_r, g_p, holding_years), abs=1e-4)
+
+    reference_flows = calculate_cash_flows(purchase_price, area, rent_start, g_r, g_p, holding_years)
+    flows = schedule.cash_flows(holding_years)
+    assert [cf["year"] for cf in flows] == [cf["year"] for cf in reference_flows]
+    assert [cf["cf"] for cf in flows] == pytest.approx([cf["cf"] for cf in reference_flows])
+
+
+@pytest.mark.parametrize("purchase_price, area, rent_start, g_r, g_p", CASES)
+def test_schedule_payback_matches_reference(purchase_price, area, rent_start, g_r, g_p):
+    """Сроки окупаемости совпадают с эталоном, включая случай «не окупится»"""
+    schedule = CashFlowSchedule(purchase_price, area, rent_start, g_r, g_p, horizon_years=50)
+
+    assert schedule.payback_rent() == pytest.approx(
+        calculate_payback_rent(purchase_price, area, rent_start, g_r))
+    assert schedule.payback_rent_and_sale() == pytest.approx(
+        calculate_payback_rent_and_sale(purchase_price, area, rent_start, g_r, g_p))
+
+
+@pytest.mark.parametrize("g_r", [0.0, 1e-12, -1e-12, 0.12, -0.05, -0.5, 0.35])
+@pytest.mark.parametrize("holding_years", [1, 2, 5, 15, 50])
+def test_closed_form_rent_income(g_r, holding_years):
+    """Сумма геометрического ряда совпадает с пошаговым суммированием"""
+    assert calculate_rent_income_closed_form(150, 58000.0, g_r, holding_years) == pytest.approx(
+        calculate_rent_income(150, 58000.0, g_r, holding_years), rel=1e-10)
+
+
+@pytest.mark.parametrize("g_r, discount_rate", [
+    (0.12, 0.12), (0.0, 0.12), (0.08, 0.0001), (-0.05, 0.3), (0.15, 2.5), (0.1, 1e-12 + 0.1),
+])
+@pytest.mark.parametrize("holding_years", [1, 2, 7, 15])
+def test_closed_form_npv(g_r, discount_rate, holding_years):
+    """Замкнутая формула NPV, в том числе при g_r' = d (знаменатель ряда равен 1)"""
+    args = (50_000_000, 150, 58000.0, g_r, 0.035, holding_years, discount_rate)
+    assert calculate_npv_closed_form(*args) == pytest.approx(calculate_npv(*args), rel=1e-9, abs=1e-3)
+
+
+@pytest.mark.parametrize("purchase_price, area, rent_start, g_r", [
+    (50_000_000, 150, 58000.0, 0.12),     # несколько лет
+    (50_000_000, 150, 58000.0, 0.0),      # без роста
+    (50_000_000, 150, 58000.0, 1e-13),    # рост почти ноль
+    (4_000_000, 150, 58000.0, 0.1),       # окупается в первый год
+    (8_000_000, 150, 58000.0, 0.1),       # окупается во второй год
+    (500_000_000, 150, 58000.0, -0.05),   # убывающая аренда, не окупится
+    (70_000_000, 150, 58000.0, -0.05),    # убывающая аренда, но окупится
+    (5_000_000_000, 150, 58000.0, 0.02),  # дольше 50 лет
+    (50_000_000, 150, 0.0, 0.1),          # нет аренды
+    (12_000_000, 150, 58000.0, -1.0),     # аренда только во второй год
+])
+def test_closed_form_payback_rent(purchase_price, area, rent_start, g_r):
+    """Окупаемость через логарифм совпадает с пошаговым поиском"""
+    assert calculate_payback_rent_closed_form(purchase_price, area, rent_start, g_r) == pytest.approx(
+        calculate_payback_rent(purchase_price, area, rent_start, g_r), rel=1e-9)
+
+
+@pytest.mark.parametrize("purchase_price, area, rent_start, g_r, g_p", CASES)
+@pytest.mark.parametrize("holding_years", [1, 2, 7, 15])
+def test_solve_irr_matches_bisection(purchase_price, area, rent_start, g_r, g_p, holding_years):
+    """Метод Ньютона совпадает с двоичным поиском в пределах его точности"""
+    args = (purchase_price, area, rent_start, g_r, g_p, holding_years)
+    result = solve_irr(*args)
+    reference = calculate_irr(*args)
+
+    assert result.rate == pytest.approx(reference, abs=1e-4)
+    if reference > 0:
+        assert result.converged
+        assert result.iterations <= 20
+        assert calculate_npv(*args, result.rate) == pytest.approx(0, abs=1e-3)
+
+
+def test_solve_irr_warm_start():
+    """Тёплый старт сходится к тому же корню за меньшее число итераций"""
+    args = (50_000_000, 150, 58000.0, 0.12, 0.035, 7)
+    cold = solve_irr(*args)
+    warm = solve_irr(*args, guess=cold.rate + 0.001)
+
+    assert warm.converged
+    assert warm.rate == pytest.approx(cold.rate, abs=1e-9)
+    assert warm.iterations <= cold.iterations
+
+
+def test_solve_irr_above_1000_percent():
+    """IRR выше 1000% находится, а не подменяется границей поиска"""
+    args = (300_000, 150, 58000.0, 0.1, 0.05, 5)
+    result = solve_irr(*args)
+
+    assert result.converged
+    assert result.rate > 10
+    assert calculate_npv(*args, result.rate) == pytest.approx(0, abs=1e-3)
+
+
+def test_solve_irr_loss_making_project():
+    """Убыточный проект: IRR = 0, как в calculate_irr"""
+    result = solve_irr(500_000_000, 10, 1000.0, 0.0, -0.1, 5)
+
+    assert result.rate == 0.0
+    assert not result.converged
+
+
+@pytest.mark.parametrize("purchase_price, area, rent_start, g_r, g_p", CASES)
+def test_npv_by_holding_years_matches_reference(purchase_price, area, rent_start, g_r, g_p):
+    """Префиксные суммы дают тот же NPV, что и отдельный расчёт для каждого срока"""
+    schedule = CashFlowSchedule(purchase_price, area, rent_start, g_r, g_p, horizon_years=50)
+    npvs = schedule.npv_by_holding_years(0.12, 15)
+
+    for holding_years in range(1, 16):
+        assert npvs[holding_years] == pytest.approx(
+            calculate_npv(purchase_price, area, rent_start, g_r, g_p, holding_years, 0.12),
+            rel=1e-9, abs=1e-3)
@@ -0,0 +1,183 @@
+"""
+Тесты материализованных метрик лотов
+"""
+import asyncio
+import pytest
+from sqlalchemy import select, update
+from app.calc.formulas import CashFlowSchedule
+from app.config import settings
+from app.db.models import Lot, LotMetric, MarketReport, MarketReportValue, PropertyClass
+from app.lots import metrics
+from app.lots.metrics import LotMetricsRefresher, list_lot_metrics, refresh_lot_metrics
+
+
+@pytest.fixture
+def with_lots(memory_db, market, lots, reference_snapshot, monkeypatch):
+    """Лоты 1, 3 в moscow_city, лот 2 в big_city; отчёт 1 с рентой класса A для обеих групп"""
+    monkeypatch.setattr(settings, "LOT_METRICS_HOLDING_YEARS", [3, 5])
+
+    async def run(scenario):
+        async with memory_db() as database:
+            async with database.sessions() as db:
+                market(db, {"moscow_city": 60000.0, "big_city": 40000.0}, groups=["region"])
+                lots(db, [
+                    (1, "moscow_city", 50_000_000.0, None),
+                    (2, "big_city", 20_000_000.0, 10.0),
+                    (3, "moscow_city", 80_000_000.0, None),
+                    (4, "region", 10_000_000.0, None),  # значений отчёта для группы нет
+                ])
+                await db.commit()
+            return await scenario(database.sessions)
+
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+async def stored_rows(sessions):
+    async with sessions() as db:
+        return {
+            (row.lot_id, row.report_id, row.scenario_id, row.holding_years): row
+            for row in await db.scalars(select(LotMetric))
+        }
+
+
+def test_refresh_writes_rows_for_every_report_scenario_and_term(with_lots):
+    async def scenario(sessions):
+        async with sessions() as db:
+            written = await refresh_lot_metrics(db, [1, 2, 4])
+        return written, await stored_rows(sessions)
+
+    written, rows = with_lots(scenario)
+
+    assert written == 4
+    assert set(rows) == {(lot_id, 1, "base", years) for lot_id in (1, 2) for years in (3, 5)}
+    discounted = rows[(2, 1, "base", 5)]
+    assert discounted.purchase_price == pytest.approx(18_000_000.0)
+    schedule = CashFlowSchedule(18_000_000.0, 100.0, 40000.0, 0.08, 0.04, horizon_years=50)
+    assert discounted.npv == pytest.approx(schedule.npv(5), rel=1e-9)
+    assert discounted.location_group_id == "big_city"
+
+
+def test_market_change_refreshes_only_lots_of_that_group(with_lots):
+    async def scenario(sessions):
+        async with sessions() as db:
+            await refresh_lot_metrics(db, [1, 2, 3])
+        before = await stored_rows(sessions)
+
+        async with sessions() as db:
+            value = await db.scalar(select(MarketReportValue).where(MarketReportValue.location_group_id == "moscow_city"))
+            value.rent_start = 90000.0
+            await db.commit()
+
+        refresher = LotMetricsRefresher(chunk_size=1, queue_size=10, session_factory=sessions)
+        refresher.start()
+        refresher.schedule_market(1, ["moscow_city"], PropertyClass.A)
+        refresher.schedule_market(1, ["big_city"], PropertyClass.B)  # лоты считаются по классу A
+        await refresher.join()
+        await refresher.stop()
+        return before, await stored_rows(sessions), refresher.stats()
+
+    before, after, stats = with_lots(scenario)
+
+    for key, row in after.items():
+        changed = key[0] in (1, 3)
+        assert (row.npv != before[key].npv) == changed
+        assert (row.computed_at != before[key].computed_at) == changed
+    assert (stats["jobs"], stats["chunks"], stats["lots"], stats["skipped"]) == (1, 2, 2, 1)
+
+
+def test_inactive_report_rows_are_removed(with_lots):
+    async def scenario(sessions):
+        async with sessions() as db:
+            await refresh_lot_metrics(db, [1, 2, 3])
+            report = await db.get(MarketReport, 1)
+            report.active = False
+            await db.commit()
+            await refresh_lot_metrics(db, [1, 2, 3], report_ids=[1])
+        return await stored_rows(sessions)
+
+    assert with_lots(scenario) == {}
+
+
+def test_listing_sorts_filters_and_pages(with_lots):
+    async def scenario(sessions):
+        async with sessions() as db:
+            await refresh_lot_metrics(db, [1, 2, 3])
+            by_irr, next_offset = await list_lot_metrics(db, 1, "base", 5, limit=2)
+            rest, last_offset = await list_lot_metrics(db, 1, "base", 5, limit=2, offset=next_offset)
+            cheapest_first, _ = await list_lot_metrics(db, 1, "base", 5, sort="npv", descending=False)
+            moscow, _ = await list_lot_metrics(db, 1, "base", 5, location_group_id="moscow_city")
+            with pytest.raises(ValueError):
+                await list_lot_metrics(db, 1, "base", 5, sort="address")
+        return by_irr, next_offset, rest, last_offset, cheapest_first, moscow
+
+    by_irr, next_offset, rest, last_offset, cheapest_first, moscow = with_lots(scenario)
+
+    irr = [row["irr_percent"] for row in by_irr + rest]
+    assert irr == sorted(irr, reverse=True)
+    assert (next_offset, last_offset, len(rest)) == (2, None, 1)
+    npv = [row["npv"] for row in cheapest_first]
+    assert npv == sorted(npv)
+    assert {row["lot_id"] for row in moscow} == {1, 3}
+    assert by_irr[0]["original_price"] >= by_irr[0]["purchase_price"]
+
+
+def test_missing_payback_sorts_as_longest(with_lots):
+    async def scenario(sessions):
+        async with sessions() as db:
+            await refresh_lot_metrics(db, [1, 2, 3])
+            await db.execute(update(LotMetric).where(LotMetric.lot_id == 2).values(payback_rent_years=None))
+            await db.commit()
+            shortest, _ = await list_lot_metrics(db, 1, "base", 5, sort="payback_rent_years", descending=False)
+            longest, _ = await list_lot_metrics(db, 1, "base", 5, sort="payback_rent_years")
+        return [row["lot_id"] for row in shortest], [row["lot_id"] for row in longest]
+
+    shortest, longest = with_lots(scenario)
+
+    assert shortest[-1] == 2
+    assert longest[0] == 2
+    assert longest[1:] == shortest[:-1][::-1]
+
+
+def test_backfill_and_jobs_without_running_refresher(with_lots):
+    async def scenario(sessions):
+        refresher = LotMetricsRefresher(chunk_size=2, queue_size=10, session_factory=sessions)
+        refresher.schedule_market(1, ["moscow_city"], PropertyClass.A)  # не запущен — учитывается
+        refresher.start()
+        scheduled = await refresher.backfill_if_empty()
+        await refresher.join()
+        again = await refresher.backfill_if_empty()
+        await refresher.stop()
+        return refresher.stats(), scheduled, again, await stored_rows(sessions)
+
+    stats, scheduled, again, rows = with_lots(scenario)
+
+    assert stats["not_running"] == 1
+    assert (scheduled, again) == (True, False)
+    assert {key[0] for key in rows} == {1, 2, 3}
+    assert (stats["jobs"], stats["lots"]) == (1, 4)
+
+
+def test_saving_lot_refreshes_only_its_rows(with_lots, lots, monkeypatch):
+    async def scenario(sessions):
+        async with sessions() as db:
+            await refresh_lot_metrics(db, [1, 2, 3])
+        before = await stored_rows(sessions)
+
+        refresher = LotMetricsRefresher(chunk_size=10, queue_size=10, session_factory=sessions)
+        monkeypatch.setattr(metrics, "lot_metrics_refresher", refresher)
+        refresher.start()
+        async with sessions() as db:
+            (await db.get(Lot, 1)).custom_discount_percent = 20.0
+            lots(db, [(5, "big_city", 30_000_000.0, None)])
+            await db.commit()
+        await refresher.join()
+        await refresher.stop()
+        return before, await stored_rows(sessions), refresher.stats()
+
+    before, after, stats = with_lots(scenario)
+
+    assert {key[0] for key in after} == {1, 2, 3, 5}
+    for key, row in before.items():
+        assert (after[key].computed_at != row.computed_at) == (key[0] == 1)
+    assert after[(1, 1, "base", 5)].purchase_price == pytest.approx(40_000_000.0)
+    assert (stats["jobs"], stats["lots"]) == (1, 2)
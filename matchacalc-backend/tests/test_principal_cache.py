@@ -0,0 +1,110 @@
+"""
+Тесты кэша пользователей по токену
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi.security import HTTPAuthorizationCredentials
+from app.auth import dependencies
+from app.auth.dependencies import get_current_user, get_optional_user_id
+from app.auth.jwt_handler import create_access_token
+from app.cache.principals import Principal, PrincipalCache
+from app.db.models import Subscription, SubscriptionPlan, SubscriptionStatus, User, UserRole
+
+
+def principal(user_id: int) -> Principal:
+    return Principal(
+        id=user_id, email=f"user{user_id}@example.com", role=UserRole.USER,
+        created_at=datetime(2026, 1, 1, tzinfo=timezone.utc), subscription=None
+    )
+
+
+def test_hit_miss_and_lru_eviction():
+    cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+    for user_id in (1, 2):
+        cache.set(f"token{user_id}", principal(user_id), None, cache.generation(user_id))
+    assert cache.get("token1").id == 1  # token2 становится самым старым
+    cache.set("token3", principal(3), None, cache.generation(3))
+
+    assert cache.get("token2") is None
+    assert cache.get("token3").id == 3
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_ttl_is_capped_by_token_expiry():
+    cache = PrincipalCache(max_entries=10, ttl_seconds=60)
+    cache.set("expiring", principal(1), time.time() + 0.05, cache.generation(1))
+    cache.set("expired", principal(2), time.time() - 1, cache.generation(2))
+
+    assert cache.get("expiring") is not None
+    assert cache.get("expired") is None
+    time.sleep(0.06)
+    assert cache.get("expiring") is None
+
+
+def test_invalidation_drops_all_tokens_of_user():
+    cache = PrincipalCache(max_entries=10, ttl_seconds=60)
+    for key, user_id in (("a", 1), ("b", 1), ("c", 2)):
+        cache.set(key, principal(user_id), None, cache.generation(user_id))
+
+    cache.invalidate_local(1)
+
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_snapshot_loaded_before_invalidation_is_not_stored():
+    cache = PrincipalCache(max_entries=10, ttl_seconds=60)
+    generation = cache.generation(1)
+    cache.invalidate_local(1)  # роль изменилась, пока шла загрузка
+    cache.set("a", principal(1), None, generation)
+    other = cache.generation(2)
+    cache.clear()  # переподключение слушателя
+    cache.set("b", principal(2), None, other)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+
+def test_current_user_is_served_without_queries(monkeypatch, memory_db):
+    monkeypatch.setattr(dependencies, "principal_cache", PrincipalCache(max_entries=10, ttl_seconds=60))
+
+    async def scenario():
+        async with memory_db() as database:
+            async with database.sessions() as db:
+                user = User(email="agent@example.com", password_hash="x", role=UserRole.AGENT)
+                db.add(user)
+                await db.flush()
+                db.add(Subscription(
+                    user_id=user.id, plan=SubscriptionPlan.AGENT, status=SubscriptionStatus.ACTIVE,
+                    expires_at=datetime.now(timezone.utc) + timedelta(days=30)
+                ))
+                await db.commit()
+            token = create_access_token({"sub": str(user.id)})
+            credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+            async with database.sessions() as db:
+                database.statements.clear()
+                first = await get_current_user(credentials, db)
+                first_queries = len(database.statements)
+                second = await get_current_user(credentials, db)
+                return first, second, first_queries, len(database.statements) - first_queries
+
+    first, second, first_queries, second_queries = asyncio.run(scenario())
+
+    assert first_queries == 2
+    assert second_queries == 0
+    assert second is first
+    assert second.role == UserRole.AGENT
+    assert second.subscription.plan == SubscriptionPlan.AGENT
+
+
+def test_optional_user_id_ignores_malformed_subject():
+    def user_id(subject):
+        token = create_access_token({"sub": subject})
+        return asyncio.run(get_optional_user_id(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)))
+
+    assert user_id("7") == 7
+    assert user_id("agent@example.com") is None
+    assert asyncio.run(get_optional_user_id(None)) is None
@@ -0,0 +1,167 @@
+"""
+Тесты ограничения частоты запросов
+"""
+import asyncio
+import pytest
+import redis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.auth.jwt_handler import create_access_token
+from app.ratelimit import middleware
+from app.ratelimit.middleware import RateLimitMiddleware
+
+
+class _DictRedis:
+    """Минимальная замена асинхронного Redis: get/setex/delete"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+
+    @app.post("/api/v1/calc/preview")
+    async def preview():
+        return {"ok": True}
+
+    @app.get("/api/v1/calc/history")
+    async def history():
+        return {"items": []}
+
+    @app.get("/api/v1/reports")
+    async def reports():
+        return []
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Вызовы check_rate_limit; ответы задаются через calls.retry_after"""
+    class Calls(list):
+        retry_after = 0.0
+
+    recorded = Calls()
+
+    async def check(key, window_seconds):
+        recorded.append((key, window_seconds))
+        if isinstance(recorded.retry_after, Exception):
+            raise recorded.retry_after
+        return recorded.retry_after
+
+    monkeypatch.setattr(middleware, "check_rate_limit", check)
+    return recorded
+
+
+def test_guest_key_and_window(calls):
+    """Гость ограничивается по IP одним вызовом скрипта на запрос"""
+    response = make_client().post("/api/v1/calc/preview")
+
+    assert response.status_code == 200
+    assert calls == [("ratelimit:guest:testclient", middleware.settings.RATE_LIMIT_GUEST)]
+
+
+def test_rejected_request_gets_retry_after(calls):
+    """429 с Retry-After — оставшееся до освобождения окна время, округлённое вверх"""
+    calls.retry_after = 41.2
+    response = make_client().post("/api/v1/calc/preview")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "42"
+    assert "42 секунд" in response.json()["detail"]
+
+
+def test_redis_unavailable_allows_request(calls):
+    calls.retry_after = redis.ConnectionError("Redis недоступен")
+
+    assert make_client().post("/api/v1/calc/preview").status_code == 200
+
+
+def test_other_paths_are_not_limited(calls):
+    assert make_client().get("/api/v1/reports").status_code == 200
+    assert calls == []
+
+
+def test_history_is_not_limited(calls):
+    calls.retry_after = 1.0
+    assert make_client().get("/api/v1/calc/history").status_code == 200
+    assert calls == []
+
+
+def test_subscription_plan_cached_in_redis(calls, monkeypatch):
+    """Тариф читается из БД один раз, дальше — из Redis, до инвалидации"""
+    shared = _DictRedis()
+    loads = []
+
+    async def load(user_id):
+        loads.append(user_id)
+        return "agent"
+
+    monkeypatch.setattr(middleware, "get_async_redis_client", lambda: shared)
+    monkeypatch.setattr(middleware, "load_subscription_plan", load)
+    client = make_client()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '7'})}"}
+
+    client.post("/api/v1/calc/preview", headers=headers)
+    client.post("/api/v1/calc/preview", headers=headers)
+    assert loads == [7]
+    assert calls[-1] == ("ratelimit:subscriber:7", middleware.settings.RATE_LIMIT_SUBSCRIBER)
+
+    asyncio.run(middleware.invalidate_subscription_plan(7))
+    client.post("/api/v1/calc/preview", headers=headers)
+    assert loads == [7, 7]
+
+
+def test_user_without_subscription_gets_user_tier(calls, monkeypatch):
+    shared = _DictRedis()
+    shared.data[middleware.plan_key(8)] = "none"
+    monkeypatch.setattr(middleware, "get_async_redis_client", lambda: shared)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '8'})}"}
+
+    make_client().post("/api/v1/calc/preview", headers=headers)
+
+    assert calls == [("ratelimit:user:8", middleware.settings.RATE_LIMIT_USER)]
+
+
+def test_plan_lookup_without_redis_skips_database(monkeypatch):
+    class _UnavailableRedis:
+        async def get(self, key):
+            raise redis.ConnectionError("Redis недоступен")
+
+    loads = []
+
+    async def load(user_id):
+        loads.append(user_id)
+        return "agent"
+
+    monkeypatch.setattr(middleware, "get_async_redis_client", lambda: _UnavailableRedis())
+    monkeypatch.setattr(middleware, "load_subscription_plan", load)
+
+    assert asyncio.run(middleware.get_subscription_plan(7)) is None
+    assert loads == []
+
+
+def test_non_http_scopes_pass_through(calls):
+    """lifespan и websocket передаются приложению без обращения к лимитеру"""
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(scope["type"])
+
+    limiter = RateLimitMiddleware(app)
+    for scope_type in ("lifespan", "websocket"):
+        asyncio.run(limiter({"type": scope_type, "path": "/api/v1/calc/ws"}, None, None))
+
+    assert seen == ["lifespan", "websocket"]
+    assert calls == []
@@ -0,0 +1,111 @@
+"""
+Тесты потоковой загрузки данных рынка
+"""
+import asyncio
+import io
+import json
+from pathlib import Path
+import pytest
+from sqlalchemy import func, select
+from app.db.models import LocationGroup, MarketReport, MarketReportValue
+from app.reports.loader import MarketDataParser, iter_file_reports, iter_stream_reports, load_market_data
+
+DATA_DIR = Path(__file__).resolve().parents[2]
+
+
+def report(period: str, rent_start: float, values=None) -> dict:
+    return {
+        "provider": "nikoliers", "title": f"Отчёт {period}", "period": period,
+        "values": values if values is not None else [{
+            "location_group_id": "moscow_city", "property_class": "A", "rent_start": rent_start,
+            "rent_growth_annual": 0.1, "price_growth_annual": 0.03, "vacancy_rate": 0.05
+        }]
+    }
+
+
+@pytest.mark.parametrize("name", ["market_data_Q4_2025.json", "market_reports_data.json"])
+def test_parser_matches_json_load_for_any_chunking(name):
+    """Отчёты не зависят от того, как файл разрезан на части"""
+    text = (DATA_DIR / name).read_text(encoding="utf-8")
+    document = json.loads(text)
+    expected = document if isinstance(document, list) else document["reports"]
+
+    for chunk_size in (1, 7, 4096):
+        parser = MarketDataParser()
+        reports = []
+        for start in range(0, len(text), chunk_size):
+            reports.extend(parser.feed(text[start:start + chunk_size]))
+        reports.extend(parser.close())
+        assert reports == expected
+
+
+def test_parser_rejects_truncated_document():
+    parser = MarketDataParser()
+    parser.feed('[{"provider": "nikoliers"}, {"provider": ')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_parser_fails_fast_on_malformed_document():
+    """Ошибка в середине уже прочитанного текста — сразу, а не после конца потока"""
+    parser = MarketDataParser()
+    with pytest.raises(ValueError):
+        parser.feed('[{"provider": "nikoliers" "period": "2025-Q4"}, ')
+
+
+def test_stream_decodes_utf8_split_between_chunks():
+    """Многобайтовый символ на границе частей тела запроса"""
+    body = json.dumps([report("2025-Q4", 1.0)], ensure_ascii=False).encode()
+    split = body.index("Отчёт".encode()) + 1
+
+    async def chunks():
+        yield body[:split]
+        yield body[split:]
+
+    async def collect():
+        return [item async for item in iter_stream_reports(chunks())]
+
+    assert asyncio.run(collect())[0]["title"] == "Отчёт 2025-Q4"
+
+
+def test_upsert_inserts_then_updates_in_one_transaction(memory_db):
+    """Повторная загрузка обновляет значения, отчёты и строки не дублируются"""
+    async def scenario():
+        async with memory_db() as database, database.sessions() as db:
+            db.add(LocationGroup(id="moscow_city", name="Москва-Сити"))
+            await db.commit()
+
+            first = io.StringIO(json.dumps([report("2025-Q3", 50000), report("2025-Q4", 58000)]))
+            await load_market_data(db, iter_file_reports(first), batch_size=1)
+            second = io.StringIO(json.dumps([report("2025-Q4", 60000)]))
+            stats = await load_market_data(db, iter_file_reports(second))
+
+            rents = (await db.scalars(
+                select(MarketReportValue.rent_start).order_by(MarketReportValue.report_id)
+            )).all()
+            reports = await db.scalar(select(func.count(MarketReport.id)))
+        return stats, rents, reports
+
+    stats, rents, reports = asyncio.run(scenario())
+
+    assert (stats.reports_created, stats.reports_existing, stats.values_upserted) == (0, 1, 1)
+    assert rents == [50000, 60000]
+    assert reports == 2
+
+
+def test_failed_load_rolls_back_everything(memory_db):
+    """Ошибка в середине файла не оставляет частично загруженных данных"""
+    bad_value = dict(report("2025-Q4", 1.0)["values"][0], property_class="C")
+
+    async def scenario():
+        async with memory_db() as database, database.sessions() as db:
+            items = [report("2025-Q3", 50000), report("2025-Q4", 0, values=[bad_value])]
+            with pytest.raises(ValueError):
+                await load_market_data(db, items, batch_size=1)
+            counts = (
+                await db.scalar(select(func.count(MarketReport.id))),
+                await db.scalar(select(func.count(MarketReportValue.id))),
+            )
+        return counts
+
+    assert asyncio.run(scenario()) == (0, 0)
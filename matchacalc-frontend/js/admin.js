@@ -19,7 +19,7 @@ const Admin = {
 
     async loadReports() {
         try {
-            const reports = await api.get('/admin/reports');
+            const reports = await API.get('/admin/reports');
             this.renderReports(reports);
             this.populateReportSelector(reports);
         } catch (error) {
@@ -65,7 +65,7 @@ const Admin = {
 
     async updateReport(id, field, value) {
         try {
-            await api.put(`/admin/reports/${id}`, { [field]: value });
+            await API.put(`/admin/reports/${id}`, { [field]: value });
             this.showStatus('Отчёт обновлен');
         } catch (error) {
             this.showError('Ошибка обновления: ' + error.message);
@@ -84,7 +84,8 @@ const Admin = {
         switchTab('values');
 
         try {
-            const values = await api.get(`/admin/reports/${reportId}/values`);
+            const values = await API.get(`/admin/reports/${reportId}/values`);
+            this.currentReportId = reportId;
             this.renderValues(values);
         } catch (error) {
             this.showError('Не удалось загрузить значения: ' + error.message);
@@ -92,31 +93,55 @@ const Admin = {
     },
 
     renderValues(values) {
+        // Правки копятся локально и сохраняются одним запросом (saveValues)
+        this.values = values.map(val => ({
+            location_group_id: val.location_group_id,
+            property_class: val.property_class,
+            rent_start: val.rent_start,
+            rent_growth_annual: val.rent_growth_annual,
+            price_per_m2_start: val.price_per_m2_start,
+            price_growth_annual: val.price_growth_annual,
+            vacancy_rate: val.vacancy_rate
+        }));
+        
         const tbody = document.querySelector('#values-table tbody');
         tbody.innerHTML = '';
         
-        values.forEach(val => {
+        this.values.forEach((val, index) => {
             const tr = document.createElement('tr');
             tr.innerHTML = `
                 <td>${val.location_group_id}</td>
                 <td>${val.property_class}</td>
-                <td><input type="number" step="1" value="${val.rent_start}" onchange="Admin.updateValue(${val.id}, 'rent_start', this.value)"></td>
-                <td><input type="number" step="0.01" value="${val.rent_growth_annual}" onchange="Admin.updateValue(${val.id}, 'rent_growth_annual', this.value)"></td>
-                <td><input type="number" step="1" value="${val.price_per_m2_start || ''}" onchange="Admin.updateValue(${val.id}, 'price_per_m2_start', this.value)"></td>
-                <td><input type="number" step="0.01" value="${val.price_growth_annual}" onchange="Admin.updateValue(${val.id}, 'price_growth_annual', this.value)"></td>
-                <td><input type="number" step="0.01" value="${val.vacancy_rate || ''}" onchange="Admin.updateValue(${val.id}, 'vacancy_rate', this.value)"></td>
-                <td>Saved</td>
+                <td><input type="number" step="1" value="${val.rent_start}" onchange="Admin.editValue(${index}, 'rent_start', this.value)"></td>
+                <td><input type="number" step="0.01" value="${val.rent_growth_annual}" onchange="Admin.editValue(${index}, 'rent_growth_annual', this.value)"></td>
+                <td><input type="number" step="1" value="${val.price_per_m2_start || ''}" onchange="Admin.editValue(${index}, 'price_per_m2_start', this.value)"></td>
+                <td><input type="number" step="0.01" value="${val.price_growth_annual}" onchange="Admin.editValue(${index}, 'price_growth_annual', this.value)"></td>
+                <td><input type="number" step="0.01" value="${val.vacancy_rate || ''}" onchange="Admin.editValue(${index}, 'vacancy_rate', this.value)"></td>
+                <td><button class="action-btn" onclick="Admin.removeValue(${index})">Удалить</button></td>
             `;
             tbody.appendChild(tr);
         });
     },
 
-    async updateValue(id, field, value) {
+    editValue(index, field, value) {
+        // Convert empty string to null for optional fields
+        this.values[index][field] = value === '' ? null : Number(value);
+        this.showStatus('Есть несохранённые изменения');
+    },
+
+    removeValue(index) {
+        this.values.splice(index, 1);
+        // Индексы строк сдвинулись — перерисовываем из локального состояния
+        this.renderValues(this.values);
+        this.showStatus('Есть несохранённые изменения');
+    },
+
+    async saveValues() {
+        if (!this.currentReportId) return;
         try {
-            // Convert empty string to null for optional fields
-            const payload = { [field]: value === '' ? null : Number(value) };
-            await api.put(`/admin/report-values/${id}`, payload);
-            this.showStatus('Значение сохранено');
+            const result = await API.put(`/admin/reports/${this.currentReportId}/values`, this.values);
+            this.renderValues(result.values);
+            this.showStatus(`Сохранено: добавлено ${result.inserted}, изменено ${result.updated}, удалено ${result.deleted}`);
         } catch (error) {
             this.showError('Ошибка сохранения: ' + error.message);
         }
@@ -124,7 +149,7 @@ const Admin = {
 
     async loadScenarios() {
         try {
-            const scenarios = await api.get('/reports/scenarios'); // Public endpoint is fine for reading
+            const scenarios = await API.get('/reports/scenarios'); // Public endpoint is fine for reading
             this.renderScenarios(scenarios);
         } catch (error) {
             this.showError('Не удалось загрузить сценарии: ' + error.message);
@@ -152,7 +177,7 @@ const Admin = {
     async updateScenario(id, field, value) {
         try {
             const payload = { [field]: field === 'name' ? value : Number(value) };
-            await api.put(`/admin/scenarios/${id}`, payload);
+            await API.put(`/admin/scenarios/${id}`, payload);
             this.showStatus('Сценарий обновлен');
         } catch (error) {
             this.showError('Ошибка обновления сценария: ' + error.message);
@@ -52,6 +52,13 @@ const API = {
         });
     },
     
+    async put(endpoint, data) {
+        return this.request(endpoint, {
+            method: 'PUT',
+            body: JSON.stringify(data)
+        });
+    },
+    
     // Получить список районов
     async getLocationGroups() {
         return this.get('/reports/location-groups');